@@ -1,4 +1,14 @@
-from .client import Avalara
+"""
+Python client for Avalara.
+
+Importing the package only loads the constants.  The client, models and
+bulk helpers, and with them requests and serpy, are imported the first
+time one of their names is looked up here, so scripts that never talk
+to Avalara start quickly.
+"""
+import importlib
+import sys
+
 from .constants import (
     DEFAULT_TAX_CODE,
     HANDLING_ITEM_CODE,
@@ -7,11 +17,19 @@ from .constants import (
     SHIPPING_TAX_CODE,
     SHIPPING_ITEM_CODE,
 )
-from .models import GetTaxRequest
 
 
+# name -> submodule of the names imported on first use
+_LAZY = {
+    'Avalara': 'client',
+    'BulkResult': 'bulk',
+    'GetTaxRequest': 'models',
+    'save_many': 'bulk',
+}
+
 __all__ = [
     'Avalara',
+    'BulkResult',
     'GetTaxRequest',
     'DEFAULT_TAX_CODE',
     'HANDLING_ITEM_CODE',
@@ -19,4 +37,27 @@ __all__ = [
     'NON_TAXABLE_TAX_CODE',
     'SHIPPING_ITEM_CODE',
     'SHIPPING_TAX_CODE',
+    'save_many',
 ]
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    # later lookups find it without coming back here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ needs python 3.7, import everything up front
+    for _name in _LAZY:
+        __getattr__(_name)
+    del _name
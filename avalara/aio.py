@@ -0,0 +1,215 @@
+"""
+asyncio client for Avalara.  Requires aiohttp, install with the async extra:
+
+    pip install avalara[async]
+"""
+import asyncio
+
+import aiohttp
+
+from .client import (
+    BaseAvalara,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_TIMEOUT,
+)
+from .instrumentation import clock
+
+
+# seconds an idle pooled connection is kept open
+DEFAULT_KEEPALIVE_TIMEOUT = 15
+
+
+def _client_timeout(timeout):
+    """translate a requests style timeout into an aiohttp ClientTimeout"""
+    if timeout is None:
+        return aiohttp.ClientTimeout(total=None)
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+    return aiohttp.ClientTimeout(total=timeout)
+
+
+async def _iterate(chunks):
+    # aiohttp streams async iterables with chunked transfer encoding
+    for chunk in chunks:
+        yield chunk
+
+
+def _wire_size(response):
+    """
+    bytes of a response body as received, aiohttp only hands out the
+    decompressed body so compressed ones need a Content-Length
+    """
+    if response.headers.get('Content-Encoding', 'identity') == 'identity':
+        return None
+    return response.content_length
+
+
+class AsyncAvalara(BaseAvalara):
+    """
+    asyncio counterpart of Avalara.  Endpoint methods return awaitables and
+    all requests share one aiohttp connection pool, created on first use
+    inside the running event loop.  Close it with ``await client.close()`` or
+    use the client as an async context manager.
+    """
+    is_async = True
+
+    def __init__(self, account_number=None, license_key=None, base_url=None,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT,
+                 keep_alive=True, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 **kwargs):
+        super(AsyncAvalara, self).__init__(
+            account_number, license_key, base_url=base_url, timeout=timeout,
+            **kwargs
+        )
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        # fingerprint -> task of a coalesced tax/get call in flight
+        self._in_flight = {}
+        # requests sent or waiting for a connection
+        self._sending = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _build_session(self):
+        if self.keep_alive:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize, force_close=True,
+            )
+        return aiohttp.ClientSession(
+            connector=connector, timeout=_client_timeout(self.timeout),
+        )
+
+    @property
+    def session(self):
+        """pooled aiohttp session, must be used from a running event loop"""
+        if self._session is None or self._session.closed:
+            self._session = self._build_session()
+        return self._session
+
+    async def _resolved(self, value):
+        return value
+
+    async def _then(self, result, callback):
+        return callback(await result)
+
+    async def _catch(self, call, exception_class, handler):
+        try:
+            return await call()
+        except exception_class as e:
+            return handler(e)
+
+    async def _coalesce(self, key, call):
+        task = self._in_flight.get(key)
+        self.single_flight.record(task is not None)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # a cancelled caller must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _gather(self, calls):
+        return list(await asyncio.gather(*[call() for call in calls]))
+
+    async def close(self):
+        """close pooled connections, a later request opens a new pool"""
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+    async def _send(self, method, url, endpoint, headers=None, **kwargs):
+        """one request, returns the status, headers, body and wire size"""
+        start = clock()
+        self._sending += 1
+        kwargs['headers'] = self._headers
+        if headers:
+            kwargs['headers'].update(headers)
+        timeout = self._timeout_for(endpoint)
+        if timeout is not None:
+            # otherwise the session timeout applies
+            kwargs['timeout'] = _client_timeout(timeout)
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                body = await response.read()
+                result = response.status, response.headers, body, _wire_size(response)
+        except Exception:
+            self._record_latency(endpoint, clock() - start)
+            raise
+        finally:
+            self._sending -= 1
+        self._record_latency(endpoint, clock() - start, result[0])
+        return result
+
+    async def _send_hedged(self, method, url, endpoint, **kwargs):
+        """
+        send the request and a second copy if the first one is slower than
+        the hedge delay.  The first response wins, the other is cancelled.
+        No copy is sent while every connection is taken, a saturated
+        client sends each call once instead of piling up copies
+        """
+        delay = self.hedge.delay(endpoint)
+        if delay is None:
+            return await self._send(method, url, endpoint, **kwargs)
+        first = asyncio.ensure_future(self._send(method, url, endpoint, **kwargs))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done or self._sending >= self.pool_maxsize:
+            return await first
+        pending = set([first, asyncio.ensure_future(self._send(method, url, endpoint, **kwargs))])
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _make_request(self, method, url, params=None, json=None, data=None,
+                            endpoint=None, idempotent=False):
+        data, extra_headers = self._encode(json, data, endpoint)
+        if data is not None and not isinstance(data, bytes):
+            data = _iterate(data)
+        send = self._send_hedged if idempotent and self.hedge is not None else self._send
+        attempt = 0
+        while True:
+            self._before_call()
+            try:
+                status, headers, body, wire_size = await send(
+                    method, url, endpoint, params=params, data=data, headers=extra_headers,
+                )
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self._record(None)
+                if not (idempotent and self._should_retry(attempt)):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+            except BaseException:
+                # any failure, cancellation included, ends a trial call of
+                # a half open circuit
+                self._record(None)
+                raise
+            else:
+                self._record(status)
+                delay = None
+                if idempotent and self._should_retry(attempt, status):
+                    delay = self.retry.delay(attempt, headers.get('Retry-After'))
+                if delay is None:
+                    return self._decode(body, endpoint, wire_size)
+                await asyncio.sleep(delay)
+            attempt += 1
+            self.instrumentation.increment('retries', endpoint=endpoint)
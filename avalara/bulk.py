@@ -0,0 +1,69 @@
+from __future__ import unicode_literals
+
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+DEFAULT_CONCURRENCY = 8
+
+
+class BulkResult(namedtuple('BulkResult', ['index', 'request', 'result', 'error'])):
+    """
+    outcome of one document in a bulk run.  index is the position of the
+    request in the input, error is the exception raised while saving it
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _save(index, request, commit):
+    try:
+        return BulkResult(index, request, request.save(commit=commit), None)
+    except Exception as e:
+        return BulkResult(index, request, None, e)
+
+
+def save_many(requests, commit=False, concurrency=DEFAULT_CONCURRENCY, ordered=False):
+    """
+    save an iterable of GetTaxRequest objects over a pool of worker threads
+    and yield a BulkResult per document, as they finish or in input order
+    when ordered is set.  At most concurrency documents are in flight and
+    the input is consumed lazily, so it can be a generator.  A failing
+    document is reported through BulkResult.error and the batch carries on.
+
+    The requests share their client's connection pool, keep its
+    pool_maxsize at or above concurrency so connections are reused.
+    """
+    if concurrency < 1:
+        raise ValueError('concurrency must be at least 1')
+    requests = iter(enumerate(requests))
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def fill():
+        # keep every worker busy plus one queued document each
+        while len(pending) < concurrency * 2:
+            try:
+                index, request = next(requests)
+            except StopIteration:
+                return
+            pending.append(executor.submit(_save, index, request, commit))
+
+    try:
+        fill()
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+            fill()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,308 @@
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from .utils import canonical_digest
+
+
+DEFAULT_MAXSIZE = 1024
+# seconds
+DEFAULT_TTL = 3600
+
+# seconds SharedCache keeps the version of its entries before reading it
+# from the store again
+DEFAULT_VERSION_TTL = 1
+
+# quotes go stale with rate changes, keep them shorter
+DEFAULT_QUOTE_TTL = 300
+DEFAULT_QUOTE_MAXBYTES = 64 * 1024 * 1024
+# request body fields a quote depends on
+QUOTE_KEY_FIELDS = (
+    'Addresses',
+    'BusinessIdentificationNo',
+    'CompanyCode',
+    'CurrencyCode',
+    'CustomerCode',
+    'CustomerUsageType',
+    'DetailLevel',
+    # rates change over time
+    'DocDate',
+    'Discount',
+    'ExemptionNo',
+    'Lines',
+)
+
+
+class BaseCache(object):
+    """
+    Cache interface used by the client.  Subclasses implement _get, _set,
+    _delete and clear, get keeps the hit and miss counters.  A miss is
+    reported as None so None itself cannot be cached.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get(self, key):
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._set(key, value, self.ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        self._delete(key)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hit_ratio}
+
+
+class LocalCache(BaseCache):
+    """
+    in-process cache with least recently used eviction past maxsize and a
+    time to live per entry.  Safe to share across threads.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, clock=time.time):
+        super(LocalCache, self).__init__(ttl=ttl)
+        self.maxsize = maxsize
+        self.clock = clock
+        # total _sizeof of the values held
+        self.bytes_used = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _sizeof(self, value):
+        """bytes value is counted for in bytes_used, subclasses that bound memory override it"""
+        return 0
+
+    def _full(self):
+        return len(self._entries) > self.maxsize
+
+    def _pop(self, key, last=None):
+        """remove an entry while holding the lock, last pops the oldest"""
+        if last is None:
+            entry = self._entries.pop(key, None)
+        else:
+            entry = self._entries.popitem(last=last)[1]
+        if entry is not None:
+            self.bytes_used -= self._sizeof(entry[1])
+        return entry
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= self.clock():
+                self._pop(key)
+                return None
+            # move to the end as most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+            return value
+
+    def _set(self, key, value, ttl):
+        expires = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (expires, value)
+            self.bytes_used += self._sizeof(value)
+            while self._entries and self._full():
+                self._pop(None, last=False)
+
+    def _delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes_used = 0
+
+
+class QuoteCache(LocalCache):
+    """
+    cache of uncommitted tax/get results for Avalara(quote_cache=...).
+    Quotes are keyed by a digest of key_fields of the request body, the
+    fields that decide the tax, so a cart quoted again under a new
+    DocCode is answered from the cache with its own DocCode.  Results are
+    kept as compact JSON, decoded anew for every hit, and the cache is
+    bounded by maxsize entries and maxbytes of JSON.
+
+    Call clear() when tax settings change, for instance nexus or
+    exemption certificates, and invalidate(request_body) to drop a single
+    quote
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_QUOTE_TTL,
+                 maxbytes=DEFAULT_QUOTE_MAXBYTES, key_fields=QUOTE_KEY_FIELDS,
+                 clock=time.time):
+        super(QuoteCache, self).__init__(maxsize=maxsize, ttl=ttl, clock=clock)
+        self.maxbytes = maxbytes
+        self.key_fields = key_fields
+
+    def _sizeof(self, value):
+        return len(value)
+
+    def _full(self):
+        return (super(QuoteCache, self)._full() or
+                self.maxbytes is not None and self.bytes_used > self.maxbytes)
+
+    def stats(self):
+        stats = super(QuoteCache, self).stats()
+        stats.update(entries=len(self), bytes=self.bytes_used)
+        return stats
+
+    def key(self, request_body):
+        return canonical_digest(dict(
+            (k, request_body.get(k)) for k in self.key_fields
+        ))
+
+    def get_quote(self, request_body):
+        """
+        the cached result for request_body carrying its DocCode and
+        DocDate, or None
+        """
+        value = self.get(self.key(request_body))
+        if value is None:
+            return None
+        result = json.loads(value.decode('utf-8'))
+        if 'DocCode' in request_body:
+            result['DocCode'] = request_body['DocCode']
+        if 'DocDate' in result and 'DocDate' in request_body:
+            result['DocDate'] = request_body['DocDate']
+        return result
+
+    def set_quote(self, request_body, result):
+        """remember a successful result for request_body"""
+        if result.get('ResultCode') == 'Success':
+            value = json.dumps(result, separators=(',', ':')).encode('utf-8')
+            self.set(self.key(request_body), value)
+        return result
+
+    def invalidate(self, request_body):
+        """forget the quote of request_body and of every identical cart"""
+        self.delete(self.key(request_body))
+
+
+class SharedCache(BaseCache):
+    """
+    cache kept in a store shared by many processes, for instance redis or
+    memcached.  store needs get(key), set(key, value, ttl) and delete(key)
+    working on text values; RedisStore adapts a redis client.  Values are
+    stored as JSON and keys are hashed under prefix and the version of
+    the entries.  clear() moves every process to a new version, the ones
+    that did not clear pick it up within version_ttl seconds
+    """
+
+    def __init__(self, store, prefix='avalara:', ttl=DEFAULT_TTL,
+                 dumps=json.dumps, loads=json.loads,
+                 version_ttl=DEFAULT_VERSION_TTL, clock=time.time):
+        super(SharedCache, self).__init__(ttl=ttl)
+        self.store = store
+        self.prefix = prefix
+        self.dumps = dumps
+        self.loads = loads
+        self.version_ttl = version_ttl
+        self.clock = clock
+        # (version, when it was read)
+        self._version = None
+
+    @property
+    def _version_key(self):
+        return self.prefix + 'version'
+
+    def _current_version(self):
+        """the version of the entries, '' until the store is first cleared"""
+        now = self.clock()
+        known = self._version
+        if known is None or now - known[1] >= self.version_ttl:
+            version = self.store.get(self._version_key) or ''
+            if isinstance(version, bytes):
+                version = version.decode('utf-8')
+            known = self._version = (version, now)
+        return known[0]
+
+    def _key(self, key):
+        version = self._current_version()
+        return '%s%s%s' % (
+            self.prefix, version + ':' if version else '',
+            hashlib.sha1(key.encode('utf-8')).hexdigest(),
+        )
+
+    def _get(self, key):
+        value = self.store.get(self._key(key))
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return self.loads(value)
+
+    def _set(self, key, value, ttl):
+        self.store.set(self._key(key), self.dumps(value), ttl)
+
+    def _delete(self, key):
+        self.store.delete(self._key(key))
+
+    def clear(self):
+        """
+        drop every entry by moving to a new version.  The old entries are
+        left in the store until their ttl runs out
+        """
+        version = uuid.uuid4().hex
+        self.store.set(self._version_key, version, None)
+        self._version = (version, self.clock())
+
+
+class RedisStore(object):
+    """SharedCache store on top of a redis-py client"""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def set(self, key, value, ttl):
+        if ttl:
+            self.redis.setex(key, int(ttl), value)
+        else:
+            self.redis.set(key, value)
+
+    def delete(self, key):
+        self.redis.delete(key)
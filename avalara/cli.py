@@ -0,0 +1,341 @@
+"""
+Bulk tax calls from the command line: orders in, results out.
+
+    python -m avalara orders.csv --output results.jsonl --concurrency 16
+    python -m avalara orders.jsonl --commit --checkpoint run.checkpoint
+
+Input is CSV with a header row or JSON Lines, one order line per row.
+Consecutive rows with the same doc_code make up one document.  Columns
+are named after the model fields:
+
+    document  doc_code, customer_code, doc_date (YYYY-MM-DD), company_code,
+              exemption_no and the other GetTaxRequest fields, read from
+              the first row of a document
+    addresses origin_ and destination_ followed by an Address field, such
+              as origin_address1 or destination_postal_code
+    line      item_code, qty, price or amount, tax_code, description and
+              the other OrderLine fields
+
+Documents are read, saved and written one at a time with at most
+concurrency of them in flight, so memory stays flat however large the
+input is.  Every document gets one JSON line in input order, its result
+or its error:
+
+    {"index": 0, "doc_code": "1", "ok": true, "result": {...}}
+    {"index": 1, "doc_code": "2", "ok": false, "error": "..."}
+
+With --checkpoint the number of documents written is recorded every
+--checkpoint-every documents.  Running the same command again resumes
+after them, dropping output written past the checkpoint.  Documents
+saved after the last checkpoint are sent again on resume, so with
+--commit the checkpoint is recorded after every document unless
+--checkpoint-every says otherwise.  A document that can't be built is
+written as an InputError naming its line and the bad field.  Totals,
+error counts and latency percentiles are written to stderr at the end.
+"""
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+from collections import Counter
+import csv
+import datetime
+import io
+import itertools
+import json
+import os
+import random
+import sys
+
+import six
+
+from . import serializers
+from .bulk import DEFAULT_CONCURRENCY, save_many
+from .client import Avalara
+from .compression import DEFLATE, GZIP
+from .instrumentation import clock
+from .models import GetTaxRequest, OrderLine
+from .resilience import RetryPolicy
+from .utils import atomic_write, percentile
+
+
+ADDRESS_PREFIXES = ('origin_', 'destination_')
+
+# set by the command line, not by the input
+RESERVED_FIELDS = frozenset(['commit', 'doc_type', 'addresses', 'olines'])
+DOCUMENT_FIELDS = frozenset(serializers.TaxDocumentSerializer._field_map) - RESERVED_FIELDS
+LINE_FIELDS = frozenset(
+    name for name in OrderLine.__slots__ if not name.startswith('_')
+) - frozenset(['line_number', 'tax_override', 'requested_tax_code'])
+
+# conversions of text values read from CSV
+DATE_FIELDS = frozenset(['doc_date'])
+INT_FIELDS = frozenset(['qty'])
+BOOL_FIELDS = frozenset(['discounted', 'tax_included'])
+
+DEFAULT_CHECKPOINT_EVERY = 100
+# latencies kept for the percentiles, sampled past this many documents
+LATENCY_SAMPLES = 10000
+
+
+def _convert(name, value):
+    if not isinstance(value, six.string_types):
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    if name in DATE_FIELDS:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    if name in INT_FIELDS:
+        return int(value)
+    if name in BOOL_FIELDS:
+        return value.lower() in ('1', 'true', 'yes', 'y')
+    return value
+
+
+def read_rows(stream, format):
+    """rows of a CSV or JSON Lines stream as dicts, lazily"""
+    if format == 'csv':
+        return csv.DictReader(stream)
+    return (json.loads(line) for line in stream if line.strip())
+
+
+def iter_orders(rows):
+    """(doc_code, rows) of every document, from consecutive rows"""
+    for doc_code, group in itertools.groupby(rows, lambda row: row.get('doc_code')):
+        yield doc_code, list(group)
+
+
+class InputError(ValueError):
+    """a document that can't be built from its rows"""
+
+
+def _input_error(where, error):
+    return InputError('%s: %s: %s' % (where, type(error).__name__, error))
+
+
+def build_request(rows, avalara_client=None):
+    """
+    a GetTaxRequest from the rows of one document.  Bad values raise
+    InputError naming the line, counted from 1 within the document
+    """
+    document = {}
+    try:
+        for name, value in six.iteritems(rows[0]):
+            if name in DOCUMENT_FIELDS:
+                document[name] = _convert(name, value)
+        request = GetTaxRequest(avalara_client=avalara_client, **document)
+    except (AttributeError, TypeError, ValueError) as e:
+        raise _input_error('document', e)
+    for line_number, row in enumerate(rows, 1):
+        addresses = dict((prefix, {}) for prefix in ADDRESS_PREFIXES)
+        line = {}
+        try:
+            for name, value in six.iteritems(row):
+                prefix = next((p for p in ADDRESS_PREFIXES if name.startswith(p)), None)
+                if prefix is not None:
+                    addresses[prefix][name[len(prefix):]] = _convert(name, value)
+                elif name in LINE_FIELDS:
+                    line[name] = _convert(name, value)
+                elif name not in DOCUMENT_FIELDS:
+                    raise ValueError('unknown column %r' % name)
+            request.add_line(
+                origin_code=request.add_address(**addresses['origin_']),
+                destination_code=request.add_address(**addresses['destination_']),
+                **line
+            )
+        except (AttributeError, TypeError, ValueError) as e:
+            raise _input_error('line %d' % line_number, e)
+    return request
+
+
+class _Document(object):
+    """what save_many saves: a built request, or the error building it"""
+
+    def __init__(self, doc_code, request=None, error=None):
+        self.doc_code = doc_code
+        self.request = request
+        self.error = error
+        self.seconds = None
+
+    @property
+    def lines(self):
+        return len(self.request.olines) if self.request is not None else 0
+
+    def save(self, commit=False):
+        if self.error is not None:
+            raise self.error
+        start = clock()
+        try:
+            return self.request.save(commit=commit)
+        finally:
+            self.seconds = clock() - start
+
+
+def iter_documents(orders, build):
+    for doc_code, rows in orders:
+        try:
+            yield _Document(doc_code, build(rows))
+        except Exception as e:
+            yield _Document(doc_code, error=e)
+
+
+class Reservoir(object):
+    """uniform sample of at most size values, for percentiles in flat memory"""
+
+    def __init__(self, size=LATENCY_SAMPLES, seed=None):
+        self.size = size
+        self.count = 0
+        self.values = []
+        self.random = random.Random(seed)
+
+    def add(self, value):
+        self.count += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            index = self.random.randrange(self.count)
+            if index < self.size:
+                self.values[index] = value
+
+    def percentile(self, p):
+        return percentile(self.values, p)
+
+
+def load_checkpoint(path):
+    """(documents, output bytes) written when path was saved, zeros without one"""
+    if not path or not os.path.exists(path):
+        return 0, 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    return checkpoint['documents'], checkpoint['output_bytes']
+
+
+def save_checkpoint(path, documents, output_bytes):
+    """replace the checkpoint at path atomically"""
+    with atomic_write(path, 'w') as f:
+        json.dump({'documents': documents, 'output_bytes': output_bytes}, f)
+
+
+def run(documents, output, commit=False, concurrency=DEFAULT_CONCURRENCY,
+        first_index=0, progress=None):
+    """
+    save documents and write their JSON lines to the binary stream output,
+    returns the stats.  progress is called with the number of documents
+    written so far and output after each one.  Stopping with ctrl-c ends
+    the run after the documents written so far
+    """
+    counts = Counter()
+    latency = Reservoir()
+    start = clock()
+    index = first_index
+    results = save_many(documents, commit=commit, concurrency=concurrency, ordered=True)
+    try:
+        for outcome in results:
+            document = outcome.request
+            record = {'index': index, 'doc_code': document.doc_code, 'ok': outcome.ok}
+            counts['documents'] += 1
+            counts['lines'] += document.lines
+            if outcome.ok:
+                record['result'] = outcome.result
+                counts['result.%s' % outcome.result.get('ResultCode')] += 1
+            else:
+                record['error'] = '%s: %s' % (type(outcome.error).__name__, outcome.error)
+                counts['errors'] += 1
+            if document.seconds is not None:
+                latency.add(document.seconds)
+            output.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+            index += 1
+            if progress is not None:
+                progress(index, output)
+    except KeyboardInterrupt:
+        counts['interrupted'] = 1
+    finally:
+        results.close()
+        output.flush()
+    elapsed = clock() - start
+    stats = dict(counts)
+    stats['seconds'] = round(elapsed, 3)
+    stats['documents_per_second'] = round(counts['documents'] / elapsed, 1) if elapsed else 0.0
+    for p in (50, 95, 99):
+        value = latency.percentile(p)
+        stats['latency_p%d_ms' % p] = None if value is None else round(value * 1000, 1)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m avalara', description='quote or commit orders in bulk',
+    )
+    parser.add_argument('input', help='orders file, - for stdin')
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help='input format, by default from the file extension')
+    parser.add_argument('--output', default='-', help='JSON Lines results, - for stdout')
+    parser.add_argument('--commit', action='store_true', help='commit instead of quoting')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='record progress here and resume from it')
+    parser.add_argument('--checkpoint-every', type=int, metavar='N',
+                        help='documents between checkpoints, %d or 1 with --commit'
+                        % DEFAULT_CHECKPOINT_EVERY)
+    parser.add_argument('--base-url', help='Avalara API url, AVALARA_BASE_URL by default')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='retries of failed uncommitted calls')
+    parser.add_argument('--compression', choices=(GZIP, DEFLATE))
+    parser.add_argument('--shard-lines', type=int, metavar='N',
+                        help='send uncommitted documents over N lines as shards')
+    args = parser.parse_args(argv)
+    if args.checkpoint and args.output == '-':
+        parser.error('--checkpoint needs an --output file')
+    if args.checkpoint_every is None:
+        # a committed document saved after the last checkpoint is sent again on resume
+        args.checkpoint_every = 1 if args.commit else DEFAULT_CHECKPOINT_EVERY
+    if args.concurrency < 1 or args.checkpoint_every < 1:
+        parser.error('--concurrency and --checkpoint-every must be at least 1')
+    input_format = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+
+    skip, output_bytes = load_checkpoint(args.checkpoint)
+    stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+    if args.output == '-':
+        output = stdout
+    else:
+        output = open(args.output, 'r+b' if skip and os.path.exists(args.output) else 'wb')
+        # drop anything written after the checkpoint
+        output.seek(output_bytes)
+        output.truncate()
+    source = sys.stdin if args.input == '-' else io.open(args.input, newline='')
+    client = Avalara(
+        base_url=args.base_url, pool_maxsize=args.concurrency,
+        retry=RetryPolicy(max_attempts=args.retries + 1) if args.retries else None,
+        compression=args.compression,
+    )
+
+    def build(rows):
+        request = build_request(rows, client)
+        request.shard_lines = args.shard_lines
+        return request
+
+    written = [skip]
+
+    def progress(documents, stream):
+        written[0] = documents
+        if args.checkpoint and documents % args.checkpoint_every == 0:
+            stream.flush()
+            save_checkpoint(args.checkpoint, documents, stream.tell())
+
+    orders = itertools.islice(iter_orders(read_rows(source, input_format)), skip, None)
+    try:
+        stats = run(iter_documents(orders, build), output, commit=args.commit,
+                    concurrency=args.concurrency, first_index=skip, progress=progress)
+        if args.checkpoint:
+            save_checkpoint(args.checkpoint, written[0], output.tell())
+    finally:
+        client.close()
+        if source is not sys.stdin:
+            source.close()
+        if output is not stdout:
+            output.close()
+    stats['skipped'] = skip
+    print(json.dumps(stats, indent=2, sort_keys=True), file=sys.stderr)
+    if stats.get('interrupted'):
+        return 130
+    return 1 if stats.get('errors') else 0
@@ -1,21 +1,224 @@
 from __future__ import unicode_literals
 
 import base64
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
 import os
+import threading
+import time
 
 import requests
-from six.moves.urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+import six
+from six.moves.urllib.parse import quote, urljoin
+
+from .compression import (
+    ACCEPT_ENCODING,
+    DEFAULT_COMPRESS_MIN_BYTES,
+    compress,
+    iter_compressed,
+)
+from .estimate import (
+    DEFAULT_ESTIMATE_PRECISION,
+    bucket_key,
+    estimate_from_rate,
+    rate_entry,
+)
+from .exceptions import CircuitOpenError
+from .instrumentation import NULL_INSTRUMENTATION, clock
+from .resilience import RETRY_STATUSES
+from .responses import CancelTaxResult, GetTaxResult, ValidateAddressResult
+from .sharding import merge_results, split_document
+from .streaming import DEFAULT_ENCODER
+from .utils import address_cache_key
 
 
 DEFAULT_BASE_URL = 'https://development.avalara.net/1.0/'
 
+# connection pool defaults, see requests.adapters.HTTPAdapter
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+# None waits forever like requests does.  Pass a float or a
+# (connect, read) tuple to bound every call
+DEFAULT_TIMEOUT = None
+
+# endpoint names used for per endpoint timeouts and latency tracking
+TAX_GET = 'tax/get'
+TAX_CANCEL = 'tax/cancel'
+TAX_ESTIMATE = 'tax/estimate'
+ADDRESS_VALIDATE = 'address/validate'
+
 
-class Avalara(object):
+class BaseAvalara(object):
+    """
+    Request building shared by the blocking and the asyncio clients.
+    Endpoint methods return whatever _make_request returns, a decoded
+    response for Avalara and an awaitable for AsyncAvalara
+    """
+    is_async = False
 
-    def __init__(self, account_number=None, license_key=None, **kwargs):
+    def __init__(self, account_number=None, license_key=None, base_url=None,
+                 timeout=DEFAULT_TIMEOUT, address_cache=None,
+                 estimate_cache=None,
+                 estimate_precision=DEFAULT_ESTIMATE_PRECISION,
+                 json_decoder=json.loads, typed_responses=False, timeouts=None,
+                 retry=None, hedge=None, circuit_breaker=None, write_behind=None,
+                 single_flight=None, quote_cache=None, rate_table=None,
+                 instrumentation=None, compression=None,
+                 compress_min_bytes=DEFAULT_COMPRESS_MIN_BYTES, **kwargs):
         self.account_number = account_number or os.getenv('AVALARA_ACCOUNT_NUMBER')
         self.license_key = license_key or os.getenv('AVALARA_LICENSE_KEY')
-        self.base_url = os.getenv('AVALARA_BASE_URL') or DEFAULT_BASE_URL
+        self.base_url = base_url or os.getenv('AVALARA_BASE_URL') or DEFAULT_BASE_URL
+        self.timeout = timeout
+        # opt-in avalara.cache.BaseCache for validate_address responses
+        self.address_cache = address_cache
+        # opt-in avalara.cache.BaseCache of tax rates per coordinate bucket,
+        # estimates in a cached bucket are computed without a request
+        self.estimate_cache = estimate_cache
+        self.estimate_precision = estimate_precision
+        # decodes response bodies from bytes, swap in a faster parser such
+        # as orjson.loads without touching call sites
+        self.json_decoder = json_decoder
+        # return avalara.responses results instead of the decoded dicts
+        self.typed_responses = typed_responses
+        # endpoint name -> timeout, endpoints not listed use timeout
+        self.timeouts = timeouts or {}
+        # avalara.resilience policies, all opt-in.  retry and hedge only
+        # apply to idempotent calls: address validation, estimates and
+        # uncommitted tax/get
+        self.retry = retry
+        self.hedge = hedge
+        self.circuit_breaker = circuit_breaker
+        # avalara.writebehind.WriteBehindQueue taking over committed
+        # documents, opt-in
+        self.write_behind = write_behind
+        # avalara.coalesce.SingleFlight sharing identical uncommitted
+        # tax/get calls that are in flight at the same time, opt-in
+        self.single_flight = single_flight
+        # avalara.cache.QuoteCache of uncommitted tax/get results, opt-in
+        self.quote_cache = quote_cache
+        # avalara.ratetable.RateTable estimating uncommitted tax/get calls
+        # while the circuit breaker is open, opt-in
+        self.rate_table = rate_table
+        # avalara.instrumentation.Instrumentation receiving the timings
+        # and sizes of every call, the default drops them
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        # Content-Encoding of request bodies of compress_min_bytes and
+        # more, 'gzip' or 'deflate'.  None sends them uncompressed
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+
+    def _timeout_for(self, endpoint):
+        return self.timeouts.get(endpoint, self.timeout)
+
+    def _before_call(self):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call()
+
+    def _record(self, status_code):
+        """record a response status, None for a failed request"""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(
+                status_code is not None and status_code not in RETRY_STATUSES
+            )
+
+    def _should_retry(self, attempt, status_code=None):
+        """
+        whether attempt, counted from 0, is followed by another one after
+        a failed request or a response with status_code
+        """
+        retry = self.retry
+        if retry is None or attempt + 1 >= retry.max_attempts:
+            return False
+        return status_code is None or status_code in retry.retry_statuses
+
+    def _encode(self, json, data, endpoint):
+        """
+        the body to send and its extra headers: json encoded compactly,
+        bytes data as is and chunks counted as they are sent, compressed
+        when the client compresses and the body is large enough
+        """
+        metrics = self.instrumentation
+        if json is not None:
+            start = clock()
+            data = DEFAULT_ENCODER.encode(json).encode('utf-8')
+            metrics.timing('encode', clock() - start, endpoint=endpoint)
+        if data is None:
+            return None, {}
+        encoding = self.compression
+        if not isinstance(data, bytes):
+            data = self._counted(data, 'request_bytes', endpoint)
+            if encoding is None:
+                return data, {}
+            data = self._counted(iter_compressed(data, encoding), 'request_wire_bytes', endpoint)
+            return data, {'Content-Encoding': encoding}
+        metrics.size('request_bytes', len(data), endpoint=endpoint)
+        if encoding is None or len(data) < self.compress_min_bytes:
+            metrics.size('request_wire_bytes', len(data), endpoint=endpoint)
+            return data, {}
+        start = clock()
+        data = compress(data, encoding)
+        metrics.timing('compress', clock() - start, endpoint=endpoint)
+        metrics.size('request_wire_bytes', len(data), endpoint=endpoint)
+        return data, {'Content-Encoding': encoding}
+
+    def _counted(self, chunks, name, endpoint):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        self.instrumentation.size(name, size, endpoint=endpoint)
+
+    def _decode(self, body, endpoint, wire_size=None):
+        """
+        decode a response body, already decompressed by the transport.
+        wire_size is the size it was received with, when known
+        """
+        metrics = self.instrumentation
+        metrics.size('response_bytes', len(body), endpoint=endpoint)
+        metrics.size('response_wire_bytes', len(body) if wire_size is None else wire_size,
+                     endpoint=endpoint)
+        start = clock()
+        result = self.json_decoder(body)
+        metrics.timing('decode', clock() - start, endpoint=endpoint)
+        return result
+
+    def _record_latency(self, endpoint, seconds, status_code=None):
+        """time a request, status_code None when it failed"""
+        self.instrumentation.timing(
+            'request', seconds, endpoint=endpoint,
+            status='error' if status_code is None else six.text_type(status_code),
+        )
+        if self.hedge is not None and status_code is not None:
+            self.hedge.record(endpoint, seconds)
+
+    def _resolved(self, value):
+        """return an already known value the way _make_request would"""
+        return value
+
+    def _then(self, result, callback):
+        """apply callback to the value of a _make_request result"""
+        return callback(result)
+
+    def _catch(self, call, exception_class, handler):
+        """call(), or handler(error) when it raises exception_class"""
+        try:
+            return call()
+        except exception_class as e:
+            return handler(e)
+
+    def _coalesce(self, key, call):
+        """call(), or the result of the call in flight for key"""
+        return self.single_flight.do(key, call)
+
+    def _gather(self, calls):
+        """the results of calls in order, made concurrently where possible"""
+        return [call() for call in calls]
+
+    def _typed(self, result, result_class):
+        if not self.typed_responses:
+            return result
+        return self._then(result, result_class)
 
     @property
     def _auth_token(self):
@@ -23,26 +226,30 @@ class Avalara(object):
             ':'.join([self.account_number, self.license_key]).encode('ascii')
         ).decode()
 
-    def _make_request(self, method, url, params=None, json=None):
-        response = requests.request(
-            method, url, params=params, json=json, headers={
-                'Authorization': 'Basic %s' % str(self._auth_token),
-                'Content-Type': 'application/json'
-            }
-        )
-        return response.json()
+    @property
+    def _headers(self):
+        return {
+            'Authorization': 'Basic %s' % str(self._auth_token),
+            'Content-Type': 'application/json',
+            'Accept-Encoding': ACCEPT_ENCODING,
+        }
 
-    def _build_url(self, endpoint, **replacements):
-        for k, v in replacements:
-            #TODO build estimate tax url with replacements
-            pass
+    def _make_request(self, method, url, params=None, json=None, data=None,
+                      endpoint=None, idempotent=False):
+        raise NotImplementedError
 
+    def _build_url(self, endpoint, **replacements):
+        """join endpoint to base_url, filling in {name} path segments"""
+        if replacements:
+            endpoint = endpoint.format(**{
+                k: quote(six.text_type(v), safe='') for k, v in six.iteritems(replacements)
+            })
         return urljoin(self.base_url, endpoint)
 
     def validate_address(self, address1, country, address2='',
                          address3='', city='', region='', postal_code=''):
 
-        url = self._build_url('address/validate')
+        url = self._build_url(ADDRESS_VALIDATE)
         request_data = {
             'Line1': address1,
             'Line2': address2,
@@ -52,19 +259,388 @@ class Avalara(object):
             'Region': region,
             'PostalCode': postal_code
         }
-        return self._make_request('get', url, params=request_data)
+        cache = self.address_cache
+        if cache is None:
+            result = self._make_request('get', url, params=request_data,
+                                        endpoint=ADDRESS_VALIDATE, idempotent=True)
+            return self._typed(result, ValidateAddressResult)
+
+        key = address_cache_key(address1, address2, address3, city, region,
+                                postal_code, country)
+        cached = cache.get(key)
+        if cached is not None:
+            return self._typed(self._resolved(cached), ValidateAddressResult)
+
+        def store(response):
+            # errors may be transient, only remember validated addresses
+            if response.get('ResultCode') == 'Success':
+                cache.set(key, response)
+            return response
+
+        result = self._make_request('get', url, params=request_data,
+                                    endpoint=ADDRESS_VALIDATE, idempotent=True)
+        return self._typed(self._then(result, store), ValidateAddressResult)
 
     def estimate_tax(self, latitude, longitude, sale_amount):
-        url = self._build_url('{{longitude}},{{latitude}}/tax/estimate?{{saleamount}}',
-                              latitude=latitude, longitude=longitude, saleamount=sale_amount)
-        return self._make_request('get', url)
+        url = self._build_url('tax/{latitude},{longitude}/get',
+                              latitude=latitude, longitude=longitude)
+        params = {'saleamount': six.text_type(sale_amount)}
+        cache = self.estimate_cache
+        if cache is None:
+            return self._make_request('get', url, params=params,
+                                      endpoint=TAX_ESTIMATE, idempotent=True)
+
+        key = bucket_key(latitude, longitude, self.estimate_precision)
+        entry = cache.get(key)
+        if entry is not None:
+            return self._resolved(estimate_from_rate(entry, sale_amount))
+
+        def store(response):
+            if response.get('ResultCode') == 'Success':
+                cache.set(key, rate_entry(response))
+            return response
+
+        result = self._make_request('get', url, params=params,
+                                    endpoint=TAX_ESTIMATE, idempotent=True)
+        return self._then(result, store)
+
+    def get_tax(self, request_body):
+        """
+        post a serialized GetTaxRequest body to tax/get.  Committed
+        documents go to the write-behind queue instead when there is one,
+        uncommitted ones are answered from the quote cache when possible
+        """
+        commit = request_body.get('Commit')
+        if self.write_behind is not None and commit:
+            result = self._resolved(self.write_behind.submit(request_body))
+        elif not commit:
+            result = self._quote(request_body)
+        else:
+            result = self._get_tax(request_body)
+        return self._typed(result, GetTaxResult)
+
+    def get_tax_sharded(self, request_body, shard_lines):
+        """
+        get_tax for an uncommitted document, split into shards of at most
+        shard_lines lines that are sent concurrently and merged back into
+        one result, see avalara.sharding
+        """
+        if request_body.get('Commit'):
+            raise ValueError('committed documents cannot be sharded')
+        shards = split_document(request_body, shard_lines)
+        if len(shards) == 1:
+            return self.get_tax(request_body)
+        self.instrumentation.size('shards', len(shards))
+        results = self._gather([lambda shard=shard: self._quote(shard) for shard in shards])
+        merged = self._then(results, lambda results: merge_results(request_body, results))
+        return self._typed(merged, GetTaxResult)
+
+    def _quote(self, request_body):
+        """_get_tax for an uncommitted body, through the quote cache"""
+        cache = self.quote_cache
+        if cache is None:
+            return self._get_tax(request_body)
+        cached = cache.get_quote(request_body)
+        if cached is not None:
+            return self._resolved(cached)
+        return self._then(self._get_tax(request_body),
+                          lambda response: cache.set_quote(request_body, response))
+
+    def _get_tax(self, request_body):
+        """post request_body, returns the decoded response"""
+        url = self._build_url(TAX_GET)
+        # a committed document is not safe to send twice
+        commit = request_body.get('Commit')
+
+        def call():
+            return self._make_request('post', url, json=request_body, endpoint=TAX_GET,
+                                      idempotent=not commit)
+
+        if commit:
+            return call()
+        if self.rate_table is not None:
+            call = self._estimate_when_open(call, request_body)
+        flight = self.single_flight
+        if flight is None:
+            return call()
+        result = self._coalesce(flight.fingerprint(request_body), call)
+        return self._then(result, lambda response: flight.rekey(response, request_body))
+
+    def _estimate_when_open(self, call, request_body):
+        """wrap call to estimate from rate_table if the circuit is open"""
+        def estimate(error):
+            result = self.rate_table.estimate(request_body)
+            if result['ResultCode'] == 'Error':
+                raise error
+            return result
+
+        def call_or_estimate():
+            return self._catch(call, CircuitOpenError, estimate)
+        return call_or_estimate
+
+    def get_tax_chunks(self, chunks):
+        """
+        post a GetTaxRequest body already encoded as an iterable of byte
+        chunks, see avalara.streaming.  It is sent with chunked transfer
+        encoding as the chunks are produced
+        """
+        url = self._build_url(TAX_GET)
+        # chunks can only be sent once, no retries
+        result = self._make_request('post', url, data=chunks, endpoint=TAX_GET)
+        return self._typed(result, GetTaxResult)
 
     def void_document(self, doc_code, doc_type='SalesInvoice', company_code='SOC', cancel_code='DocVoided'):
+        if (self.write_behind is not None and doc_type == 'SalesInvoice' and
+                self.write_behind.cancel(doc_code)):
+            # never reached Avalara, nothing to void there
+            cancelled = self._resolved({'CancelTaxResult': {
+                'DocCode': doc_code,
+                'ResultCode': 'Success',
+            }})
+            return self._typed(cancelled, CancelTaxResult)
         cancel_tax_request = {
             'CancelCode': cancel_code,
             'CompanyCode': company_code,
             'DocCode': doc_code,
             'DocType': doc_type,
         }
-        url = self._build_url('tax/cancel')
-        return self._make_request('post', url, json=cancel_tax_request)
+        url = self._build_url(TAX_CANCEL)
+        result = self._make_request('post', url, json=cancel_tax_request, endpoint=TAX_CANCEL)
+        return self._typed(result, CancelTaxResult)
+
+
+def _wire_size(response):
+    """bytes of a requests response body as received, None if unknown"""
+    # urllib3 counts the body bytes read before decompressing them
+    tell = getattr(response.raw, 'tell', None)
+    size = tell() if callable(tell) else None
+    return size if isinstance(size, six.integer_types) else None
+
+
+class Avalara(BaseAvalara):
+    """
+    Avalara client.  Owns a keep-alive connection pool that is created on
+    first use, shared by every thread using the client and rebuilt in a
+    child process after a fork.  Call close() or use the client as a context
+    manager to release the pooled connections.
+    """
+
+    def __init__(self, account_number=None, license_key=None, base_url=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+                 timeout=DEFAULT_TIMEOUT, keep_alive=True, **kwargs):
+        super(Avalara, self).__init__(
+            account_number, license_key, base_url=base_url, timeout=timeout,
+            **kwargs
+        )
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        # name -> (session, thread pool, its idle threads) of the pools below
+        self._executors = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @property
+    def session(self):
+        """
+        pooled requests session for the current process.  A session
+        inherited through fork is dropped without closing it, its sockets
+        still belong to the parent
+        """
+        pid = os.getpid()
+        session = self._session
+        if session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self._build_session()
+                    self._session_pid = pid
+                session = self._session
+        return session
+
+    def _executor(self, name):
+        """
+        a thread pool of pool_maxsize threads and a semaphore counting its
+        idle ones, replaced along with the session
+        """
+        session = self.session
+        with self._session_lock:
+            executor = self._executors.get(name)
+            if executor is None or executor[0] is not session:
+                executor = (
+                    session, ThreadPoolExecutor(max_workers=self.pool_maxsize),
+                    threading.BoundedSemaphore(self.pool_maxsize),
+                )
+                self._executors[name] = executor
+        return executor[1:]
+
+    @property
+    def hedge_executor(self):
+        """threads running hedged requests"""
+        return self._executor('hedge')[0]
+
+    @property
+    def shard_executor(self):
+        """
+        threads sending the shards of a sharded document.  Separate from
+        hedge_executor, a shard waiting for its hedged request must not
+        hold the thread the hedge needs
+        """
+        return self._executor('shard')[0]
+
+    def close(self):
+        """close pooled connections, a later request opens a new pool"""
+        with self._session_lock:
+            session, self._session = self._session, None
+            if session is not None and self._session_pid == os.getpid():
+                session.close()
+            self._session_pid = None
+            executors, self._executors = self._executors, {}
+            for executor_session, executor, _ in executors.values():
+                if executor_session is session:
+                    executor.shutdown(wait=False)
+
+    def _send(self, method, url, endpoint, headers=None, **kwargs):
+        start = clock()
+        all_headers = self._headers
+        if headers:
+            all_headers.update(headers)
+        try:
+            response = self.session.request(
+                method, url, headers=all_headers, timeout=self._timeout_for(endpoint),
+                **kwargs
+            )
+        except Exception:
+            self._record_latency(endpoint, clock() - start)
+            raise
+        self._record_latency(endpoint, clock() - start, response.status_code)
+        return response
+
+    def _send_hedged(self, method, url, endpoint, **kwargs):
+        """
+        send the request and a second copy if the first one is slower than
+        the hedge delay.  The first response wins, the other request is
+        left to finish in the background.  Requests only go to idle hedge
+        threads and the delay counts from when the first one starts, so a
+        saturated client sends each call once instead of piling up copies
+        """
+        delay = self.hedge.delay(endpoint)
+        if delay is None:
+            return self._send(method, url, endpoint, **kwargs)
+        executor, idle = self._executor('hedge')
+        first = self._submit_idle(executor, idle, method, url, endpoint, kwargs)
+        if first is None:
+            return self._send(method, url, endpoint, **kwargs)
+        first, started = first
+        started.wait()
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = self._submit_idle(executor, idle, method, url, endpoint, kwargs)
+        if second is None:
+            return first.result()
+        pending = set([first, second[0]])
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+
+    def _submit_idle(self, executor, idle, method, url, endpoint, kwargs):
+        """
+        (future, event set once it starts) of a request sent on an idle
+        thread of executor, None when none is idle
+        """
+        if not idle.acquire(False):
+            return None
+        started = threading.Event()
+
+        def send():
+            started.set()
+            try:
+                return self._send(method, url, endpoint, **kwargs)
+            finally:
+                idle.release()
+        try:
+            return executor.submit(send), started
+        except Exception:
+            idle.release()
+            raise
+
+    def _gather(self, calls):
+        # the first call runs on the calling thread
+        executor = self.shard_executor
+        futures = [executor.submit(call) for call in calls[1:]]
+        first = calls[0]()
+        return [first] + [future.result() for future in futures]
+
+    def _make_request(self, method, url, params=None, json=None, data=None,
+                      endpoint=None, idempotent=False):
+        send = self._send_hedged if idempotent and self.hedge is not None else self._send
+        data, headers = self._encode(json, data, endpoint)
+        attempt = 0
+        while True:
+            self._before_call()
+            try:
+                response = send(method, url, endpoint, params=params, data=data, headers=headers)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(None)
+                if not (idempotent and self._should_retry(attempt)):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+            except Exception:
+                # any failure ends a trial call of a half open circuit
+                self._record(None)
+                raise
+            else:
+                self._record(response.status_code)
+                delay = None
+                if idempotent and self._should_retry(attempt, response.status_code):
+                    delay = self.retry.delay(attempt, response.headers.get('Retry-After'))
+                if delay is None:
+                    return self._decode(response.content, endpoint, _wire_size(response))
+                time.sleep(delay)
+            attempt += 1
+            self.instrumentation.increment('retries', endpoint=endpoint)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    return the process wide client configured from the environment.  Models
+    use it unless a client is passed in, so every document shares one pool
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = Avalara()
+    return _default_client
@@ -0,0 +1,99 @@
+"""
+Single-flight coalescing of identical uncommitted tax/get calls.
+
+Storefronts tend to quote the same cart several times at once.  With a
+SingleFlight on the client, a quote identical to one already in flight
+waits for that call instead of sending its own and every caller gets the
+result:
+
+    client = Avalara(single_flight=SingleFlight())
+
+Requests are identical when their bodies match apart from the ignored
+fields.  Ignored fields the response echoes back, such as DocCode, are
+set to each caller's own value in the result it receives.
+"""
+from __future__ import unicode_literals
+
+from concurrent.futures import Future
+import threading
+
+import six
+
+from .utils import canonical_digest
+
+
+# fields that differ between otherwise identical quotes of one cart
+DEFAULT_IGNORED_FIELDS = ('DocCode', 'DocDate')
+
+
+def fingerprint(request_body, ignore=DEFAULT_IGNORED_FIELDS):
+    """
+    digest of request_body without the top level ignore fields, the same
+    for bodies that only differ in key order
+    """
+    return canonical_digest(
+        dict((k, v) for k, v in six.iteritems(request_body) if k not in ignore)
+    )
+
+
+class SingleFlight(object):
+    """
+    share one call between concurrent callers with the same fingerprint.
+    Only calls that overlap are shared, nothing is kept once a call
+    finishes.  Safe to share between threads; AsyncAvalara keeps its own
+    in-flight calls per client and only uses the fingerprint and counters
+    """
+
+    def __init__(self, ignore=DEFAULT_IGNORED_FIELDS):
+        self.ignore = frozenset(ignore)
+        self.calls = 0
+        self.shared = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, request_body):
+        return fingerprint(request_body, self.ignore)
+
+    def stats(self):
+        """calls made and calls answered by another caller's call"""
+        return {'calls': self.calls, 'shared': self.shared}
+
+    def record(self, shared):
+        """count a call, shared when it was answered by one in flight"""
+        if shared:
+            self.shared += 1
+        else:
+            self.calls += 1
+
+    def do(self, key, call):
+        """return call(), or the result of the identical call in flight"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            shared = future is not None
+            if not shared:
+                future = self._in_flight[key] = Future()
+            self.record(shared)
+        if shared:
+            return future.result()
+        try:
+            result = call()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def rekey(self, result, request_body):
+        """
+        a copy of a shared result carrying the ignored fields of the
+        caller's own request_body
+        """
+        result = dict(result)
+        for k in self.ignore:
+            if k in result and k in request_body:
+                result[k] = request_body[k]
+        return result
@@ -0,0 +1,118 @@
+"""
+Single pass serialization engine.
+
+compile_serializer turns a serpy Serializer class into a plain function that
+reads the model attributes, converts them with the fields' to_value and
+leaves out empty values as it goes.  Its output is identical to
+remove_nulls_from_dict(serializer(instance).data) without building the
+intermediate dictionaries or walking them a second time.
+"""
+from __future__ import unicode_literals
+
+import operator
+import re
+
+import six
+from serpy import Serializer
+
+from . import serializers
+from .utils import remove_nulls_from_dict
+
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# to_value functions known to return scalars, anything else may return a
+# container that has to go through remove_nulls_from_dict
+SCALAR_CONVERTERS = frozenset([
+    bool,
+    float,
+    int,
+    six.text_type,
+    serializers.get_date_value,
+    serializers.get_decimal_value,
+    serializers.get_string_value,
+])
+
+_compiled = {}
+
+
+def _attribute(field, name, serializer_cls):
+    """attribute name to read inline, None when a getter is needed"""
+    if field.as_getter(name, serializer_cls) is not None:
+        return None
+    if serializer_cls.default_getter is not operator.attrgetter:
+        return None
+    attr = field.attr or name
+    return attr if _IDENTIFIER.match(attr) else None
+
+
+def _generate(serializer_cls):
+    namespace = {'_remove_nulls': remove_nulls_from_dict}
+    lines = ['def serialize(o):', '    d = {}']
+    fields = zip(serializer_cls._field_map.items(), serializer_cls._compiled_fields)
+    for i, ((name, field), compiled) in enumerate(fields):
+        label, getter, to_value, call, required, pass_self = compiled
+        key = repr(str(label))
+        attr = _attribute(field, name, serializer_cls)
+        if pass_self:
+            namespace['g%d' % i] = getter
+            namespace['s%d' % i] = serializer_cls()
+            lines.append('    v = g%d(s%d, o)' % (i, i))
+        elif attr is not None:
+            lines.append('    v = o.%s' % attr)
+        else:
+            namespace['g%d' % i] = getter
+            lines.append('    v = g%d(o)' % i)
+
+        # conversions, skipped for a None value of an optional field
+        convert = []
+        if isinstance(field, Serializer):
+            namespace['c%d' % i] = compile_serializer(type(field))
+            if call and not pass_self:
+                convert.append('v = v()')
+            if field.many:
+                convert.append('v = [c%d(e) for e in v]' % i)
+                convert.append('if v:')
+                convert.append('    d[%s] = v' % key)
+            else:
+                # a nested object is kept even when all its values are empty
+                convert.append('d[%s] = c%d(v)' % (key, i))
+        elif not pass_self:
+            if call:
+                convert.append('v = v()')
+            if to_value is not None:
+                namespace['t%d' % i] = to_value
+                convert.append('v = t%d(v)' % i)
+
+        if convert and not pass_self and not required:
+            lines.append('    if v is not None:')
+            lines.extend('        ' + line for line in convert)
+        else:
+            lines.extend('    ' + line for line in convert)
+        if isinstance(field, Serializer):
+            continue
+
+        lines.append('    if v:')
+        if to_value in SCALAR_CONVERTERS:
+            lines.append('        d[%s] = v' % key)
+        else:
+            lines.append('        d[%s] = _remove_nulls(v)' % key)
+    lines.append('    return d')
+
+    source = '\n'.join(lines)
+    code = compile(source, '<compiled %s>' % serializer_cls.__name__, 'exec')
+    six.exec_(code, namespace)
+    serialize = namespace['serialize']
+    serialize.source = source
+    return serialize
+
+
+def compile_serializer(serializer_cls):
+    """
+    return the compiled serialization function for a serpy Serializer
+    class, generated on first use and reused afterwards
+    """
+    try:
+        return _compiled[serializer_cls]
+    except KeyError:
+        return _compiled.setdefault(serializer_cls, _generate(serializer_cls))
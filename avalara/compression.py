@@ -0,0 +1,68 @@
+"""
+Content-Encoding of request bodies.
+
+Tax requests repeat the same keys and addresses on every line and
+compress to a fraction of their size.  A client created with
+compression='gzip' or 'deflate' compresses bodies of at least
+compress_min_bytes, below that the few bytes saved do not pay for the
+compression time.  Streamed bodies are compressed chunk by chunk as they
+are sent.  Responses are decompressed by requests and aiohttp, clients
+ask for them with Accept-Encoding.
+"""
+from __future__ import unicode_literals
+
+import zlib
+
+
+GZIP = 'gzip'
+DEFLATE = 'deflate'
+
+# zlib window bits of each Content-Encoding: deflate is the zlib format,
+# gzip adds the gzip header and trailer
+_WBITS = {GZIP: 16 + zlib.MAX_WBITS, DEFLATE: zlib.MAX_WBITS}
+
+ACCEPT_ENCODING = ', '.join([GZIP, DEFLATE])
+
+# bodies smaller than this are sent as they are
+DEFAULT_COMPRESS_MIN_BYTES = 1024
+# zlib's default, most of the gain of 9 at a fraction of the time
+DEFAULT_COMPRESS_LEVEL = 6
+
+
+def compressor(encoding, level=DEFAULT_COMPRESS_LEVEL):
+    try:
+        wbits = _WBITS[encoding]
+    except KeyError:
+        raise ValueError('unsupported compression %r, use %s or %s' % (encoding, GZIP, DEFLATE))
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+
+def compress(data, encoding, level=DEFAULT_COMPRESS_LEVEL):
+    """data compressed for the Content-Encoding encoding"""
+    compressobj = compressor(encoding, level)
+    return compressobj.compress(data) + compressobj.flush()
+
+
+def iter_compressed(chunks, encoding, level=DEFAULT_COMPRESS_LEVEL):
+    """
+    compress an iterable of byte chunks as one stream.  Chunks the
+    compressor holds on to are not yielded as empty chunks, an empty
+    chunk ends a chunked transfer
+    """
+    compressobj = compressor(encoding, level)
+    for chunk in chunks:
+        chunk = compressobj.compress(chunk)
+        if chunk:
+            yield chunk
+    yield compressobj.flush()
+
+
+def decompress(data, encoding):
+    """the body of a request or response sent with Content-Encoding encoding"""
+    if not encoding or encoding == 'identity':
+        return data
+    try:
+        wbits = _WBITS[encoding]
+    except KeyError:
+        raise ValueError('unsupported Content-Encoding %r' % encoding)
+    return zlib.decompress(data, wbits)
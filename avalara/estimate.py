@@ -0,0 +1,54 @@
+from __future__ import unicode_literals
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import six
+
+from .utils import decimal_value, round_cents
+
+
+# decimal places coordinates are rounded to, 3 is roughly 100 meters
+DEFAULT_ESTIMATE_PRECISION = 3
+
+
+def bucket_key(latitude, longitude, precision=DEFAULT_ESTIMATE_PRECISION):
+    """rate cache key for the bucket a coordinate falls in"""
+    quantum = Decimal(1).scaleb(-precision)
+    return 'estimate:%s,%s' % (
+        decimal_value(latitude).quantize(quantum, rounding=ROUND_HALF_UP),
+        decimal_value(longitude).quantize(quantum, rounding=ROUND_HALF_UP),
+    )
+
+
+def rate_entry(response):
+    """the amount independent part of a tax estimate response"""
+    return {
+        'Rate': response['Rate'],
+        'TaxDetails': [
+            {k: v for k, v in six.iteritems(detail) if k != 'Tax'}
+            for detail in response.get('TaxDetails') or []
+        ],
+    }
+
+
+def _tax(rate, sale_amount):
+    return float(round_cents(decimal_value(rate) * decimal_value(sale_amount)))
+
+
+def estimate_from_rate(entry, sale_amount):
+    """
+    build a tax estimate response locally from a cached rate entry.  Tax is
+    rate times sale_amount rounded half up to cents, for the document and
+    each jurisdiction
+    """
+    details = []
+    for detail in entry['TaxDetails']:
+        detail = dict(detail)
+        detail['Tax'] = _tax(detail.get('Rate') or 0, sale_amount)
+        details.append(detail)
+    return {
+        'Rate': entry['Rate'],
+        'Tax': _tax(entry['Rate'], sale_amount),
+        'TaxDetails': details,
+        'ResultCode': 'Success',
+    }
@@ -1,2 +1,11 @@
-class AvalaraExceptionResponse(Exception):
-    pass
\ No newline at end of file
+class AvalaraException(Exception):
+    pass
+
+
+class AvalaraExceptionResponse(AvalaraException):
+    pass
+
+
+class CircuitOpenError(AvalaraException):
+    """raised without calling Avalara while the circuit breaker is open"""
+    pass
@@ -0,0 +1,391 @@
+"""
+Local stand-in for the Avalara 1.0 endpoints the clients use, for load
+tests, benchmarks and resilience drills without the network.
+
+tax/get taxes the lines of the GetTaxRequest bodies this package sends at
+the rate of their destination, from a RateTable, a dict of postal codes
+or the default rate.  Latency, injected errors and 429 throttling are
+configurable and every response is counted in stats():
+
+    fake = FakeAvalara(rates={'98101': '0.1025'}, latency=uniform(0.01, 0.05),
+                       error_rate=0.01, throttle=2000)
+    with FakeAvalaraServer(fake) as server:
+        client = Avalara('1234', 'abcd', base_url=server.base_url)
+
+or from a shell:
+
+    python -m avalara.fakeserver --port 8080 --rate 0.0825 --throttle 2000
+"""
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+from collections import Counter
+from decimal import Decimal
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+
+import six
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import parse_qsl, unquote, urlsplit
+
+from .compression import DEFAULT_COMPRESS_MIN_BYTES, GZIP, compress, decompress
+from .ratetable import RateTable, calculate_tax, postal_key
+from .utils import decimal_value, round_cents
+
+
+DEFAULT_RATE = Decimal('0.08')
+
+_ESTIMATE_PATH = re.compile(r'^tax/(?P<latitude>[^,/]+),(?P<longitude>[^,/]+)/get$')
+
+
+def fixed(seconds):
+    """latency distribution always waiting seconds"""
+    return lambda random: seconds
+
+
+def uniform(low, high):
+    """latency distribution uniform between low and high seconds"""
+    return lambda random: random.uniform(low, high)
+
+
+def lognormal(median, sigma=0.5):
+    """long tailed latency distribution around median seconds"""
+    mu = math.log(median)
+    return lambda random: random.lognormvariate(mu, sigma)
+
+
+def _error(summary, name='InputError'):
+    return {
+        'ResultCode': 'Error',
+        'Messages': [{'Severity': 'Error', 'Name': name, 'Summary': summary}],
+    }
+
+
+class FakeAvalara(object):
+    """
+    the behaviour of the fake, independent of the HTTP server.  rates is
+    a RateTable or a dict of postal code to rate, destinations it does not
+    know are taxed at default_rate.  latency is a distribution from this
+    module, error_rate the share of calls answered with error_status and
+    throttle the requests per second allowed before answering 429.  seed
+    makes latency and error injection repeatable
+    """
+
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE, latency=None,
+                 error_rate=0.0, error_status=503, throttle=None, seed=None,
+                 clock=time.time):
+        self.default_rate = None if default_rate is None else decimal_value(default_rate)
+        if isinstance(rates, RateTable):
+            self.rate_table, self.rates = rates, {}
+        else:
+            self.rate_table = None
+            self.rates = dict(
+                (postal_key(k), decimal_value(v)) for k, v in six.iteritems(rates or {})
+            )
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle = throttle
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.documents = {}
+        self._lock = threading.Lock()
+        self._tokens = throttle
+        self._refilled = clock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = Counter()
+            self._started = self.clock()
+
+    def stats(self):
+        """
+        counts of requests per endpoint, responses per status, injected
+        errors and throttled calls, plus requests per second since the
+        last reset
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            elapsed = self.clock() - self._started
+        stats['requests_per_second'] = stats.get('requests', 0) / elapsed if elapsed else 0.0
+        return stats
+
+    def address_rate(self, address):
+        rate = None
+        if self.rate_table is not None:
+            rate = self.rate_table.address_rate(address)
+        elif address.get('PostalCode'):
+            rate = self.rates.get(postal_key(address['PostalCode'], address.get('Country')))
+        return self.default_rate if rate is None else rate
+
+    def _take_token(self):
+        """token bucket of throttle requests per second, False when empty"""
+        now = self.clock()
+        self._tokens = min(self.throttle, self._tokens + (now - self._refilled) * self.throttle)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def handle(self, method, path, query, body, authorized=True):
+        """
+        answer one request, path relative to the 1.0 base url.  Returns the
+        status, extra headers and JSON body after waiting the latency
+        """
+        endpoint, handler = self._route(method, path)
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['requests.%s' % endpoint] += 1
+            throttled = self.throttle is not None and not self._take_token()
+            failed = not throttled and self.error_rate and self.random.random() < self.error_rate
+            delay = self.latency(self.random) if self.latency is not None else 0
+        if delay > 0:
+            time.sleep(delay)
+        headers = {}
+        if handler is None:
+            status, result = 404, _error('Unknown endpoint %s %s' % (method, path))
+        elif not authorized:
+            status, result = 401, _error('Authentication failed', 'AuthenticationException')
+        elif throttled:
+            status, result = 429, _error('Too many requests', 'RateLimitExceeded')
+            headers['Retry-After'] = '1'
+            self._count('throttled')
+        elif failed:
+            self._count('injected_errors')
+            status, result = self.error_status, _error('Injected failure', 'ServerError')
+        else:
+            try:
+                status, result = 200, handler(query, body)
+            except (ValueError, ArithmeticError) as e:
+                # malformed JSON, numbers or coordinates
+                status, result = 400, _error('Invalid request: %s' % e)
+        self._count('status.%d' % status)
+        return status, headers, result
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _route(self, method, path):
+        if method == 'POST' and path == 'tax/get':
+            return 'tax/get', self.get_tax
+        if method == 'POST' and path == 'tax/cancel':
+            return 'tax/cancel', self.cancel_tax
+        if method == 'GET' and path == 'address/validate':
+            return 'address/validate', self.validate_address
+        match = _ESTIMATE_PATH.match(path)
+        if method == 'GET' and match:
+            return 'tax/estimate', lambda query, body: self.estimate_tax(query, **match.groupdict())
+        return 'unknown', None
+
+    def get_tax(self, query, body):
+        request = json.loads(body.decode('utf-8'))
+        for name in ('DocCode', 'CustomerCode', 'DocDate'):
+            if not request.get(name):
+                return _error('%s is required' % name, 'RequiredError')
+        codes = set(a.get('AddressCode') for a in request.get('Addresses') or ())
+        for line in request.get('Lines') or ():
+            for field in ('DestinationCode', 'OriginCode'):
+                if line.get(field) not in codes:
+                    return _error('Line %s: %s %s is not an address of the document' % (
+                        line.get('LineNo'), field, line.get(field)), 'AddressRangeError')
+        result = calculate_tax(request, self.address_rate)
+        if result['ResultCode'] == 'Success':
+            result['DocType'] = request.get('DocType')
+            result['Timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime())
+            if request.get('Commit'):
+                with self._lock:
+                    self.documents[(request.get('CompanyCode'), request['DocCode'])] = 'Committed'
+        return result
+
+    def cancel_tax(self, query, body):
+        request = json.loads(body.decode('utf-8'))
+        key = (request.get('CompanyCode'), request.get('DocCode'))
+        with self._lock:
+            if key not in self.documents:
+                result = _error('The tax document could not be found.', 'DocumentNotFoundError')
+            else:
+                self.documents[key] = 'Cancelled'
+                result = {'DocCode': request.get('DocCode'), 'ResultCode': 'Success'}
+        return {'CancelTaxResult': result}
+
+    def validate_address(self, query, body):
+        if not query.get('Line1'):
+            return _error('Line1 is required', 'RequiredError')
+        address = dict(
+            (k, (query.get(k) or '').strip().upper())
+            for k in ('Line1', 'Line2', 'Line3', 'City', 'Region', 'PostalCode', 'Country')
+        )
+        address.update(AddressType='F', County='', FipsCode='')
+        return {'Address': address, 'ResultCode': 'Success'}
+
+    def estimate_tax(self, query, latitude, longitude):
+        float(latitude), float(longitude)
+        sale_amount = Decimal(query.get('saleamount') or '0')
+        rate = self.default_rate or Decimal(0)
+        tax = float(round_cents(sale_amount * rate))
+        return {
+            'Rate': float(rate),
+            'Tax': tax,
+            'TaxDetails': [{
+                'Country': 'US', 'JurisType': 'State', 'JurisName': 'FAKE',
+                'Rate': float(rate), 'Tax': tax, 'TaxName': 'FAKE SALES TAX',
+            }],
+            'ResultCode': 'Success',
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and small bodies go out in one write
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # a response split over several writes must not wait on the
+        # client's delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    return b''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _respond(self, method):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        prefix = self.server.prefix
+        path = path[len(prefix):] if path.startswith(prefix) else path.lstrip('/')
+        body = self._read_body() if method == 'POST' else b''
+        try:
+            body = decompress(body, self.headers.get('Content-Encoding'))
+        except (ValueError, zlib.error) as e:
+            status, headers, result = 400, {}, _error('Invalid request: %s' % e)
+        else:
+            status, headers, result = self.server.fake.handle(
+                method, path, dict(parse_qsl(url.query)), body,
+                authorized=bool(self.headers.get('Authorization')),
+            )
+        payload = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        threshold = self.server.compress_min_bytes
+        if (threshold is not None and len(payload) >= threshold and
+                GZIP in self.headers.get('Accept-Encoding', '')):
+            payload = compress(payload, GZIP)
+            self.send_header('Content-Encoding', GZIP)
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in six.iteritems(headers):
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        self._respond('POST')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAvalaraServer(ThreadingMixIn, HTTPServer):
+    """
+    threaded HTTP server for a FakeAvalara, a thread per connection.  Port
+    0 picks a free port, see base_url.  Responses of compress_min_bytes
+    and more are gzipped for clients accepting it, None never compresses
+    """
+    daemon_threads = True
+    request_queue_size = 128
+    prefix = '/1.0/'
+
+    def __init__(self, fake=None, host='127.0.0.1', port=0,
+                 compress_min_bytes=DEFAULT_COMPRESS_MIN_BYTES):
+        HTTPServer.__init__(self, (host, port), _Handler)
+        self.fake = fake or FakeAvalara()
+        self.compress_min_bytes = compress_min_bytes
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d%s' % (host, port, self.prefix)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """serve from a daemon thread"""
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,),
+                                        name='fake-avalara')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m avalara.fakeserver')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rate', default=six.text_type(DEFAULT_RATE),
+                        help='rate of destinations missing from the rate table')
+    parser.add_argument('--rate-table', help='rate table file, see avalara.ratetable')
+    parser.add_argument('--latency', type=float, nargs=2, metavar=('LOW', 'HIGH'),
+                        help='uniform latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--throttle', type=float, help='requests per second before 429')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--no-compression', action='store_true',
+                        help='never gzip responses')
+    args = parser.parse_args(argv)
+
+    fake = FakeAvalara(
+        rates=RateTable(args.rate_table) if args.rate_table else None,
+        default_rate=args.rate,
+        latency=uniform(*args.latency) if args.latency else None,
+        error_rate=args.error_rate, error_status=args.error_status,
+        throttle=args.throttle, seed=args.seed,
+    )
+    server = FakeAvalaraServer(
+        fake, args.host, args.port,
+        compress_min_bytes=None if args.no_compression else DEFAULT_COMPRESS_MIN_BYTES,
+    )
+    print('fake Avalara listening on %s' % server.base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(fake.stats(), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
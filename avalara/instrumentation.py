@@ -0,0 +1,143 @@
+"""
+Metrics for the phases of a tax call.
+
+Clients report to their instrumentation, by default one that drops
+everything.  Pass another one to see where the time of a call goes:
+
+    client = Avalara(instrumentation=StatsdInstrumentation(statsd_client))
+
+Reported metrics, with their tags:
+
+    timing  serialize       engine       building request_body, serpy or compiled
+    timing  remove_nulls                 stripping nulls after serpy
+    size    lines                        lines of a saved GetTaxRequest
+    size    fragments                    addresses and lines serialized again
+                                         by an incremental_serialization build
+    size    shards                       shards a sharded document was sent as
+    timing  encode          endpoint     JSON encoding of the request body
+    size    request_bytes   endpoint     request body size
+    timing  compress        endpoint     compressing the request body
+    size    request_wire_bytes
+                            endpoint     request body size as sent, after
+                                         compression
+    timing  request         endpoint, status
+                                         network wait, status is error when
+                                         no response came back
+    size    response_bytes  endpoint     response body size
+    size    response_wire_bytes
+                            endpoint     response body size as received,
+                                         before decompression
+    timing  decode          endpoint     JSON decoding of the response
+    count   retries         endpoint     requests repeated by the retry policy
+"""
+from __future__ import unicode_literals
+
+import threading
+import time
+
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class Instrumentation(object):
+    """
+    metrics interface, every method does nothing.  Subclasses override the
+    ones they collect; tags are keyword arguments with text values
+    """
+
+    def timing(self, name, seconds, **tags):
+        pass
+
+    def size(self, name, value, **tags):
+        pass
+
+    def increment(self, name, value=1, **tags):
+        pass
+
+
+# shared default of the clients and models
+NULL_INSTRUMENTATION = Instrumentation()
+
+
+class StatsdInstrumentation(Instrumentation):
+    """
+    report to a statsd style client with timing(name, ms) and incr(name,
+    count), such as the statsd package.  Plain statsd has no tags, their
+    values are appended to the name in tag order: a tax/get request
+    answered with 200 is timed as avalara.request.tax_get.200.  With
+    tagged the client is called with a tags list instead, as DogStatsd
+    expects.  Sizes are sent as timings, the statsd type with percentiles
+    """
+
+    def __init__(self, client, prefix='avalara', tagged=False):
+        self.client = client
+        self.prefix = prefix
+        self.tagged = tagged
+
+    def _name(self, name, tags):
+        parts = [self.prefix, name]
+        if not self.tagged:
+            parts.extend(
+                str(tags[k]).replace('/', '_').replace('.', '_') for k in sorted(tags)
+            )
+        return '.'.join(parts)
+
+    def _tags(self, tags):
+        return {'tags': ['%s:%s' % (k, tags[k]) for k in sorted(tags)]} if self.tagged else {}
+
+    def timing(self, name, seconds, **tags):
+        self.client.timing(self._name(name, tags), seconds * 1000, **self._tags(tags))
+
+    def size(self, name, value, **tags):
+        self.client.timing(self._name(name, tags), value, **self._tags(tags))
+
+    def increment(self, name, value=1, **tags):
+        self.client.incr(self._name(name, tags), value, **self._tags(tags))
+
+
+# histogram buckets for sizes, in bytes or lines
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000, float('inf'))
+
+
+class PrometheusInstrumentation(Instrumentation):
+    """
+    report to prometheus_client metrics created on first use in registry:
+    timings as <namespace>_<name>_seconds histograms, sizes as
+    <namespace>_<name> histograms and counts as <namespace>_<name>_total
+    counters, labelled with the tags
+    """
+
+    def __init__(self, registry=None, namespace='avalara'):
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImportError('PrometheusInstrumentation requires prometheus_client')
+        self.prometheus_client = prometheus_client
+        self.registry = registry or prometheus_client.REGISTRY
+        self.namespace = namespace
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _metric(self, kind, name, tags, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = kind(
+                        name, 'Avalara client %s' % name.replace('_', ' '),
+                        labelnames=sorted(tags), namespace=self.namespace,
+                        registry=self.registry, **kwargs
+                    )
+        return metric.labels(**tags) if tags else metric
+
+    def timing(self, name, seconds, **tags):
+        self._metric(self.prometheus_client.Histogram, name + '_seconds', tags).observe(seconds)
+
+    def size(self, name, value, **tags):
+        self._metric(self.prometheus_client.Histogram, name, tags,
+                     buckets=SIZE_BUCKETS).observe(value)
+
+    def increment(self, name, value=1, **tags):
+        # prometheus_client adds _total to counter names itself
+        self._metric(self.prometheus_client.Counter, name, tags).inc(value)
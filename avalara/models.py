@@ -1,33 +1,43 @@
 from __future__ import unicode_literals
 
+import copy
 import datetime
-from decimal import Decimal, ROUND_HALF_UP
-import six
 
+import six
 from serpy import Serializer
 
 from . import serializers
-from .client import Avalara
+from .compiled import compile_serializer
 from .constants import DEFAULT_TAX_CODE, NON_TAXABLE_TAX_CODE
+from .instrumentation import NULL_INSTRUMENTATION, clock
+from .money import Money
+from .streaming import iter_request_body, serialize_function
+from .utils import (
+    fix_address_lines,
+    normalize_address,
+    remove_nulls_from_dict,
+    strip_if_text,
+)
+
 
+# field initializers generated by BaseAvalaraModel._get_layout per class
+_initializers = {}
+# class -> its subclass reporting changes, see _track
+_tracked_classes = {}
 
-def strip_if_text(value):
+
+def clean_value(value):
+    """trim text and strip nulls out of containers passed in as fields"""
     if isinstance(value, six.string_types):
-        value = value.strip()
+        return value.strip()
+    if isinstance(value, (dict, list)):
+        return remove_nulls_from_dict(value)
     return value
 
 
-def remove_nulls_from_dict(d):
-    """
-    remove_nulls_from_dict function recursively remove empty or null values
-    from dictionary and embedded lists of dictionaries
-    """
-    if isinstance(d, dict):
-        return {k: remove_nulls_from_dict(v) for k, v in six.iteritems(d) if v}
-    if isinstance(d, list):
-        return [remove_nulls_from_dict(entry) for entry in d if entry]
-    else:
-        return d
+def slots_for(serializer, *extra):
+    """__slots__ holding every field of serializer plus extra attributes"""
+    return tuple(serializer._field_map) + extra
 
 
 class BaseAvalaraModel(object):
@@ -35,6 +45,10 @@ class BaseAvalaraModel(object):
     Base Class for Avalara Models.  includes methods for sanitizing and
     verifying attributes as well as serialization
     """
+    # subclasses listing their fields in __slots__ (see slots_for) are
+    # stored compactly, the others keep an instance __dict__
+    __slots__ = ()
+
     # any required fields go in the required list.  Use _validate required
     # method to ensure they are set
     required = list()
@@ -43,35 +57,71 @@ class BaseAvalaraModel(object):
     serializer = None
 
     # defaults is a dictionary of attributes and their values if they have
-    # a default.  Set in the __init__
+    # a default.  Set in the __init__, callables such as
+    # datetime.date.today are called for every instance
     defaults = dict()
 
-    def __init__(self, *args, **kwargs):
-        self.__dict__.update(self._get_fields)
-        # set defaults on any attributes not passed in through kwargs
-        self.__dict__.update(self.defaults)
-        # trimming all text/string fields before setting attributes
-        cleaner_kwargs = {k: strip_if_text(v) for k, v in kwargs.items()}
-        # set all attributes passed in through kwargs.  These should all
-        # match the names of the fields of the appropriate serializer
-        self.__dict__.update(remove_nulls_from_dict(cleaner_kwargs))
-        self.client = Avalara()
+    # build request_body with the single pass engine from the compiled
+    # module instead of serpy followed by remove_nulls_from_dict.  Both
+    # produce the same body
+    compiled_serialization = False
 
-    @property
-    def _get_fields(self):
-        keys = dict()
-        for k, v in self.serializer._field_map.items():
-            if isinstance(v, Serializer) and v.many:
-                keys[k] = list()
-            else:
-                keys[k] = None
-        return keys
+    def __init__(self, *args, **kwargs):
+        # fields start as None, or an empty list for many serializers,
+        # unless there is a default
+        self._get_layout()(self)
+        # trimming all text/string fields before setting attributes.  These
+        # should all match the names of the fields of the appropriate
+        # serializer
+        for k, v in kwargs.items():
+            v = clean_value(v)
+            if v:
+                self._set_field(k, v)
+
+    def _set_field(self, name, value):
+        try:
+            setattr(self, name, value)
+        except AttributeError:
+            raise TypeError('%s got an unexpected field %r' % (
+                type(self).__name__, name,
+            ))
+
+    @classmethod
+    def _get_layout(cls):
+        """
+        return the function setting the initial field values, generated
+        once per class from the serializer fields, __slots__ and defaults
+        """
+        initialize = _initializers.get(cls)
+        if initialize is None:
+            initial = dict.fromkeys(cls.__dict__.get('__slots__', ()))
+            list_fields = list()
+            for k, v in cls.serializer._field_map.items():
+                if isinstance(v, Serializer) and v.many:
+                    list_fields.append(k)
+                    initial.pop(k, None)
+                else:
+                    initial[k] = None
+            initial.update(cls.defaults)
+
+            namespace = {}
+            lines = ['def initialize(self):']
+            for i, (k, v) in enumerate(initial.items()):
+                namespace['v%d' % i] = v
+                lines.append('    self.%s = v%d%s' % (k, i, '()' if callable(v) else ''))
+            for k in list_fields:
+                lines.append('    self.%s = []' % k)
+            if len(lines) == 1:
+                lines.append('    pass')
+            six.exec_('\n'.join(lines), namespace)
+            initialize = _initializers.setdefault(cls, namespace['initialize'])
+        return initialize
 
     def _validate_required(self):
         """validate required fields are present"""
         for i in self.required:
             if not getattr(self, i):
-                raise AttributeError
+                raise AttributeError('%s is missing required field %r' % (type(self).__name__, i))
 
     @property
     def data(self):
@@ -86,10 +136,91 @@ class BaseAvalaraModel(object):
         """
         remove nulls and format python dictionary as json
         """
-        return remove_nulls_from_dict(self.data)
+        return self.build_request_body()
+
+    def build_request_body(self, instrumentation=NULL_INSTRUMENTATION):
+        """request_body, timing serialization and null stripping"""
+        start = clock()
+        if self.compiled_serialization:
+            body = compile_serializer(self.serializer)(self)
+            instrumentation.timing('serialize', clock() - start, engine='compiled')
+            return body
+        data = self.data
+        serialized = clock()
+        body = remove_nulls_from_dict(data)
+        instrumentation.timing('serialize', serialized - start, engine='serpy')
+        instrumentation.timing('remove_nulls', clock() - serialized)
+        return body
+
+
+class _Tracked(object):
+    """
+    base of the classes _track switches models to, every field set
+    marks the model owning it as changed
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        tracker = self._tracker
+        if tracker is not None:
+            tracker[0].add(tracker[1])
+            if isinstance(value, BaseAvalaraModel):
+                _track(value, tracker)
+
+    def __copy__(self):
+        """an untracked copy"""
+        cls = self._untracked_class
+        model = cls.__new__(cls)
+        for name in cls.__slots__:
+            object.__setattr__(model, name, getattr(self, name))
+        model._tracker = None
+        return model
+
+
+def _track(model, tracker):
+    """
+    add tracker[1] to the set tracker[0] whenever a field of model, or of
+    its tax override, is set.  Models without a _tracker slot can't be
+    tracked
+    """
+    cls = type(model)
+    if not isinstance(model, _Tracked):
+        tracked = _tracked_classes.get(cls)
+        if tracked is None:
+            tracked = _tracked_classes.setdefault(cls, type(str(cls.__name__), (_Tracked, cls), {
+                '__slots__': (), '__module__': cls.__module__, '_untracked_class': cls,
+            }))
+        model.__class__ = tracked
+    object.__setattr__(model, '_tracker', tracker)
+    override = getattr(model, 'tax_override', None)
+    if override is not None:
+        _track(override, tracker)
+
+
+def _untrack(model):
+    if isinstance(model, _Tracked):
+        object.__setattr__(model, '_tracker', None)
+        model.__class__ = model._untracked_class
+        override = getattr(model, 'tax_override', None)
+        if override is not None:
+            _untrack(override)
+
+
+def _position(models, model, number):
+    """index of model in models, where number - 1 is the likely one"""
+    index = number - 1 if isinstance(number, six.integer_types) else -1
+    if 0 <= index < len(models) and models[index] is model:
+        return index
+    for index, other in enumerate(models):
+        if other is model:
+            return index
+    return None
 
 
 class TaxOverride(BaseAvalaraModel):
+    # _tracker is set on the models of incrementally serialized requests
+    __slots__ = slots_for(serializers.TaxOverrideSerializer, '_tracker')
     serializer = serializers.TaxOverrideSerializer
     required = [
         'reason',
@@ -98,11 +229,17 @@ class TaxOverride(BaseAvalaraModel):
     defaults = {
         'reason': 'Imported From External System',
         'tax_override_type': 'TaxAmount',
-        'tax_date': datetime.date.today(),
+        'tax_date': datetime.date.today,
     }
 
 
 class OrderLine(BaseAvalaraModel):
+    # tax_override is only serialized by OverridenOrderLineSerializer.
+    # requested_tax_code is the tax code the line was given, tax_code turns
+    # non-taxable while the amount is zero
+    __slots__ = slots_for(
+        serializers.OverridenOrderLineSerializer, 'price', 'requested_tax_code', '_tracker',
+    )
     serializer = serializers.OrderLineSerializer
     required = [
         'line_number',
@@ -118,26 +255,98 @@ class OrderLine(BaseAvalaraModel):
     def __init__(self, **kwargs):
         super(OrderLine, self).__init__(**kwargs)
         self._validate_required()
-        if kwargs.get('price') and not self.amount:
+        self.requested_tax_code = self.tax_code
+        if self.amount:
+            self.amount = Money.coerce(self.amount)
+        elif kwargs.get('price'):
             self._set_amount()
-        if not self.amount:
+        self._apply_tax_code()
+
+    def _apply_tax_code(self):
+        """
+        the requested tax code, or the non-taxable one when there is no
+        amount or the override leaves no tax
+        """
+        override = self.tax_override
+        if not self.amount or (override is not None and not override.tax_amount):
             self.tax_code = NON_TAXABLE_TAX_CODE
+        else:
+            self.tax_code = self.requested_tax_code
 
     def _set_amount(self):
         """
         use this if you are passing in price and not amount to
         calculate the amount by qty and price
         """
-        self.amount = Decimal(self.price).quantize(Decimal('.01'), rounding=ROUND_HALF_UP) * self.qty
+        self.amount = Money(self.price).round_cents() * self.qty
+
+    @classmethod
+    def from_columns(cls, first_line_number, columns):
+        """
+        build lines from column oriented fields.  Each value of columns is
+        either a sequence with an entry per line or one value shared by all
+        lines.  Lines are numbered from first_line_number and get the same
+        validation, amount and tax code as when created one by one
+        """
+        shared = {}
+        per_line = {}
+        count = None
+        for k, v in columns.items():
+            if isinstance(v, six.string_types) or not hasattr(v, '__len__'):
+                shared[k] = clean_value(v)
+                continue
+            if count is None:
+                count = len(v)
+            elif len(v) != count:
+                raise ValueError('column %r has %d entries, expected %d' % (k, len(v), count))
+            per_line[k] = v
+        if count is None:
+            raise ValueError('from_columns needs at least one sequence of values')
+
+        initialize = cls._get_layout()
+        required = cls.required
+        # prices repeat a lot, round each distinct one once
+        price_cents = {}
+        lines = []
+        for i in range(count):
+            line = cls.__new__(cls)
+            initialize(line)
+            for k, v in shared.items():
+                if v:
+                    line._set_field(k, v)
+            for k, column in per_line.items():
+                v = clean_value(column[i])
+                if v:
+                    line._set_field(k, v)
+            line.line_number = first_line_number + i
+            for name in required:
+                if not getattr(line, name):
+                    raise AttributeError('%s is missing required field %r' % (cls.__name__, name))
+            line.requested_tax_code = line.tax_code
+            price = line.price
+            if line.amount:
+                line.amount = Money.coerce(line.amount)
+            elif price:
+                try:
+                    cents = price_cents[price]
+                except KeyError:
+                    cents = price_cents[price] = Money(price).round_cents()
+                line.amount = cents * line.qty
+            if not line.amount:
+                line.tax_code = NON_TAXABLE_TAX_CODE
+            lines.append(line)
+        return lines
 
     def _override(self, **kwargs):
         override = TaxOverride(**kwargs)
+        if override.tax_amount:
+            override.tax_amount = Money.coerce(override.tax_amount)
         self.tax_override = override
-        if not override.tax_amount:
-            self.tax_code = NON_TAXABLE_TAX_CODE
+        self._apply_tax_code()
 
 
 class Address(BaseAvalaraModel):
+    __slots__ = slots_for(serializers.AddressSerializer, '_tracker')
     serializer = serializers.AddressSerializer
     required = ['address_code', 'address1', 'city', 'state', 'postal_code']
     defaults = {'country': 'US'}
@@ -149,12 +358,22 @@ class Address(BaseAvalaraModel):
 
     def _fix_lines(self):
         """shuffle address lines if we are missing line 1 but not 2 or 3"""
-        # no address 1 but entry on 2 and possibly 3 but I don't care
-        if not self.address1 and self.address2:
-            self.address1, self.address2, self.address3 = self.address2, self.address3, None
-        # no address 1 or 2 but entry on 3
-        if self.address3 and not self.address1 and not self.address2:
-            self.address1, self.address3 = self.address3, None
+        self.address1, self.address2, self.address3 = fix_address_lines(
+            self.address1, self.address2, self.address3,
+        )
+
+    @classmethod
+    def key(cls, address1=None, address2=None, address3=None, city=None,
+            state=None, postal_code=None, country=None, latitude=None,
+            longitude=None, tax_region_id=None, **kwargs):
+        """
+        identify the address the given fields describe, ignoring case,
+        surrounding whitespace and which line the street is on
+        """
+        return normalize_address(
+            address1, address2, address3, city, state, postal_code,
+            country or cls.defaults['country'],
+        ) + (latitude, longitude, tax_region_id)
 
 
 class GetTaxRequest(BaseAvalaraModel):
@@ -165,18 +384,62 @@ class GetTaxRequest(BaseAvalaraModel):
         'company_code': 'SOC',
         'customer_code': 'TEMPCODE',
         'currency_code': 'USD',
-        'doc_date': datetime.date.today(),
+        'doc_date': datetime.date.today,
     }
 
+    # add_address hands out the existing address_code when the same
+    # address is added again instead of sending it twice
+    intern_addresses = True
+
+    # keep the serialized body of every address and line between builds
+    # of request_body and serialize again only the ones that are new or
+    # changed, whether through update_line or by setting their attributes.
+    # Addresses and lines report their changes as they are made, so a build
+    # costs the changed lines rather than the whole document.  Meant for
+    # long lived requests edited repeatedly, such as a cart quoted after
+    # each change.  Change olines through add_line, update_line and
+    # remove_line rather than by editing the list
+    incremental_serialization = False
+
+    # uncommitted documents with more lines are sent as concurrent shards
+    # of at most this many lines and their results merged, see
+    # avalara.sharding.  None sends every document whole
+    shard_lines = None
+
+    def __init__(self, avalara_client=None, **kwargs):
+        super(GetTaxRequest, self).__init__(**kwargs)
+        # client is a field of the request body, so the Avalara client
+        # lives under its own name.  Defaults to the shared pooled client
+        if avalara_client is None:
+            # imported here so building requests does not load requests
+            from .client import get_default_client
+            avalara_client = get_default_client()
+        self.avalara_client = avalara_client
+        # Address.key -> address_code of the addresses added so far
+        self._address_codes = {}
+        # bodies of the addresses and of the lines at the last build and
+        # the ones changed since, see incremental_serialization
+        self._bodies = None
+        self._bodies_serializer = None
+        self._dirty = set()
+
     def add_address(self, **kwargs):
         """
         add address line to GetTaxRequest object and return the address_code.
-        use the address_codes returned when creating line items
+        use the address_codes returned when creating line items.  Adding an
+        address already on the request returns its address_code
         """
+        if self.intern_addresses:
+            key = Address.key(**kwargs)
+            address_code = self._address_codes.get(key)
+            if address_code is not None:
+                return address_code
         address_code = len(self.addresses) + 1
         kwargs['address_code'] = address_code
         address = Address(**kwargs)
         self.addresses.append(address)
+        if self.intern_addresses:
+            self._address_codes[key] = address_code
         return address_code
 
     def add_line(self, override_lookup=dict(), **kwargs):
@@ -196,12 +459,200 @@ class GetTaxRequest(BaseAvalaraModel):
             line._override(**override_lookup)
         self.olines.append(line)
 
-    def save(self, commit=False):
+    def add_lines(self, override_lookup=dict(), **columns):
+        """
+        add many lines at once from column oriented input, for example:
+
+            request.add_lines(
+                item_code=['A1', 'B2'], price=[15, 9.99], qty=[1, 3],
+                destination_code=destination_code, origin_code=origin_code,
+            )
+
+        sequences give a value per line and any other value is shared by
+        all of them.  The request body is the same as calling add_line for
+        each line.  override_lookup is a single lookup for every line or a
+        sequence of lookups, one per line
+        """
+        lines = OrderLine.from_columns(len(self.olines) + 1, columns)
+        if override_lookup:
+            self.serializer = serializers.GetTaxRequestOverrideSerializer
+            if isinstance(override_lookup, dict):
+                override_lookup = [override_lookup] * len(lines)
+            for line, lookup in zip(lines, override_lookup):
+                line._override(**lookup)
+        self.olines.extend(lines)
+
+    def _line_index(self, line_number):
+        index = line_number - 1
+        if not 0 <= index < len(self.olines) or self.olines[index].line_number != line_number:
+            raise IndexError('GetTaxRequest has no line %r' % (line_number,))
+        return index
+
+    def update_line(self, line_number, override_lookup=dict(), **kwargs):
+        """
+        change fields of a line added before.  The amount is worked out
+        again from price and qty when either is passed without an amount,
+        and an empty value clears a field.  The line ends up as if it had
+        been added with its new fields, a line whose amount is no longer
+        zero gets back the tax code it was given.  The line is replaced by
+        an updated copy, so it only changes once the new fields validate
+        """
+        if 'line_number' in kwargs:
+            raise TypeError('line numbers are assigned by the request')
+        index = self._line_index(line_number)
+        line = copy.copy(self.olines[index])
+        for k, v in kwargs.items():
+            line._set_field(k, clean_value(v) or None)
+        line._validate_required()
+        if 'tax_code' in kwargs:
+            line.requested_tax_code = line.tax_code or OrderLine.defaults['tax_code']
+        if line.amount:
+            line.amount = Money.coerce(line.amount)
+        if 'amount' not in kwargs and ('price' in kwargs or 'qty' in kwargs):
+            if line.price:
+                line._set_amount()
+            elif 'price' in kwargs:
+                # a cleared price leaves no amount, as for a new line
+                line.amount = None
+        line._apply_tax_code()
+        if override_lookup:
+            self.serializer = serializers.GetTaxRequestOverrideSerializer
+            line._override(**override_lookup)
+        old = self.olines[index]
+        self.olines[index] = line
+        if self._bodies is not None:
+            _untrack(old)
+            self._dirty.discard(old)
+            _track(line, (self._dirty, line))
+            self._dirty.add(line)
+        return line
+
+    def remove_line(self, line_number):
         """
-        pass in a GetTaxRequest object from the models module
+        remove a line, the lines after it move up a line number.  Returns
+        the removed line
         """
+        index = self._line_index(line_number)
+        line = self.olines.pop(index)
+        if self._bodies is None:
+            for number, moved in enumerate(self.olines[index:], line_number):
+                moved.line_number = number
+            return line
+        _untrack(line)
+        dirty = self._dirty
+        dirty.discard(line)
+        bodies = self._bodies[1]
+        if index < len(bodies):
+            del bodies[index]
+        label = serializers.OrderLineSerializer._field_map['line_number'].label
+        for i, moved in enumerate(self.olines[index:], index):
+            changed = moved in dirty
+            moved.line_number = i + 1
+            if i < len(bodies) and not changed:
+                # renumber the kept body instead of serializing the line again
+                dirty.discard(moved)
+                bodies[i] = dict(bodies[i], **{label: i + 1})
+        return line
+
+    def build_request_body(self, instrumentation=NULL_INSTRUMENTATION):
+        if not self.incremental_serialization:
+            return super(GetTaxRequest, self).build_request_body(instrumentation)
+        start = clock()
+        addresses_field = self.serializer._field_map['addresses']
+        lines_field = self.serializer._field_map['olines']
+        dirty = self._dirty
+        bodies = self._bodies
+        if (bodies is None or len(bodies[0]) > len(self.addresses) or
+                len(bodies[1]) > len(self.olines)):
+            # first build, or the lists were cut directly
+            bodies = self._bodies = ([], [])
+            dirty.clear()
+        elif self._bodies_serializer is not self.serializer:
+            # adding an override switches the serializer of every line
+            bodies = self._bodies = (bodies[0], [])
+        self._bodies_serializer = self.serializer
+        address_bodies, line_bodies = bodies
+        serialize_address = serialize_function(self, type(addresses_field))
+        serialize_line = serialize_function(self, type(lines_field))
+        serialized = 0
+
+        for model in dirty:
+            if isinstance(model, OrderLine):
+                models, kept, serialize, number = (
+                    self.olines, line_bodies, serialize_line, model.line_number,
+                )
+            else:
+                models, kept, serialize, number = (
+                    self.addresses, address_bodies, serialize_address, model.address_code,
+                )
+            index = _position(models, model, number)
+            # models added since the last build are serialized below
+            if index is not None and index < len(kept):
+                kept[index] = serialize(model)
+                serialized += 1
+        dirty.clear()
+        for models, kept, serialize in ((self.addresses, address_bodies, serialize_address),
+                                        (self.olines, line_bodies, serialize_line)):
+            for model in models[len(kept):]:
+                _track(model, (dirty, model))
+                kept.append(serialize(model))
+                serialized += 1
+
+        body = serialize_function(self, serializers.TaxDocumentSerializer)(self)
+        if address_bodies:
+            body[addresses_field.label] = list(address_bodies)
+        if line_bodies:
+            body[lines_field.label] = list(line_bodies)
+        instrumentation.timing(
+            'serialize', clock() - start,
+            engine='compiled' if self.compiled_serialization else 'serpy',
+        )
+        instrumentation.size('fragments', serialized)
+        return body
+
+    def _prepare_save(self, commit):
         doc_type = 'SalesInvoice' if commit else 'SalesOrder'
         self.doc_type = doc_type
         self.commit = commit
-        url = self.client._build_url('tax/get')
-        return self.client._make_request('post', url, json=self.request_body)
+
+    def save(self, commit=False, stream=False):
+        """
+        pass in a GetTaxRequest object from the models module.  With stream
+        the body is encoded line by line while it is sent instead of being
+        built in memory first, meant for documents with many lines.  Commits
+        taken over by the client's write behind queue are queued whole
+        """
+        self._prepare_save(commit)
+        return self._save(self.avalara_client, stream)
+
+    def _save(self, client, stream=False):
+        # any object with get_tax works as a client
+        metrics = getattr(client, 'instrumentation', NULL_INSTRUMENTATION)
+        metrics.size('lines', len(self.olines))
+        if stream and not (self.commit and getattr(client, 'write_behind', None) is not None):
+            return client.get_tax_chunks(iter_request_body(self))
+        body = self.build_request_body(metrics)
+        if self.shard_lines and not self.commit and len(self.olines) > self.shard_lines:
+            return client.get_tax_sharded(body, self.shard_lines)
+        return client.get_tax(body)
+
+    def estimate(self, rate_table):
+        """
+        estimate the tax of the request locally from an
+        avalara.ratetable.RateTable, without calling Avalara
+        """
+        self._prepare_save(False)
+        return rate_table.estimate(self.request_body)
+
+    def save_async(self, commit=False, avalara_client=None):
+        """
+        awaitable version of save for an AsyncAvalara client, either passed
+        in or the one the request was created with:
+
+            result = await request.save_async(avalara_client=async_client)
+        """
+        client = avalara_client or self.avalara_client
+        if not client.is_async:
+            raise TypeError('save_async needs an AsyncAvalara client')
+        self._prepare_save(commit)
+        return self._save(client)
@@ -0,0 +1,193 @@
+"""
+Fixed point amounts for the money fields of the models.
+
+Money keeps an amount as an integer count of 1/10000, the precision
+Avalara amounts are sent with, so building, rounding and formatting an
+amount is integer arithmetic instead of Decimal context work.  Inputs
+convert exactly: text and Decimal as written, floats by their shortest
+repr so that 1.005 is one dollar and half a cent rather than the binary
+fraction just below it.  Rounding is half up, away from zero, like
+ROUND_HALF_UP.
+
+Comparisons are exact, with floats taken by their shortest repr as in
+conversions, so an amount built from a float equals that float.  Money
+hashes like the equal Decimal, which is also the hash of an equal int
+or exactly representable float such as 2.5, but not of a float like 0.1
+whose repr is not its exact value.  Don't mix such floats and amounts
+as keys of one dict or set.
+"""
+from __future__ import unicode_literals
+
+from decimal import Decimal, ROUND_HALF_UP
+import re
+
+import six
+
+
+# units per 1, amounts are sent with 4 decimal places
+SCALE = 10000
+PLACES = 4
+# units per cent
+CENT = SCALE // 100
+
+_QUANTIZER = Decimal(1).scaleb(-PLACES)
+_NUMBER = re.compile(r'^\s*([+-]?)(\d*)(?:\.(\d*))?\s*$')
+
+
+def _round_half_up(units, step):
+    """units rounded half up to a multiple of step"""
+    quotient, remainder = divmod(abs(units), step)
+    if remainder * 2 >= step:
+        quotient += 1
+    return quotient * step if units >= 0 else -quotient * step
+
+
+def _parse(text):
+    """units of a decimal number written out in text"""
+    match = _NUMBER.match(text)
+    if match is None or not (match.group(2) or match.group(3)):
+        # exponents, nan and the like, let Decimal sort them out
+        return _from_decimal(Decimal(text))
+    sign, whole, fraction = match.groups()
+    fraction = fraction or ''
+    units = int(whole or '0') * SCALE + int((fraction[:PLACES] or '0').ljust(PLACES, '0'))
+    if fraction[PLACES:PLACES + 1] >= '5':
+        units += 1
+    return -units if sign == '-' else units
+
+
+def _from_decimal(value):
+    if not value.is_finite():
+        raise ValueError('%s is not an amount' % value)
+    return int(value.quantize(_QUANTIZER, rounding=ROUND_HALF_UP).scaleb(PLACES))
+
+
+class Money(object):
+    """an immutable amount counted in units of 1/SCALE"""
+    __slots__ = ('units',)
+
+    def __init__(self, value=0):
+        if isinstance(value, Money):
+            units = value.units
+        elif isinstance(value, six.integer_types):
+            units = value * SCALE
+        elif isinstance(value, float):
+            units = _parse(repr(value))
+        elif isinstance(value, Decimal):
+            units = _from_decimal(value)
+        elif isinstance(value, six.string_types):
+            units = _parse(value)
+        else:
+            raise TypeError('cannot convert %r to Money' % (value,))
+        self.units = units
+
+    @classmethod
+    def from_units(cls, units):
+        money = cls.__new__(cls)
+        money.units = units
+        return money
+
+    @classmethod
+    def coerce(cls, value):
+        """value as Money, without copying Money"""
+        return value if isinstance(value, Money) else cls(value)
+
+    def round_cents(self):
+        """the amount rounded half up to whole cents"""
+        return Money.from_units(_round_half_up(self.units, CENT))
+
+    def to_decimal(self):
+        return Decimal(self.units).scaleb(-PLACES)
+
+    def __str__(self):
+        whole, fraction = divmod(abs(self.units), SCALE)
+        return '%s%d.%04d' % ('-' if self.units < 0 else '', whole, fraction)
+
+    def __repr__(self):
+        return 'Money(%r)' % str(self)
+
+    def __float__(self):
+        return self.units / float(SCALE)
+
+    def __bool__(self):
+        return self.units != 0
+    __nonzero__ = __bool__
+
+    def __hash__(self):
+        # equal to the hash of the equal int, float or Decimal
+        return hash(self.to_decimal())
+
+    def _other(self, other):
+        if isinstance(other, Money):
+            return other.units
+        if isinstance(other, (six.integer_types, float, Decimal)):
+            return Money(other).units
+        return None
+
+    def _exact(self, other):
+        """
+        self and other as values comparing exactly, None when other is
+        not a number.  Unlike arithmetic, comparisons do not round other
+        to 4 places
+        """
+        if isinstance(other, Money):
+            return self.units, other.units
+        if isinstance(other, six.integer_types):
+            return self.units, other * SCALE
+        if isinstance(other, float):
+            # by repr like Money(other), not by its binary value
+            return self.to_decimal(), Decimal(repr(other))
+        if isinstance(other, Decimal):
+            return self.to_decimal(), other
+        return None
+
+    def __eq__(self, other):
+        pair = self._exact(other)
+        return NotImplemented if pair is None else pair[0] == pair[1]
+
+    def __ne__(self, other):
+        pair = self._exact(other)
+        return NotImplemented if pair is None else pair[0] != pair[1]
+
+    def __lt__(self, other):
+        pair = self._exact(other)
+        return NotImplemented if pair is None else pair[0] < pair[1]
+
+    def __le__(self, other):
+        pair = self._exact(other)
+        return NotImplemented if pair is None else pair[0] <= pair[1]
+
+    def __gt__(self, other):
+        pair = self._exact(other)
+        return NotImplemented if pair is None else pair[0] > pair[1]
+
+    def __ge__(self, other):
+        pair = self._exact(other)
+        return NotImplemented if pair is None else pair[0] >= pair[1]
+
+    def __add__(self, other):
+        units = self._other(other)
+        return NotImplemented if units is None else Money.from_units(self.units + units)
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        units = self._other(other)
+        return NotImplemented if units is None else Money.from_units(self.units - units)
+
+    def __rsub__(self, other):
+        units = self._other(other)
+        return NotImplemented if units is None else Money.from_units(units - self.units)
+
+    def __neg__(self):
+        return Money.from_units(-self.units)
+
+    def __mul__(self, other):
+        """multiply by a whole quantity, an int or an integral Decimal"""
+        if isinstance(other, Decimal):
+            if not other.is_finite() or other != other.to_integral_value():
+                raise ValueError('amounts are multiplied by whole quantities, not %s' % other)
+            other = int(other)
+        if isinstance(other, six.integer_types):
+            return Money.from_units(self.units * other)
+        return NotImplemented
+    __rmul__ = __mul__
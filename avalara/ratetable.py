@@ -0,0 +1,275 @@
+"""
+Offline rate table for estimating tax without Avalara.
+
+A rate table maps postal codes and Avalara tax region ids to a combined
+sales tax rate.  It is built once with RateTableBuilder, from exported
+rate files or from past tax/get responses, and written to a compact
+sorted file that RateTable memory-maps read only.  Opening one is a
+header check, lookups are a binary search over the mapped records and
+every worker process opening the same file shares its pages through the
+page cache:
+
+    builder = RateTableBuilder()
+    with open('TAXRATES_ZIP5_WA.csv') as rates:
+        builder.load_csv(rates)
+    builder.write('/var/lib/app/rates.avrt')
+
+    table = RateTable('/var/lib/app/rates.avrt')
+    table.estimate(request.request_body)
+
+Pass the table to a client as rate_table to answer uncommitted tax/get
+calls from it while the circuit breaker keeps Avalara closed off.
+"""
+from __future__ import unicode_literals
+
+import csv
+from decimal import Decimal, ROUND_HALF_UP
+import mmap
+import struct
+
+import six
+
+from .constants import NON_TAXABLE_TAX_CODE
+from .utils import atomic_write, decimal_value, round_cents
+
+
+MAGIC = b'AVRT'
+VERSION = 1
+# magic, version, record count
+_HEADER = struct.Struct('>4sHI')
+# key and rate in millionths.  Keys are null padded ascii and the records
+# are sorted bytewise by key for binary search
+_RECORD = struct.Struct('>16sI')
+RATE_SCALE = 10 ** 6
+
+# Avalara's generic non taxable code and the one this package sends
+NON_TAXABLE_TAX_CODES = frozenset(['NT', NON_TAXABLE_TAX_CODE])
+
+ESTIMATED_RESULT_CODE = 'Warning'
+ESTIMATED_SUMMARY = 'Tax estimated from the local rate table'
+
+
+def postal_key(postal_code, country='US'):
+    """rate table key of a postal code, US codes are cut to their 5 digits"""
+    country = (country or 'US').strip().upper()
+    postal_code = six.text_type(postal_code).strip().upper().replace(' ', '')
+    if country == 'US':
+        postal_code = postal_code[:5]
+    return 'P:%s:%s' % (country, postal_code)
+
+
+def region_key(tax_region_id):
+    """rate table key of an Avalara tax region id"""
+    return 'R:%d' % int(decimal_value(tax_region_id))
+
+
+def _encode_key(key):
+    key = key.encode('ascii')
+    if len(key) > _RECORD.size - 4:
+        raise ValueError('rate table key %r is too long' % key)
+    return key.ljust(_RECORD.size - 4, b'\0')
+
+
+def calculate_tax(request_body, address_rate):
+    """
+    tax a serialized GetTaxRequest with the rates address_rate(address)
+    returns for the destination addresses of its lines.  The result has
+    the shape of a tax/get response, or ResultCode Error naming a
+    destination address_rate returns None for.  Lines taxed with an
+    override keep the override amount, non taxable lines and exempt
+    customers are not taxed
+    """
+    addresses = dict(
+        (a.get('AddressCode'), a) for a in request_body.get('Addresses') or ()
+    )
+    document_exempt = request_body.get('CustomerUsageType') or request_body.get('ExemptionNo')
+    lines = []
+    total_amount = total_taxable = total_tax = Decimal(0)
+    for line in request_body.get('Lines') or ():
+        amount = decimal_value(line.get('Amount') or 0)
+        override = line.get('TaxOverride') or {}
+        if override.get('TaxAmount') is not None:
+            rate = None
+            tax = decimal_value(override['TaxAmount'])
+        elif (document_exempt or line.get('CustomerUsageType') or
+                line.get('TaxCode') in NON_TAXABLE_TAX_CODES):
+            rate = Decimal(0)
+            tax = Decimal(0)
+        else:
+            address = addresses.get(line.get('DestinationCode')) or {}
+            rate = address_rate(address)
+            if rate is None:
+                return {
+                    'DocCode': request_body.get('DocCode'),
+                    'ResultCode': 'Error',
+                    'Messages': [{
+                        'Severity': 'Error',
+                        'Summary': 'No rate for postal code %s' % address.get('PostalCode'),
+                    }],
+                }
+            tax = round_cents(amount * rate)
+        taxable = amount if tax else Decimal(0)
+        total_amount += amount
+        total_taxable += taxable
+        total_tax += tax
+        lines.append({
+            'LineNo': line.get('LineNo'),
+            'Rate': None if rate is None else six.text_type(rate),
+            'Taxable': six.text_type(taxable),
+            'Tax': six.text_type(tax),
+            'TaxCalculated': six.text_type(tax),
+        })
+    return {
+        'DocCode': request_body.get('DocCode'),
+        'DocDate': request_body.get('DocDate'),
+        'ResultCode': 'Success',
+        'TotalAmount': six.text_type(total_amount),
+        'TotalTaxable': six.text_type(total_taxable),
+        'TotalTax': six.text_type(total_tax),
+        'TotalTaxCalculated': six.text_type(total_tax),
+        'TaxLines': lines,
+    }
+
+
+class RateTableBuilder(object):
+    """collect rates by key and write them out as a rate table file"""
+
+    def __init__(self):
+        self.rates = {}
+
+    def __len__(self):
+        return len(self.rates)
+
+    def add(self, key, rate):
+        _encode_key(key)
+        self.rates[key] = int((decimal_value(rate) * RATE_SCALE).to_integral_value(ROUND_HALF_UP))
+
+    def add_postal_code(self, postal_code, rate, country='US'):
+        self.add(postal_key(postal_code, country), rate)
+
+    def add_tax_region(self, tax_region_id, rate):
+        self.add(region_key(tax_region_id), rate)
+
+    def load_csv(self, lines, postal_code_column='ZipCode',
+                 rate_column='EstimatedCombinedRate', country='US'):
+        """
+        add the rates of a CSV file with a header row, by default the
+        layout of Avalara's downloadable rate tables per ZIP code
+        """
+        for row in csv.DictReader(lines):
+            if row.get(postal_code_column) and row.get(rate_column):
+                self.add_postal_code(row[postal_code_column], row[rate_column], country)
+
+    def harvest(self, request_body, response):
+        """
+        add the rates Avalara charged on the lines of a tax/get response,
+        under the destination postal code and tax region of each line
+        """
+        if response.get('ResultCode') != 'Success':
+            return
+        addresses = dict(
+            (a.get('AddressCode'), a) for a in request_body.get('Addresses') or ()
+        )
+        regions = dict(
+            (six.text_type(a.get('AddressCode')), a.get('TaxRegionId'))
+            for a in response.get('TaxAddresses') or ()
+        )
+        destinations = dict(
+            (six.text_type(line.get('LineNo')), line.get('DestinationCode'))
+            for line in request_body.get('Lines') or ()
+        )
+        for line in response.get('TaxLines') or ():
+            if line.get('Rate') is None or not decimal_value(line.get('Taxable') or 0):
+                continue
+            code = destinations.get(six.text_type(line.get('LineNo')))
+            address = addresses.get(code)
+            if address is not None and address.get('PostalCode'):
+                self.add_postal_code(address['PostalCode'], line['Rate'], address.get('Country'))
+            if regions.get(six.text_type(code)):
+                self.add_tax_region(regions[six.text_type(code)], line['Rate'])
+
+    def write(self, path):
+        """write the table to path, replacing any table there atomically"""
+        with atomic_write(path) as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self.rates)))
+            for key in sorted(self.rates):
+                f.write(_RECORD.pack(_encode_key(key), self.rates[key]))
+
+
+class RateTable(object):
+    """read only, memory-mapped rate table written by RateTableBuilder"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError('%s is not a version %d rate table' % (path, VERSION))
+        if len(self._map) < _HEADER.size + self._count * _RECORD.size:
+            self._map.close()
+            raise ValueError('%s is truncated' % path)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def _lookup(self, key):
+        """binary search for key, its rate as a Decimal or None"""
+        try:
+            key = _encode_key(key)
+        except ValueError:
+            # too long or not ascii, so not in the table
+            return None
+        data = self._map
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset = _HEADER.size + middle * _RECORD.size
+            found = data[offset:offset + _RECORD.size - 4]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                rate = _RECORD.unpack_from(data, offset)[1]
+                return Decimal(rate) / RATE_SCALE
+        return None
+
+    def rate(self, postal_code=None, country='US', tax_region_id=None):
+        """
+        combined rate of a tax region or else of a postal code, None when
+        the table knows neither
+        """
+        if tax_region_id:
+            rate = self._lookup(region_key(tax_region_id))
+            if rate is not None:
+                return rate
+        if postal_code:
+            return self._lookup(postal_key(postal_code, country))
+        return None
+
+    def address_rate(self, address):
+        """rate of an address of a serialized request body"""
+        return self.rate(address.get('PostalCode'), address.get('Country'),
+                         address.get('TaxRegionId'))
+
+    def estimate(self, request_body):
+        """
+        estimate a serialized GetTaxRequest, see calculate_tax.  Results
+        are marked with ResultCode Warning
+        """
+        result = calculate_tax(request_body, self.address_rate)
+        if result['ResultCode'] == 'Success':
+            result['ResultCode'] = ESTIMATED_RESULT_CODE
+            result['Messages'] = [{'Severity': 'Warning', 'Summary': ESTIMATED_SUMMARY}]
+        return result
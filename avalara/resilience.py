@@ -0,0 +1,192 @@
+"""
+Retry, hedging and circuit breaking policies for the clients.
+
+The policies only hold configuration and state, Avalara and AsyncAvalara
+apply them around each request.  All of them are safe to share between
+threads and between clients.
+"""
+from __future__ import unicode_literals
+
+from collections import deque
+import random
+import threading
+import time
+
+from .exceptions import CircuitOpenError
+from .utils import percentile
+
+
+# statuses Avalara or its load balancers answer while degraded, other
+# errors come back with a JSON body and are not worth repeating
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+
+class RetryPolicy(object):
+    """
+    retry idempotent calls on connection errors, timeouts and
+    retry_statuses with full jitter exponential backoff: the n-th retry
+    waits a random time up to min(max_backoff, backoff * 2 ** n) seconds.
+    A response whose Retry-After asks for a longer wait than max_backoff
+    is not retried but returned
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.1, max_backoff=2.0,
+                 retry_statuses=RETRY_STATUSES, random=random.random):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+        self.random = random
+
+    def delay(self, retry, retry_after=None):
+        """
+        seconds to wait before retry number retry, counting from 0, at
+        least retry_after.  None to not retry when retry_after is over
+        max_backoff
+        """
+        delay = self.random() * min(self.max_backoff, self.backoff * 2 ** retry)
+        if retry_after:
+            try:
+                retry_after = float(retry_after)
+            except ValueError:
+                # Retry-After may also be an HTTP date, ignore it
+                return delay
+            if retry_after > self.max_backoff:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+class LatencyTracker(object):
+    """latencies of the last size successful calls"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, p)
+
+
+class HedgePolicy(object):
+    """
+    send a second copy of an idempotent call that has not answered after
+    the percentile latency of recent calls to the same endpoint, the first
+    response wins.  No hedging happens before min_samples latencies are
+    known.  delay is used instead of the percentile when given
+    """
+
+    def __init__(self, percentile=95, min_samples=20, delay=None, window=200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.fixed_delay = delay
+        self.window = window
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, endpoint):
+        with self._lock:
+            tracker = self._trackers.get(endpoint)
+            if tracker is None:
+                tracker = self._trackers[endpoint] = LatencyTracker(self.window)
+            return tracker
+
+    def record(self, endpoint, seconds):
+        self.tracker(endpoint).add(seconds)
+
+    def delay(self, endpoint):
+        """seconds before hedging a call to endpoint, None to not hedge"""
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        tracker = self.tracker(endpoint)
+        if len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.percentile)
+
+
+class CircuitBreaker(object):
+    """
+    stop calling Avalara once failure_ratio of the calls made in the last
+    window seconds failed, with at least minimum_calls calls to judge by.
+    While open every call raises CircuitOpenError.  After reset_timeout
+    seconds one trial call is let through, its outcome closes the circuit
+    or opens it again
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_ratio=0.5, minimum_calls=20, window=30,
+                 reset_timeout=30, clock=time.time):
+        self.failure_ratio = failure_ratio
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self._opened_at = None
+        self._trial_running = False
+        self._calls = deque()
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        calls = self._calls
+        while calls and calls[0][0] <= now - self.window:
+            if not calls.popleft()[1]:
+                self._failures -= 1
+
+    def before_call(self):
+        """raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpenError('Avalara circuit is open')
+
+    def record(self, success):
+        """record the outcome of a call let through by before_call"""
+        with self._lock:
+            now = self.clock()
+            if self.state == self.HALF_OPEN:
+                self._trial_running = False
+                if success:
+                    self._close()
+                else:
+                    self._open(now)
+                return
+            self._calls.append((now, success))
+            if not success:
+                self._failures += 1
+            self._trim(now)
+            calls = len(self._calls)
+            if (self.state == self.CLOSED and calls >= self.minimum_calls and
+                    self._failures >= self.failure_ratio * calls):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+
+    def _close(self):
+        self.state = self.CLOSED
+        self._calls.clear()
+        self._failures = 0
+
+    @property
+    def is_open(self):
+        return self.state != self.CLOSED
@@ -0,0 +1,217 @@
+"""
+Typed views over decoded Avalara responses.
+
+Results wrap the decoded JSON and stay usable as read only mappings, so
+result['TotalTax'] keeps working.  Amounts are exposed as Decimal and
+nested lines and jurisdiction details are only turned into objects when
+they are first accessed.
+"""
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+import six
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # python 2
+    from collections import Mapping
+
+
+def to_decimal(value):
+    """Decimal from an amount Avalara sends as a string or a JSON number"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, Decimal):
+        return value
+    # str() first so floats convert by their shortest repr
+    return Decimal(six.text_type(value))
+
+
+class field(object):
+    """read a key of the response, optionally converted"""
+
+    def __init__(self, key, convert=None):
+        self.key = key
+        self.convert = convert
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        v = instance.raw.get(self.key)
+        if self.convert is not None and v is not None:
+            v = self.convert(v)
+        return v
+
+
+class amount_field(field):
+    """read an amount of the response as Decimal"""
+
+    def __init__(self, key):
+        super(amount_field, self).__init__(key, to_decimal)
+
+
+class nested(object):
+    """
+    a list of the response as a tuple of result_class, built on first
+    access and kept in slot
+    """
+
+    def __init__(self, key, result_class, slot):
+        self.key = key
+        self.result_class = result_class
+        self.slot = slot
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        items = getattr(instance, self.slot)
+        if items is None:
+            items = tuple(self.result_class(v) for v in instance.raw.get(self.key) or ())
+            setattr(instance, self.slot, items)
+        return items
+
+
+class Result(Mapping):
+    """base for typed results, a mapping over the decoded response"""
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __repr__(self):
+        return '<%s %r>' % (type(self).__name__, self.raw)
+
+    result_code = field('ResultCode')
+    messages = field('Messages')
+
+    @property
+    def ok(self):
+        return self.result_code == 'Success'
+
+
+class TaxDetail(Result):
+    __slots__ = ()
+
+    country = field('Country')
+    region = field('Region')
+    juris_type = field('JurisType')
+    juris_code = field('JurisCode')
+    juris_name = field('JurisName')
+    tax_name = field('TaxName')
+    taxable = amount_field('Taxable')
+    rate = amount_field('Rate')
+    tax = amount_field('Tax')
+    tax_calculated = amount_field('TaxCalculated')
+
+
+class TaxLine(Result):
+    __slots__ = ('_details',)
+
+    def __init__(self, raw):
+        super(TaxLine, self).__init__(raw)
+        self._details = None
+
+    line_no = field('LineNo')
+    tax_code = field('TaxCode')
+    taxability = field('Taxability')
+    taxable = amount_field('Taxable')
+    rate = amount_field('Rate')
+    tax = amount_field('Tax')
+    discount = amount_field('Discount')
+    tax_calculated = amount_field('TaxCalculated')
+    exemption = amount_field('Exemption')
+    details = nested('TaxDetails', TaxDetail, '_details')
+
+
+class GetTaxResult(Result):
+    """tax/get response"""
+    __slots__ = ('_lines', '_summary')
+
+    def __init__(self, raw):
+        super(GetTaxResult, self).__init__(raw)
+        self._lines = None
+        self._summary = None
+
+    doc_code = field('DocCode')
+    doc_date = field('DocDate')
+    tax_date = field('TaxDate')
+    timestamp = field('Timestamp')
+    total_amount = amount_field('TotalAmount')
+    total_discount = amount_field('TotalDiscount')
+    total_exemption = amount_field('TotalExemption')
+    total_taxable = amount_field('TotalTaxable')
+    total_tax = amount_field('TotalTax')
+    total_tax_calculated = amount_field('TotalTaxCalculated')
+    tax_addresses = field('TaxAddresses')
+    lines = nested('TaxLines', TaxLine, '_lines')
+    summary = nested('TaxSummary', TaxDetail, '_summary')
+
+    def line(self, line_no):
+        """the TaxLine for a line number of the request"""
+        line_no = six.text_type(line_no)
+        for line in self.lines:
+            if six.text_type(line.line_no) == line_no:
+                return line
+        raise KeyError(line_no)
+
+
+class ValidAddress(Result):
+    __slots__ = ()
+
+    line1 = field('Line1')
+    line2 = field('Line2')
+    line3 = field('Line3')
+    city = field('City')
+    region = field('Region')
+    postal_code = field('PostalCode')
+    country = field('Country')
+    county = field('County')
+    fips_code = field('FipsCode')
+    address_type = field('AddressType')
+    latitude = amount_field('Latitude')
+    longitude = amount_field('Longitude')
+
+
+class ValidateAddressResult(Result):
+    """address/validate response"""
+    __slots__ = ()
+
+    address = field('Address', ValidAddress)
+
+
+class CancelTaxResult(Result):
+    """
+    tax/cancel response.  Avalara nests the outcome under CancelTaxResult,
+    the fields below read from there
+    """
+    __slots__ = ()
+
+    @property
+    def _inner(self):
+        return self.raw.get('CancelTaxResult') or self.raw
+
+    @property
+    def result_code(self):
+        return self._inner.get('ResultCode')
+
+    @property
+    def messages(self):
+        return self._inner.get('Messages')
+
+    @property
+    def doc_id(self):
+        return self._inner.get('DocId')
+
+    @property
+    def transaction_id(self):
+        return self._inner.get('TransactionId')
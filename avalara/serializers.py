@@ -1,15 +1,16 @@
 from __future__ import unicode_literals
 
 import datetime
-from decimal import Decimal, ROUND_HALF_UP
 import six
 
 from serpy import BoolField, Field, IntField, Serializer
 
+from .money import Money
+
 
 def get_decimal_value(value):
     if value:
-        return str(Decimal(value).quantize(Decimal('.0001'), rounding=ROUND_HALF_UP))
+        return str(Money.coerce(value))
 
 
 def get_date_value(value):
@@ -86,7 +87,8 @@ class OverridenOrderLineSerializer(OrderLineSerializer):
     tax_override = TaxOverrideSerializer(label='TaxOverride')
 
 
-class BaseTaxRequestSerializer(Serializer):
+class TaxDocumentSerializer(Serializer):
+    # the document fields of a request, without its addresses and lines
     business_identification_no = NullableStrField(
         label='BusinessIdentificationNo', required=False
     )
@@ -106,6 +108,9 @@ class BaseTaxRequestSerializer(Serializer):
     pos_lane_code = NullableStrField(label='PosLaneCode')
     purchase_order_no = NullableStrField(label='PurchaseOrderNo')
     reference_code = NullableStrField(label='ReferenceCode')
+
+
+class BaseTaxRequestSerializer(TaxDocumentSerializer):
     addresses = AddressSerializer(label='Addresses', many=True,)
 
 
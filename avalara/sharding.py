@@ -0,0 +1,148 @@
+"""
+Splitting large uncommitted documents into shards sent side by side.
+
+Avalara takes longer on a document the more lines it has.  A quote over
+the shard size is split into shards of at most that many lines, each
+with the document fields, the addresses its lines use and its lines
+under their original numbers.  The shards are sent concurrently and
+their results merged back into one tax/get result, so the call takes
+as long as the slowest shard instead of the whole document:
+
+    request.shard_lines = 250
+    request.save()
+
+Only uncommitted documents are sharded, a committed one has to be
+recorded by Avalara as a single document.  Documents with a document
+level Discount are not sharded either, Avalara spreads it over all of
+their discounted lines.
+"""
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+import six
+
+from .responses import to_decimal
+
+
+# summed over the shards, other top level fields come from the first shard
+TOTAL_FIELDS = (
+    'TotalAmount',
+    'TotalDiscount',
+    'TotalExemption',
+    'TotalTaxable',
+    'TotalTax',
+    'TotalTaxCalculated',
+)
+
+# TaxSummary entries of the same jurisdiction and rate are added up
+SUMMARY_KEY_FIELDS = ('Country', 'Region', 'JurisType', 'JurisCode', 'JurisName',
+                      'TaxName', 'Rate')
+SUMMARY_AMOUNT_FIELDS = ('Base', 'Taxable', 'NonTaxable', 'Exemption', 'Tax',
+                         'TaxCalculated')
+
+# merged ResultCode is the most severe of the shards
+_SEVERITY = {'Success': 0, 'Warning': 1}
+
+
+def split_document(request_body, shard_lines):
+    """
+    the shard bodies of a serialized GetTaxRequest, a list holding only
+    request_body when it has no more than shard_lines lines.  Shards are
+    about equal in size and keep the order of the lines
+    """
+    if shard_lines < 1:
+        raise ValueError('shard_lines must be at least 1')
+    lines = request_body.get('Lines') or []
+    if len(lines) <= shard_lines or request_body.get('Discount'):
+        return [request_body]
+    # the first extra shards take one line more than the others
+    size, extra = divmod(len(lines), -(-len(lines) // shard_lines))
+    header = dict(
+        (k, v) for k, v in six.iteritems(request_body) if k not in ('Addresses', 'Lines')
+    )
+    addresses = request_body.get('Addresses') or []
+    shards = []
+    start = 0
+    while start < len(lines):
+        end = start + size + (1 if len(shards) < extra else 0)
+        chunk = lines[start:end]
+        start = end
+        codes = set()
+        for line in chunk:
+            codes.add(line.get('DestinationCode'))
+            codes.add(line.get('OriginCode'))
+        shard = dict(header)
+        used = [a for a in addresses if a.get('AddressCode') in codes]
+        if used:
+            shard['Addresses'] = used
+        shard['Lines'] = chunk
+        shards.append(shard)
+    return shards
+
+
+def _total(values, sample):
+    """sum of amounts, as text or a number like sample was sent"""
+    total = sum((to_decimal(v) or Decimal(0) for v in values), Decimal(0))
+    if isinstance(sample, six.string_types):
+        return six.text_type(total)
+    return float(total)
+
+
+def _merge_summary(results):
+    merged = []
+    entries = {}
+    for result in results:
+        for detail in result.get('TaxSummary') or ():
+            key = tuple(six.text_type(detail.get(k)) for k in SUMMARY_KEY_FIELDS)
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = dict(detail)
+                merged.append(entries[key])
+                continue
+            for name in SUMMARY_AMOUNT_FIELDS:
+                if name in detail or name in entry:
+                    entry[name] = _total([entry.get(name), detail.get(name)],
+                                         entry.get(name, detail.get(name)))
+    return merged
+
+
+def merge_results(request_body, results):
+    """
+    one tax/get result from the decoded results of the shards of
+    request_body, in shard order.  When a shard failed its result is
+    returned as it is
+    """
+    for result in results:
+        if result.get('ResultCode') not in _SEVERITY:
+            return result
+    merged = dict(results[0])
+    merged['DocCode'] = request_body.get('DocCode')
+    merged['ResultCode'] = max(
+        (r['ResultCode'] for r in results), key=_SEVERITY.__getitem__,
+    )
+    for name in TOTAL_FIELDS:
+        values = [r.get(name) for r in results if r.get(name) is not None]
+        if values:
+            merged[name] = _total(values, values[0])
+    merged['TaxLines'] = [line for r in results for line in r.get('TaxLines') or ()]
+    if any(r.get('TaxAddresses') for r in results):
+        seen = set()
+        addresses = []
+        for r in results:
+            for address in r.get('TaxAddresses') or ():
+                if address.get('AddressCode') not in seen:
+                    seen.add(address.get('AddressCode'))
+                    addresses.append(address)
+        merged['TaxAddresses'] = addresses
+    if any(r.get('TaxSummary') for r in results):
+        merged['TaxSummary'] = _merge_summary(results)
+    messages = [m for r in results for m in r.get('Messages') or ()]
+    if messages:
+        # shards of one document tend to repeat the same messages
+        unique = []
+        for message in messages:
+            if message not in unique:
+                unique.append(message)
+        merged['Messages'] = unique
+    return merged
@@ -0,0 +1,69 @@
+"""
+Streaming encoder for GetTaxRequest bodies.
+
+iter_request_body produces the JSON of a request_body as byte chunks while
+serializing one line at a time, so a large document is never held in
+memory as a whole.  The bytes are the same as encoding request_body with
+the encoder in one go.
+"""
+from __future__ import unicode_literals
+
+import json
+
+from . import serializers
+from .compiled import compile_serializer
+from .utils import remove_nulls_from_dict
+
+
+# how many bytes of encoded lines are collected before a chunk is sent
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+# compact, without the spaces json.dumps puts after separators
+DEFAULT_ENCODER = json.JSONEncoder(allow_nan=False, separators=(',', ':'))
+
+
+def serialize_function(model, serializer_cls):
+    """
+    null stripped serialization with serializer_cls, compiled when model
+    uses compiled_serialization
+    """
+    if model.compiled_serialization:
+        return compile_serializer(serializer_cls)
+
+    def serialize(instance):
+        return remove_nulls_from_dict(serializer_cls(instance).data)
+    return serialize
+
+
+def iter_request_body(request, encoder=DEFAULT_ENCODER, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    yield the encoded request_body of a GetTaxRequest as utf-8 chunks of
+    about chunk_size bytes
+    """
+    lines_field = request.serializer._field_map['olines']
+    header = serialize_function(request, serializers.BaseTaxRequestSerializer)(request)
+    serialize_line = serialize_function(request, type(lines_field))
+    encode = encoder.encode
+
+    head = encode(header)
+    if not request.olines:
+        yield head.encode('utf-8')
+        return
+
+    # Lines is the last field of the request serializers, open it where
+    # the header object closes
+    separator = encoder.item_separator if header else ''
+    buffer = [head[:-1], separator, encode(lines_field.label), encoder.key_separator, '[']
+    size = 0
+    for i, line in enumerate(request.olines):
+        if i:
+            buffer.append(encoder.item_separator)
+        text = encode(serialize_line(line))
+        buffer.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    buffer.append(']}')
+    yield ''.join(buffer).encode('utf-8')
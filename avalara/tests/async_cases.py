@@ -0,0 +1,141 @@
+"""
+AsyncAvalara tests, imported by test_aio on python 3.8 and later.  Kept
+out of test_* modules because python 2 cannot parse async def
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import datetime
+import unittest
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from ..aio import AsyncAvalara
+except ImportError:  # aiohttp is an optional dependency
+    web = None
+
+from ..client import Avalara
+from ..coalesce import SingleFlight
+from ..models import GetTaxRequest
+from ..resilience import HedgePolicy, RetryPolicy
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class AsyncAvalaraTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.received = []
+        app = web.Application()
+        app.router.add_post('/1.0/tax/get', self.get_tax)
+        app.router.add_post('/1.0/tax/cancel', self.echo)
+        app.router.add_get('/1.0/address/validate', self.echo_params)
+        app.router.add_get('/1.0/tax/{coordinates}/get', self.flaky)
+        app.router.add_get('/slow/address/validate', self.slow)
+        self.flaky_calls = 0
+        self.slow_calls = 0
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.client = AsyncAvalara(
+            '1234', 'abcd', base_url=str(self.server.make_url('/1.0/')),
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def get_tax(self, request):
+        body = await request.json()
+        self.received.append(body)
+        await asyncio.sleep(0.01)
+        return web.json_response({'DocCode': body['DocCode'], 'ResultCode': 'Success'})
+
+    async def echo(self, request):
+        return web.json_response(await request.json())
+
+    async def echo_params(self, request):
+        return web.json_response(dict(request.query))
+
+    async def flaky(self, request):
+        # unavailable once, then slow once
+        self.flaky_calls += 1
+        if self.flaky_calls == 1:
+            return web.json_response({}, status=503)
+        if self.flaky_calls == 2:
+            await asyncio.sleep(0.5)
+        return web.json_response({'Call': self.flaky_calls})
+
+    async def slow(self, request):
+        self.slow_calls += 1
+        await asyncio.sleep(0.1)
+        return web.json_response({})
+
+    async def test_retry_and_hedge(self):
+        self.client.retry = RetryPolicy(backoff=0)
+        self.client.hedge = HedgePolicy(delay=0.02)
+        result = await self.client.estimate_tax(47.6, -122.5, 10)
+        self.assertEqual(result, {'Call': 3})
+
+    async def test_no_hedges_when_saturated(self):
+        client = AsyncAvalara('1234', 'abcd', base_url=str(self.server.make_url('/slow/')),
+                              pool_maxsize=2, hedge=HedgePolicy(delay=0.02))
+        await asyncio.gather(*[client.validate_address('1 a st', 'US') for _ in range(8)])
+        await client.close()
+        self.assertEqual(self.slow_calls, 8)
+
+    async def test_save_async(self):
+        ava = GetTaxRequest(doc_code=5, doc_date=datetime.date(2016, 5, 5))
+        result = await ava.save_async(avalara_client=self.client)
+        self.assertEqual(result, {'DocCode': '5', 'ResultCode': 'Success'})
+        self.assertEqual(self.received, [ava.request_body])
+        self.assertEqual(self.received[0]['DocType'], 'SalesOrder')
+
+    async def test_compressed_body(self):
+        self.client.compression = 'gzip'
+        self.client.compress_min_bytes = 0
+        ava = GetTaxRequest(doc_code=5, doc_date=datetime.date(2016, 5, 5))
+        result = await ava.save_async(avalara_client=self.client)
+        self.assertEqual(result['ResultCode'], 'Success')
+        self.assertEqual(self.received, [ava.request_body])
+
+    async def test_concurrent_saves_share_pool(self):
+        requests = [GetTaxRequest(doc_code=i, avalara_client=self.client) for i in range(1, 51)]
+        results = await asyncio.gather(*[r.save_async() for r in requests])
+        self.assertEqual([r['DocCode'] for r in results], [str(i) for i in range(1, 51)])
+        self.assertEqual(len(self.received), 50)
+
+    async def test_identical_quotes_share_a_call(self):
+        self.client.single_flight = SingleFlight()
+        requests = [
+            GetTaxRequest(doc_code=i, customer_code='C', avalara_client=self.client)
+            for i in range(1, 11)
+        ]
+        results = await asyncio.gather(*[r.save_async() for r in requests])
+        self.assertEqual([r['DocCode'] for r in results], [str(i) for i in range(1, 11)])
+        self.assertEqual(len(self.received), 1)
+        self.assertEqual(self.client.single_flight.stats(), {'calls': 1, 'shared': 9})
+        self.assertEqual(self.client._in_flight, {})
+
+    async def test_sharded_save(self):
+        ava = GetTaxRequest(doc_code=5, avalara_client=self.client)
+        ava.add_lines(item_code=['A', 'B', 'C'], amount=1, destination_code=1, origin_code=1)
+        ava.shard_lines = 2
+        result = await ava.save_async()
+        self.assertEqual(result, {'DocCode': '5', 'ResultCode': 'Success', 'TaxLines': []})
+        self.assertEqual([[l['LineNo'] for l in body['Lines']] for body in self.received],
+                         [[1, 2], [3]])
+
+    async def test_void_document(self):
+        result = await self.client.void_document('5')
+        self.assertEqual(result['DocCode'], '5')
+        self.assertEqual(result['CancelCode'], 'DocVoided')
+
+    async def test_validate_address(self):
+        result = await self.client.validate_address('123 some street', 'US')
+        self.assertEqual(result['Line1'], '123 some street')
+        self.assertEqual(result['Country'], 'US')
+
+    def test_save_async_rejects_blocking_client(self):
+        ava = GetTaxRequest(doc_code=5, avalara_client=Avalara('1234', 'abcd'))
+        with self.assertRaises(TypeError):
+            ava.save_async()
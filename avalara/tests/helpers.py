@@ -0,0 +1,81 @@
+"""requests and fakes shared by the test modules"""
+from __future__ import unicode_literals
+
+import copy
+from decimal import Decimal
+
+from ..constants import NON_TAXABLE_TAX_CODE
+from ..instrumentation import Instrumentation
+from ..models import GetTaxRequest
+from .test_request_body import (
+    AVA_LOOKUP,
+    DESTINATION_ADDRESS_LOOKUP,
+    LINE_LOOKUP_1,
+    LINE_LOOKUP_2,
+    LINE_LOOKUP_3,
+    ORIGIN_ADDRESS_LOOKUP,
+)
+
+
+def build_request(postal_code='98101', **kwargs):
+    """a taxable and a non taxable line shipped from Seattle to postal_code"""
+    ava = GetTaxRequest(doc_code=1, **kwargs)
+    origin = ava.add_address(address1='1 Main St', city='Seattle', state='WA', postal_code='98101')
+    destination = ava.add_address(address1='2 Main St', city='Anywhere', state='WA',
+                                  postal_code=postal_code)
+    ava.add_line(item_code='A1', amount=Decimal('19.99'), origin_code=origin,
+                 destination_code=destination)
+    ava.add_line(item_code='A2', amount=Decimal('5'), origin_code=origin,
+                 destination_code=destination, tax_code=NON_TAXABLE_TAX_CODE)
+    return ava
+
+
+def build_lookup_request(override_lookup=None, lines=3):
+    """the document of test_request_body with lines taken in turn from its lookups"""
+    ava = GetTaxRequest(**AVA_LOOKUP)
+    origin_code = ava.add_address(**ORIGIN_ADDRESS_LOOKUP)
+    destination_code = ava.add_address(**DESTINATION_ADDRESS_LOOKUP)
+    lookups = [LINE_LOOKUP_1, LINE_LOOKUP_2, LINE_LOOKUP_3]
+    for i in range(lines):
+        line_lookup = copy.deepcopy(lookups[i % 3])
+        line_lookup['destination_code'] = destination_code
+        line_lookup['origin_code'] = origin_code
+        ava.add_line(override_lookup=override_lookup or {}, **line_lookup)
+    return ava
+
+
+def build_long_request(lines=7, **kwargs):
+    """lines shipped to Seattle for the first 3 and to another address after"""
+    ava = GetTaxRequest(doc_code=1, **kwargs)
+    origin = ava.add_address(address1='1 Main St', city='Seattle', state='WA', postal_code='98101')
+    seattle = ava.add_address(address1='2 Main St', city='Seattle', state='WA', postal_code='98101')
+    elsewhere = ava.add_address(address1='3 Main St', city='Anywhere', state='WA',
+                                postal_code='10001')
+    for i in range(lines):
+        ava.add_line(item_code='A%d' % i, amount='%d.99' % (i + 1), origin_code=origin,
+                     destination_code=seattle if i < 3 else elsewhere)
+    return ava
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingInstrumentation(Instrumentation):
+
+    def __init__(self):
+        self.events = []
+
+    def timing(self, name, seconds, **tags):
+        self.events.append(('timing', name, tags))
+
+    def size(self, name, value, **tags):
+        self.events.append(('size', name, value, tags))
+
+    def increment(self, name, value=1, **tags):
+        self.events.append(('increment', name, value, tags))
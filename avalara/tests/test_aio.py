@@ -0,0 +1,14 @@
+from __future__ import unicode_literals
+
+import sys
+import unittest
+
+if sys.version_info >= (3, 8):
+    # IsolatedAsyncioTestCase is new in 3.8
+    from .async_cases import AsyncAvalaraTest  # noqa: F401
+else:
+    @unittest.skip('AsyncAvalara tests need python 3.8 or later')
+    class AsyncAvalaraTest(unittest.TestCase):
+
+        def test_skipped(self):
+            pass
@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+import unittest
+
+from ..bulk import save_many
+from ..models import GetTaxRequest
+
+
+class FakeClient(object):
+    """records concurrency and fails on doc code 3"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get_tax(self, request_body):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            doc_code = int(request_body['DocCode'])
+            # later documents finish first
+            time.sleep(0.002 * (10 - doc_code % 10))
+            if doc_code == 3:
+                raise ValueError('upstream error')
+            return {'DocCode': request_body['DocCode'], 'DocType': request_body['DocType']}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class SaveManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+
+    def requests(self, count):
+        for i in range(1, count + 1):
+            yield GetTaxRequest(doc_code=i, avalara_client=self.client)
+
+    def test_ordered(self):
+        results = list(save_many(self.requests(20), concurrency=4, ordered=True))
+        self.assertEqual([r.index for r in results], list(range(20)))
+        self.assertLessEqual(self.client.max_in_flight, 4)
+
+    def test_failure_does_not_abort_batch(self):
+        results = list(save_many(self.requests(20), concurrency=4))
+        self.assertEqual(sorted(r.index for r in results), list(range(20)))
+        failed = [r for r in results if not r.ok]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0].request.doc_code, 3)
+        self.assertIsInstance(failed[0].error, ValueError)
+
+    def test_commit(self):
+        results = list(save_many(self.requests(2), commit=True))
+        self.assertEqual({r.result['DocType'] for r in results}, {'SalesInvoice'})
+
+    def test_invalid_concurrency(self):
+        with self.assertRaises(ValueError):
+            list(save_many(self.requests(1), concurrency=0))
@@ -0,0 +1,202 @@
+from __future__ import unicode_literals
+
+import datetime
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..cache import LocalCache, QuoteCache, SharedCache
+from ..client import Avalara
+from ..models import GetTaxRequest
+from ..utils import address_cache_key
+from .helpers import FakeClock
+
+
+class DictStore(object):
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ttl):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class LocalCacheTest(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = LocalCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = LocalCache(ttl=10, clock=clock)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=30)
+        clock.now += 20
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_counters(self):
+        cache = LocalCache()
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+
+class SharedCacheTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        store = DictStore()
+        cache = SharedCache(store)
+        cache.set('a', {'ResultCode': 'Success'})
+        # a second worker on the same store sees the entry
+        self.assertEqual(SharedCache(store).get('a'), {'ResultCode': 'Success'})
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+
+    def test_clear(self):
+        store = DictStore()
+        clock = FakeClock()
+        cache = SharedCache(store, clock=clock)
+        other = SharedCache(store, clock=clock)
+        cache.set('a', 1)
+        self.assertEqual(other.get('a'), 1)
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+        # the other process keeps its version for version_ttl seconds
+        self.assertEqual(other.get('a'), 1)
+        clock.now += 1
+        self.assertIsNone(other.get('a'))
+        other.set('b', 2)
+        self.assertEqual(cache.get('b'), 2)
+
+
+class AddressCacheKeyTest(unittest.TestCase):
+
+    def test_normalized(self):
+        self.assertEqual(
+            address_cache_key('123 Some Street ', 'Apt 4', city='Denver',
+                              region='CO', postal_code='80202', country='US'),
+            address_cache_key('', ' 123 some street', 'APT 4', city='denver ',
+                              region='co', postal_code='80202', country='us'),
+        )
+
+
+class ValidateAddressCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalCache()
+        self.client = Avalara('1234', 'abcd', address_cache=self.cache)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_hit_skips_network(self):
+        self.request.return_value.content = json.dumps({'ResultCode': 'Success'}).encode('utf-8')
+        self.client.validate_address('123 Some Street', 'US', city='Denver')
+        result = self.client.validate_address(' 123 SOME STREET', 'us', city='denver')
+        self.assertEqual(result, {'ResultCode': 'Success'})
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_errors_not_cached(self):
+        self.request.return_value.content = json.dumps({'ResultCode': 'Error'}).encode('utf-8')
+        self.client.validate_address('123 Some Street', 'US')
+        self.client.validate_address('123 Some Street', 'US')
+        self.assertEqual(self.request.call_count, 2)
+
+
+class QuoteCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = QuoteCache(ttl=60, clock=self.clock)
+        self.client = Avalara('1234', 'abcd', quote_cache=self.cache)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+        self.request.return_value.content = json.dumps({
+            'DocCode': '1', 'ResultCode': 'Success', 'TotalTax': '1.5',
+        }).encode('utf-8')
+
+    def quote(self, doc_code, amount=10, commit=False, **kwargs):
+        ava = GetTaxRequest(doc_code=doc_code, avalara_client=self.client, **kwargs)
+        ava.add_line(item_code='A1', destination_code=1, origin_code=1, amount=amount)
+        return ava.save(commit=commit)
+
+    def test_requote_is_cached_under_its_doc_code(self):
+        self.quote(1)
+        result = self.quote(2)
+        self.assertEqual(result, {'DocCode': '2', 'ResultCode': 'Success', 'TotalTax': '1.5'})
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual(self.cache.hit_ratio, 0.5)
+
+    def test_changed_lines_miss(self):
+        self.quote(1, amount=10)
+        self.quote(1, amount=20)
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_other_doc_date_misses(self):
+        self.request.return_value.content = json.dumps({
+            'DocCode': '1', 'DocDate': '2016-05-05', 'ResultCode': 'Success',
+        }).encode('utf-8')
+        self.quote(1, doc_date=datetime.date(2016, 5, 5))
+        self.quote(1, doc_date=datetime.date(2016, 5, 6))
+        self.assertEqual(self.request.call_count, 2)
+        result = self.quote(2, doc_date=datetime.date(2016, 5, 6))
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(result['DocDate'], '2016-05-06')
+
+    def test_commit_bypasses_cache(self):
+        self.quote(1)
+        self.quote(1, commit=True)
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(self.cache.stats()['hits'] + self.cache.stats()['misses'], 1)
+
+    def test_errors_not_cached(self):
+        self.request.return_value.content = b'{"ResultCode": "Error"}'
+        self.quote(1)
+        self.quote(1)
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_expiry_and_invalidation(self):
+        self.quote(1)
+        self.clock.now += 61
+        self.quote(1)
+        self.assertEqual(self.request.call_count, 2)
+        ava = GetTaxRequest(doc_code=5)
+        ava.add_line(item_code='A1', destination_code=1, origin_code=1, amount=10)
+        self.cache.invalidate(ava.request_body)
+        self.quote(1)
+        self.assertEqual(self.request.call_count, 3)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['bytes'], 0)
+
+    def test_hits_are_independent_copies(self):
+        self.quote(1)
+        self.quote(2)['TotalTax'] = '0'
+        self.assertEqual(self.quote(3)['TotalTax'], '1.5')
+
+    def test_bytes_bound(self):
+        cache = QuoteCache(maxbytes=100)
+        for i in range(10):
+            cache.set_quote({'Lines': [i]}, {'ResultCode': 'Success', 'DocCode': 'x' * 20})
+        self.assertLessEqual(cache.bytes_used, 100)
+        self.assertIsNotNone(cache.get_quote({'Lines': [9]}))
+        self.assertIsNone(cache.get_quote({'Lines': [0]}))
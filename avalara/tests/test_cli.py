@@ -0,0 +1,149 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # python 2
+    import mock
+
+from ..cli import InputError, Reservoir, build_request, iter_orders, main, save_checkpoint
+from ..fakeserver import FakeAvalara, FakeAvalaraServer
+
+
+ORDERS_CSV = '''doc_code,customer_code,doc_date,origin_address1,origin_city,origin_state,origin_postal_code,destination_address1,destination_city,destination_state,destination_postal_code,item_code,qty,price
+1,C1,2016-05-05,1 Main St,Seattle,WA,98101,2 Main St,Seattle,WA,98101,A1,2,10.00
+1,C1,2016-05-05,1 Main St,Seattle,WA,98101,3 Main St,Anywhere,WA,10001,A2,1,5.00
+2,C2,2016-05-05,1 Main St,Seattle,WA,98101,2 Main St,Seattle,WA,98101,A1,x,10.00
+3,C3,2016-05-05,1 Main St,Seattle,WA,98101,2 Main St,Seattle,WA,98101,A3,1,100
+'''
+
+ROW = {
+    'doc_code': '7', 'customer_code': 'C7', 'doc_date': '2016-05-05',
+    'origin_address1': '1 Main St', 'origin_city': 'Seattle', 'origin_state': 'WA',
+    'origin_postal_code': '98101', 'destination_address1': '2 Main St',
+    'destination_city': 'Seattle', 'destination_state': 'WA',
+    'destination_postal_code': '98101', 'item_code': 'A1', 'qty': 3, 'amount': '30',
+}
+
+
+class BuildTest(unittest.TestCase):
+
+    def test_build_request(self):
+        rows = [ROW, dict(ROW, item_code='A2', destination_postal_code='10001')]
+        (doc_code, grouped), = list(iter_orders(rows))
+        request = build_request(grouped, avalara_client=object())
+        body = request.request_body
+        self.assertEqual((doc_code, body['DocCode'], body['DocDate']), ('7', '7', '2016-05-05'))
+        self.assertEqual(len(body['Addresses']), 3)
+        self.assertEqual([l['LineNo'] for l in body['Lines']], [1, 2])
+        self.assertEqual(body['Lines'][0]['Qty'], 3)
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            build_request([dict(ROW, colour='red')], avalara_client=object())
+
+    def test_error_names_line_and_field(self):
+        rows = [ROW, dict(ROW, item_code='')]
+        with self.assertRaises(InputError) as raised:
+            build_request(rows, avalara_client=object())
+        message = str(raised.exception)
+        self.assertIn('line 2', message)
+        self.assertIn('item_code', message)
+        with self.assertRaises(InputError) as raised:
+            build_request([dict(ROW, doc_date='May 5')], avalara_client=object())
+        self.assertIn('document', str(raised.exception))
+
+    def test_reservoir(self):
+        reservoir = Reservoir(size=100, seed=1)
+        for i in range(10000):
+            reservoir.add(i)
+        self.assertEqual(len(reservoir.values), 100)
+        self.assertTrue(3000 < reservoir.percentile(50) < 7000)
+
+
+@mock.patch.dict(os.environ, {'AVALARA_ACCOUNT_NUMBER': '1234', 'AVALARA_LICENSE_KEY': 'abcd'})
+class MainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeAvalara(rates={'98101': '0.1025'})
+        self.server = FakeAvalaraServer(self.fake).start()
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, 'orders.csv')
+        self.output = os.path.join(self.directory, 'results.jsonl')
+        self.checkpoint = os.path.join(self.directory, 'run.checkpoint')
+        with io.open(self.input, 'w') as f:
+            f.write(ORDERS_CSV)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def main(self, *args):
+        stderr = io.StringIO()
+        with mock.patch('sys.stderr', stderr):
+            status = main([self.input, '--output', self.output, '--base-url',
+                           self.server.base_url, '--concurrency', '2'] + list(args))
+        return status, json.loads(stderr.getvalue())
+
+    def results(self):
+        with open(self.output, 'rb') as f:
+            return [json.loads(line.decode('utf-8')) for line in f]
+
+    def test_quotes(self):
+        status, stats = self.main()
+        self.assertEqual(status, 1)
+        results = self.results()
+        self.assertEqual([(r['index'], r['doc_code'], r['ok']) for r in results],
+                         [(0, '1', True), (1, '2', False), (2, '3', True)])
+        self.assertEqual(results[0]['result']['TotalTax'], '2.45')
+        self.assertEqual(results[0]['result']['DocType'], 'SalesOrder')
+        self.assertIn('ValueError', results[1]['error'])
+        self.assertEqual(stats['documents'], 3)
+        self.assertEqual(stats['lines'], 3)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['result.Success'], 2)
+        self.assertIsNotNone(stats['latency_p99_ms'])
+
+    def test_commit_and_jsonl(self):
+        jsonl = os.path.join(self.directory, 'orders.jsonl')
+        with io.open(jsonl, 'w') as f:
+            f.write('%s\n' % json.dumps(ROW))
+        self.input = jsonl
+        status, stats = self.main('--commit')
+        self.assertEqual(status, 0)
+        self.assertEqual(self.results()[0]['result']['DocType'], 'SalesInvoice')
+        self.assertEqual(self.fake.documents, {('SOC', '7'): 'Committed'})
+
+    def test_commit_checkpoints_every_document(self):
+        saved = []
+        with mock.patch('avalara.cli.save_checkpoint',
+                        lambda path, documents, output_bytes: saved.append(documents)):
+            self.main('--commit', '--checkpoint', self.checkpoint)
+            self.assertEqual(saved, [1, 2, 3, 3])
+            del saved[:]
+            self.main('--checkpoint', self.checkpoint)
+            self.assertEqual(saved, [3])
+
+    def test_resume_from_checkpoint(self):
+        self.main('--checkpoint', self.checkpoint, '--checkpoint-every', '1')
+        with open(self.output, 'rb') as f:
+            first = f.readline()
+        # interrupted after the first document, half way through the second
+        with open(self.output, 'wb') as f:
+            f.write(first + b'{"index": 1, "doc')
+        save_checkpoint(self.checkpoint, 1, len(first))
+        self.fake.reset_stats()
+
+        status, stats = self.main('--checkpoint', self.checkpoint)
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(stats['documents'], 2)
+        self.assertEqual(self.fake.stats()['requests.tax/get'], 1)
+        self.assertEqual([r['index'] for r in self.results()], [0, 1, 2])
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['documents'], 3)
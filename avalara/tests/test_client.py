@@ -0,0 +1,74 @@
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..client import Avalara, get_default_client
+from ..models import GetTaxRequest
+
+
+class AvalaraSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Avalara('1234', 'abcd', pool_connections=2, pool_maxsize=4)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_session_is_reused(self):
+        self.assertIs(self.client.session, self.client.session)
+
+    def test_pool_configuration(self):
+        adapter = self.client.session.get_adapter('https://development.avalara.net/')
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 4)
+
+    def test_keep_alive_disabled(self):
+        client = Avalara('1234', 'abcd', keep_alive=False)
+        self.assertEqual(client.session.headers['Connection'], 'close')
+
+    def test_session_rebuilt_after_fork(self):
+        session = self.client.session
+        with mock.patch('os.getpid', return_value=-1):
+            child_session = self.client.session
+        self.assertIsNot(session, child_session)
+
+    def test_close(self):
+        session = self.client.session
+        with mock.patch.object(session, 'close') as close:
+            self.client.close()
+        close.assert_called_once_with()
+        self.assertIsNot(session, self.client.session)
+
+    def test_context_manager(self):
+        with Avalara('1234', 'abcd') as client:
+            session = client.session
+        self.assertIsNone(client._session)
+        self.assertIsNotNone(session)
+
+    def test_request_uses_pool(self):
+        with mock.patch.object(self.client.session, 'request') as request:
+            request.return_value.content = json.dumps({'ResultCode': 'Success'}).encode('utf-8')
+            result = self.client.void_document('5')
+        self.assertEqual(result, {'ResultCode': 'Success'})
+        self.assertEqual(request.call_count, 1)
+
+
+class GetTaxRequestClientTest(unittest.TestCase):
+
+    def test_default_client_shared(self):
+        first = GetTaxRequest(doc_code=1)
+        second = GetTaxRequest(doc_code=2)
+        self.assertIs(first.avalara_client, get_default_client())
+        self.assertIs(first.avalara_client, second.avalara_client)
+
+    def test_injected_client(self):
+        client = Avalara('1234', 'abcd')
+        ava = GetTaxRequest(doc_code=1, avalara_client=client)
+        self.assertIs(ava.avalara_client, client)
+        self.assertNotIn('Client', ava.request_body)
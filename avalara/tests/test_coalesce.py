@@ -0,0 +1,119 @@
+from __future__ import unicode_literals
+
+import datetime
+import json
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..client import Avalara
+from ..coalesce import SingleFlight, fingerprint
+from ..models import GetTaxRequest
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_ignored_fields(self):
+        first = {'DocCode': '1', 'DocDate': '2016-05-05', 'Lines': [{'Amount': 10}]}
+        second = {'Lines': [{'Amount': 10}], 'DocDate': '2016-05-06', 'DocCode': '2'}
+        self.assertEqual(fingerprint(first), fingerprint(second))
+        self.assertNotEqual(fingerprint(first, ignore=()), fingerprint(second, ignore=()))
+
+    def test_content_changes_fingerprint(self):
+        first = {'DocCode': '1', 'Lines': [{'Amount': 10}]}
+        second = {'DocCode': '1', 'Lines': [{'Amount': 11}]}
+        self.assertNotEqual(fingerprint(first), fingerprint(second))
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.client = Avalara('1234', 'abcd', single_flight=self.flight)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+        self.release = threading.Event()
+        self.entered = threading.Event()
+
+        def respond(method, url, data=None, **kwargs):
+            self.entered.set()
+            self.release.wait(5)
+            response = mock.Mock(status_code=200)
+            doc_code = json.loads(data.decode('utf-8'))['DocCode']
+            response.content = self.dumps({'DocCode': doc_code, 'ResultCode': 'Success'})
+            return response
+        self.request.side_effect = respond
+
+    def dumps(self, body):
+        return json.dumps(body).encode('utf-8')
+
+    def quote(self, doc_code, commit=False, amount=10):
+        ava = GetTaxRequest(doc_code=doc_code, doc_date=datetime.date(2016, 5, 5),
+                            avalara_client=self.client)
+        ava.add_line(item_code='A1', destination_code=1, origin_code=1, amount=amount)
+        return ava.save(commit=commit)
+
+    def run_concurrently(self, calls, ready=None):
+        """
+        start calls in threads, the first one's request is held until
+        ready() says the others reached the client
+        """
+        if ready is None:
+            def ready():
+                return self.flight.calls + self.flight.shared == len(calls)
+        results = [None] * len(calls)
+
+        def run(i, call):
+            results[i] = call()
+        threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+        threads[0].start()
+        self.entered.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        for _ in range(5000):
+            if ready():
+                break
+            threading.Event().wait(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_identical_quotes_share_a_call(self):
+        results = self.run_concurrently([
+            lambda i=i: self.quote(i) for i in range(1, 6)
+        ])
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual([r['DocCode'] for r in results], ['1', '2', '3', '4', '5'])
+        self.assertEqual(self.flight.stats(), {'calls': 1, 'shared': 4})
+
+    def test_different_quotes_are_sent(self):
+        results = self.run_concurrently([
+            lambda: self.quote(1, amount=10), lambda: self.quote(2, amount=20),
+        ])
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual([r['DocCode'] for r in results], ['1', '2'])
+
+    def test_commits_are_not_shared(self):
+        self.run_concurrently(
+            [lambda: self.quote(1, commit=True), lambda: self.quote(1, commit=True)],
+            ready=lambda: self.request.call_count == 2,
+        )
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_errors_reach_every_caller(self):
+        self.release.set()
+        self.request.side_effect = IOError('down')
+        with self.assertRaises(IOError):
+            self.quote(1)
+        self.assertEqual(self.flight._in_flight, {})
+
+    def test_sequential_quotes_are_not_cached(self):
+        self.release.set()
+        self.quote(1)
+        self.quote(2)
+        self.assertEqual(self.request.call_count, 2)
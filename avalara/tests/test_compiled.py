@@ -0,0 +1,52 @@
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+from serpy import DictSerializer, Field, MethodField, Serializer
+
+from ..compiled import compile_serializer
+from ..models import GetTaxRequest
+from ..utils import remove_nulls_from_dict
+from .helpers import build_lookup_request
+from .test_request_body import AVA_LOOKUP, OVERRIDE_LOOKUP_1, OVERRIDE_LOOKUP_3
+
+
+class CompiledSerializationTest(unittest.TestCase):
+
+    def assertSameBody(self, ava):
+        expected = ava.request_body
+        ava.compiled_serialization = True
+        self.assertEqual(json.dumps(expected), json.dumps(ava.request_body))
+
+    def test_initial_doc(self):
+        self.assertSameBody(GetTaxRequest(**AVA_LOOKUP))
+
+    def test_lines(self):
+        self.assertSameBody(build_lookup_request(lines=300))
+
+    def test_overrides(self):
+        self.assertSameBody(build_lookup_request(OVERRIDE_LOOKUP_1))
+        self.assertSameBody(build_lookup_request(OVERRIDE_LOOKUP_3))
+
+    def test_getters(self):
+        class ItemSerializer(DictSerializer):
+            name = Field(label='Name')
+            tags = Field(label='Tags')
+
+        class ParentSerializer(Serializer):
+            item = ItemSerializer(label='Item')
+            total = MethodField(label='Total')
+            optional = Field(label='Optional', required=False)
+
+            def get_total(self, obj):
+                return obj.count * 2
+
+        class Parent(object):
+            item = {'name': 'a', 'tags': ['', 'b']}
+            count = 2
+            optional = None
+
+        expected = remove_nulls_from_dict(ParentSerializer(Parent()).data)
+        self.assertEqual(compile_serializer(ParentSerializer)(Parent()), expected)
+        self.assertEqual(expected, {'Item': {'Name': 'a', 'Tags': ['b']}, 'Total': 4})
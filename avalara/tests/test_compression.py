@@ -0,0 +1,74 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from ..client import Avalara
+from ..compression import compress, decompress, iter_compressed
+from ..fakeserver import FakeAvalara, FakeAvalaraServer
+from .helpers import RecordingInstrumentation, build_long_request
+
+
+class CompressionTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = b'{"Lines":[' + b'{"ItemCode":"A1","Qty":1},' * 100 + b']}'
+        for encoding in ('gzip', 'deflate'):
+            compressed = compress(data, encoding)
+            self.assertLess(len(compressed), len(data) // 10)
+            self.assertEqual(decompress(compressed, encoding), data)
+            chunks = list(iter_compressed([data[:500], data[500:]], encoding))
+            self.assertTrue(all(chunks[:-1]))
+            self.assertEqual(decompress(b''.join(chunks), encoding), data)
+        self.assertEqual(decompress(data, None), data)
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, compress, b'', 'br')
+        self.assertRaises(ValueError, decompress, b'', 'br')
+
+
+class CompressedCallTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeAvalara(rates={'98101': '0.1025'})
+        self.server = FakeAvalaraServer(self.fake, compress_min_bytes=1024).start()
+        self.metrics = RecordingInstrumentation()
+        self.client = Avalara('1234', 'abcd', base_url=self.server.base_url,
+                              compression='gzip', compress_min_bytes=1024,
+                              instrumentation=self.metrics)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def sizes(self):
+        return dict((e[1], e[2]) for e in self.metrics.events if e[0] == 'size')
+
+    def test_compressed_both_ways(self):
+        ava = build_long_request(lines=50, avalara_client=self.client)
+        whole = ava.save()
+        self.assertEqual(whole['ResultCode'], 'Success')
+        self.assertEqual(len(whole['TaxLines']), 50)
+        sizes = self.sizes()
+        self.assertLess(sizes['request_wire_bytes'] * 5, sizes['request_bytes'])
+        self.assertLess(sizes['response_wire_bytes'] * 5, sizes['response_bytes'])
+        self.assertIn(('timing', 'compress', {'endpoint': 'tax/get'}), self.metrics.events)
+
+        self.metrics.events = []
+        self.client.compression = 'deflate'
+        self.assertEqual(ava.save(stream=True)['TotalTax'], whole['TotalTax'])
+        sizes = self.sizes()
+        self.assertLess(sizes['request_wire_bytes'] * 5, sizes['request_bytes'])
+
+    def test_small_bodies_sent_plain(self):
+        build_long_request(lines=1, avalara_client=self.client).save()
+        sizes = self.sizes()
+        self.assertEqual(sizes['request_wire_bytes'], sizes['request_bytes'])
+        self.assertEqual(sizes['response_wire_bytes'], sizes['response_bytes'])
+
+    def test_corrupt_body(self):
+        response = self.client.session.post(
+            self.server.base_url + 'tax/get', data=b'not gzip',
+            headers={'Authorization': 'Basic x', 'Content-Encoding': 'gzip'},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['ResultCode'], 'Error')
@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..cache import LocalCache
+from ..client import Avalara
+from ..estimate import bucket_key
+
+
+ESTIMATE_RESPONSE = {
+    'Rate': 0.096,
+    'Tax': 9.6,
+    'TaxDetails': [
+        {'Rate': 0.065, 'Tax': 6.5, 'JurisName': 'WASHINGTON', 'JurisType': 'State'},
+        {'Rate': 0.031, 'Tax': 3.1, 'JurisName': 'SEATTLE', 'JurisType': 'City'},
+    ],
+    'ResultCode': 'Success',
+}
+
+
+class EstimateTaxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalCache()
+        self.client = Avalara('1234', 'abcd', base_url='https://avalara.test/1.0/',
+                              estimate_cache=self.cache, estimate_precision=2)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.request.return_value.content = json.dumps(ESTIMATE_RESPONSE).encode('utf-8')
+        self.addCleanup(mock.patch.stopall)
+
+    def test_url(self):
+        client = Avalara('1234', 'abcd', base_url='https://avalara.test/1.0/')
+        with mock.patch.object(client.session, 'request') as request:
+            request.return_value.content = b'{}'
+            client.estimate_tax(47.627935, -122.51702, 100)
+        args, kwargs = request.call_args
+        self.assertEqual(args, ('get', 'https://avalara.test/1.0/tax/47.627935,-122.51702/get'))
+        self.assertEqual(kwargs['params'], {'saleamount': '100'})
+
+    def test_same_bucket_computed_locally(self):
+        self.assertEqual(self.client.estimate_tax(47.6279, -122.5170, 100), ESTIMATE_RESPONSE)
+        result = self.client.estimate_tax(47.6301, -122.5160, 25.25)
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual(result['Rate'], 0.096)
+        self.assertEqual(result['Tax'], 2.42)
+        self.assertEqual([d['Tax'] for d in result['TaxDetails']], [1.64, 0.78])
+        self.assertEqual(result['TaxDetails'][1]['JurisName'], 'SEATTLE')
+
+    def test_other_bucket_requested(self):
+        self.client.estimate_tax(47.62, -122.51, 100)
+        self.client.estimate_tax(47.64, -122.51, 100)
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_bucket_key(self):
+        self.assertEqual(bucket_key(47.6279, -122.517, 2), 'estimate:47.63,-122.52')
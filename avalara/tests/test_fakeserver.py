@@ -0,0 +1,84 @@
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+from ..client import Avalara
+from ..fakeserver import FakeAvalara, FakeAvalaraServer, fixed
+from ..resilience import RetryPolicy
+from .helpers import build_request
+
+
+class FakeServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeAvalara(rates={'98101': '0.1025'}, seed=1)
+        self.server = FakeAvalaraServer(self.fake).start()
+        self.client = Avalara('1234', 'abcd', base_url=self.server.base_url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def save(self, commit=False, **kwargs):
+        return build_request(avalara_client=self.client, **kwargs).save(commit=commit)
+
+    def test_get_tax(self):
+        result = self.save()
+        self.assertEqual(result['ResultCode'], 'Success')
+        self.assertEqual(result['DocType'], 'SalesOrder')
+        self.assertEqual(result['TotalTax'], '2.05')
+        # unknown destinations use the default rate
+        self.assertEqual(self.save(postal_code='10001')['TotalTax'], '1.60')
+
+    def test_commit_and_cancel(self):
+        self.assertEqual(self.client.void_document('1')['CancelTaxResult']['ResultCode'], 'Error')
+        self.save(commit=True)
+        self.assertEqual(self.fake.documents, {('SOC', '1'): 'Committed'})
+        result = self.client.void_document('1')
+        self.assertEqual(result['CancelTaxResult']['ResultCode'], 'Success')
+
+    def test_invalid_documents(self):
+        ava = build_request(avalara_client=self.client)
+        ava.olines[0].destination_code = 9
+        result = ava.save()
+        self.assertEqual(result['ResultCode'], 'Error')
+        self.assertIn('DestinationCode 9', result['Messages'][0]['Summary'])
+
+    def test_address_and_estimate(self):
+        result = self.client.validate_address('1 main st', 'us', city='Seattle')
+        self.assertEqual(result['Address']['Line1'], '1 MAIN ST')
+        result = self.client.estimate_tax(47.6, -122.33, 100)
+        self.assertEqual((result['Rate'], result['Tax']), (0.08, 8.0))
+
+    def test_authentication(self):
+        status, _, result = self.fake.handle('GET', 'address/validate', {'Line1': 'x'}, b'',
+                                             authorized=False)
+        self.assertEqual((status, result['ResultCode']), (401, 'Error'))
+
+    def test_errors_throttling_and_stats(self):
+        self.fake.error_rate = 1
+        self.client.retry = RetryPolicy(max_attempts=2, backoff=0)
+        self.client.validate_address('1 main st', 'US')
+        stats = self.fake.stats()
+        self.assertEqual(stats['injected_errors'], 2)
+        self.assertEqual(stats['status.503'], 2)
+
+        self.fake.error_rate = 0
+        self.client.retry = None
+        self.fake.throttle = self.fake._tokens = 2
+        for _ in range(3):
+            self.save()
+        stats = self.fake.stats()
+        self.assertEqual(stats['throttled'], 1)
+        self.assertEqual(stats['status.429'], 1)
+        self.assertEqual(stats['requests.tax/get'], 3)
+
+    def test_concurrent_latency(self):
+        self.fake.latency = fixed(0.05)
+        threads = [threading.Thread(target=self.save) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.fake.stats()['status.200'], 10)
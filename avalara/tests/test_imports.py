@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+
+import datetime
+import itertools
+import json
+import subprocess
+import sys
+import unittest
+
+import avalara
+from ..models import GetTaxRequest, TaxOverride
+
+
+# seconds `import avalara` may take in a fresh interpreter.  Loading
+# requests alone takes several times this
+IMPORT_BUDGET = 0.05
+
+# loaded on first use only
+HEAVY_MODULES = ['avalara.client', 'avalara.models', 'requests', 'serpy']
+
+MEASURE = '''
+import json, sys, time
+start = time.perf_counter()
+import avalara
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+'''
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'lazy imports need module __getattr__')
+class LazyImportTest(unittest.TestCase):
+
+    def measure(self):
+        output = subprocess.check_output([sys.executable, '-c', MEASURE % HEAVY_MODULES])
+        return json.loads(output.decode('utf-8'))
+
+    def test_import_is_light(self):
+        result = self.measure()
+        self.assertEqual(result['loaded'], [])
+        # best of a few runs, a busy machine should not fail the build
+        seconds = min([result['seconds']] + [self.measure()['seconds'] for _ in range(2)])
+        self.assertLess(seconds, IMPORT_BUDGET)
+
+    def test_names_load_on_use(self):
+        self.assertIs(avalara.GetTaxRequest, GetTaxRequest)
+        self.assertIn('save_many', dir(avalara))
+        self.assertEqual(avalara.NON_TAXABLE_TAX_CODE, 'ON030000')
+        with self.assertRaises(AttributeError):
+            avalara.missing
+
+
+class CallableDefaultTest(unittest.TestCase):
+
+    def test_dates_are_evaluated_per_instance(self):
+        self.assertEqual(GetTaxRequest(doc_code=1).doc_date, datetime.date.today())
+        self.assertEqual(TaxOverride().tax_date, datetime.date.today())
+
+    def test_called_for_every_instance(self):
+        counter = itertools.count(1)
+
+        class CountingOverride(TaxOverride):
+            defaults = dict(TaxOverride.defaults, tax_date=lambda: next(counter))
+
+        self.assertEqual([CountingOverride().tax_date for _ in range(3)], [1, 2, 3])
+        self.assertEqual(CountingOverride(tax_date=5).tax_date, 5)
@@ -0,0 +1,130 @@
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+try:
+    import prometheus_client
+except ImportError:  # optional dependency
+    prometheus_client = None
+
+from ..client import Avalara
+from ..instrumentation import PrometheusInstrumentation, StatsdInstrumentation
+from ..resilience import RetryPolicy
+from .helpers import RecordingInstrumentation, build_lookup_request
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = RecordingInstrumentation()
+        self.client = Avalara('1234', 'abcd', instrumentation=self.metrics)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+        self.response = b'{"ResultCode": "Success"}'
+        self.request.return_value.status_code = 200
+        self.request.return_value.content = self.response
+
+    def test_save_phases(self):
+        ava = build_lookup_request(lines=3)
+        ava.avalara_client = self.client
+        ava.save()
+        body = self.request.call_args[1]['data']
+        self.assertEqual(json.loads(body.decode('utf-8')), ava.request_body)
+        endpoint = {'endpoint': 'tax/get'}
+        self.assertEqual(self.metrics.events, [
+            ('size', 'lines', 3, {}),
+            ('timing', 'serialize', {'engine': 'serpy'}),
+            ('timing', 'remove_nulls', {}),
+            ('timing', 'encode', endpoint),
+            ('size', 'request_bytes', len(body), endpoint),
+            ('size', 'request_wire_bytes', len(body), endpoint),
+            ('timing', 'request', dict(endpoint, status='200')),
+            ('size', 'response_bytes', len(self.response), endpoint),
+            ('size', 'response_wire_bytes', len(self.response), endpoint),
+            ('timing', 'decode', endpoint),
+        ])
+
+    def test_compiled_engine(self):
+        ava = build_lookup_request(lines=3)
+        ava.avalara_client = self.client
+        ava.compiled_serialization = True
+        ava.save()
+        self.assertIn(('timing', 'serialize', {'engine': 'compiled'}), self.metrics.events)
+
+    def test_streamed_request_bytes(self):
+        ava = build_lookup_request(lines=3)
+        ava.avalara_client = self.client
+
+        def consume(method, url, data=None, **kwargs):
+            list(data)
+            return self.request.return_value
+        self.request.side_effect = consume
+        ava.save(stream=True)
+        sizes = [e[2] for e in self.metrics.events if e[1] == 'request_bytes']
+        self.assertEqual(sizes, [len(json.dumps(ava.request_body, separators=(',', ':')))])
+
+    def test_errors_and_retries(self):
+        self.client.retry = RetryPolicy(backoff=0)
+        self.request.side_effect = [
+            mock.Mock(status_code=503, headers={}, content=b'{}'),
+            self.request.return_value,
+        ]
+        self.client.validate_address('123 some street', 'US')
+        events = [e for e in self.metrics.events if e[1] in ('request', 'retries')]
+        endpoint = {'endpoint': 'address/validate'}
+        self.assertEqual(events, [
+            ('timing', 'request', dict(endpoint, status='503')),
+            ('increment', 'retries', 1, endpoint),
+            ('timing', 'request', dict(endpoint, status='200')),
+        ])
+
+        self.request.side_effect = IOError('down')
+        with self.assertRaises(IOError):
+            self.client.void_document('1')
+        self.assertEqual(self.metrics.events[-1],
+                         ('timing', 'request', {'endpoint': 'tax/cancel', 'status': 'error'}))
+
+
+class StatsdInstrumentationTest(unittest.TestCase):
+
+    def test_tags_in_name(self):
+        statsd = mock.Mock()
+        metrics = StatsdInstrumentation(statsd)
+        metrics.timing('request', 0.25, endpoint='tax/get', status='200')
+        metrics.size('lines', 30)
+        metrics.increment('retries', endpoint='tax/get')
+        statsd.timing.assert_any_call('avalara.request.tax_get.200', 250.0)
+        statsd.timing.assert_any_call('avalara.lines', 30)
+        statsd.incr.assert_called_once_with('avalara.retries.tax_get', 1)
+
+    def test_tagged(self):
+        statsd = mock.Mock()
+        StatsdInstrumentation(statsd, tagged=True).timing(
+            'request', 0.25, endpoint='tax/get', status='200',
+        )
+        statsd.timing.assert_called_once_with(
+            'avalara.request', 250.0, tags=['endpoint:tax/get', 'status:200'],
+        )
+
+
+@unittest.skipIf(prometheus_client is None, 'prometheus_client is not installed')
+class PrometheusInstrumentationTest(unittest.TestCase):
+
+    def test_metrics(self):
+        registry = prometheus_client.CollectorRegistry()
+        metrics = PrometheusInstrumentation(registry)
+        metrics.timing('request', 0.25, endpoint='tax/get', status='200')
+        metrics.size('request_bytes', 2048, endpoint='tax/get')
+        metrics.increment('retries', endpoint='tax/get')
+        labels = {'endpoint': 'tax/get', 'status': '200'}
+        self.assertEqual(registry.get_sample_value('avalara_request_seconds_count', labels), 1)
+        self.assertEqual(registry.get_sample_value(
+            'avalara_request_bytes_sum', {'endpoint': 'tax/get'}), 2048)
+        self.assertEqual(registry.get_sample_value(
+            'avalara_retries_total', {'endpoint': 'tax/get'}), 1)
@@ -0,0 +1,281 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from ..instrumentation import clock
+from ..models import Address, GetTaxRequest, OrderLine, TaxOverride
+from .helpers import RecordingInstrumentation
+
+
+class SlotModelTest(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        line = OrderLine(line_number=1, destination_code=1, item_code='1', amount=5)
+        address = Address(address_code=1, address1='a', city='b', state='c', postal_code='d')
+        override = TaxOverride(tax_amount=1)
+        for model in (line, address, override):
+            self.assertFalse(hasattr(model, '__dict__'))
+
+    def test_initial_values(self):
+        line = OrderLine(line_number=1, destination_code=1, item_code=' 1 ', price=2.5, qty=2)
+        self.assertEqual(line.item_code, '1')
+        self.assertEqual(line.qty, 2)
+        self.assertEqual(line.tax_code, 'P0000000')
+        self.assertIsNone(line.origin_code)
+        self.assertIsNone(line.tax_override)
+
+    def test_unexpected_field(self):
+        with self.assertRaises(TypeError):
+            OrderLine(line_number=1, destination_code=1, item_code='1', colour='red')
+
+    def test_lines_have_no_client(self):
+        ava = GetTaxRequest(doc_code=1)
+        ava.add_line(destination_code=1, item_code='1', amount=5)
+        self.assertFalse(hasattr(ava.olines[0], 'avalara_client'))
+        self.assertEqual(ava.addresses, [])
+        self.assertIsNot(ava.olines, GetTaxRequest(doc_code=2).olines)
+
+
+class AddLinesTest(unittest.TestCase):
+
+    columns = {
+        'item_code': ['12345', '1245', '1258', '99'],
+        'price': [None, 15, None, 1.005],
+        'amount': [350.37, None, 0, None],
+        'qty': [None, 5, 5, 3],
+        'tax_code': [None, '42', '42', None],
+        'description': ['some description', ' padded ', 'and another', None],
+    }
+
+    def build(self, override_lookup=dict()):
+        ava = GetTaxRequest(doc_code=1)
+        origin = ava.add_address(address1='1 a st', city='b', state='c', postal_code='1')
+        destination = ava.add_address(address1='2 a st', city='b', state='c', postal_code='1')
+        return ava, origin, destination
+
+    def test_same_body_as_add_line(self):
+        expected, origin, destination = self.build()
+        for i in range(4):
+            kwargs = {k: v[i] for k, v in self.columns.items()}
+            expected.add_line(origin_code=origin, destination_code=destination, **kwargs)
+        ava, origin, destination = self.build()
+        ava.add_lines(origin_code=origin, destination_code=destination, **self.columns)
+        self.assertEqual(expected.request_body, ava.request_body)
+        self.assertEqual([line.line_number for line in ava.olines], [1, 2, 3, 4])
+
+    def test_overrides(self):
+        expected, origin, destination = self.build()
+        overrides = [{'tax_amount': 1}, {'tax_amount': 0}]
+        for i, override in enumerate(overrides):
+            expected.add_line(override_lookup=override, destination_code=destination,
+                              origin_code=origin, item_code=str(i), amount=10)
+        ava, origin, destination = self.build()
+        ava.add_lines(override_lookup=overrides, destination_code=destination,
+                      origin_code=origin, item_code=['0', '1'], amount=10)
+        self.assertEqual(expected.request_body, ava.request_body)
+
+    def test_column_lengths(self):
+        ava = GetTaxRequest(doc_code=1)
+        with self.assertRaises(ValueError):
+            ava.add_lines(destination_code=1, item_code=['1', '2'], amount=[1])
+
+    def test_required(self):
+        ava = GetTaxRequest(doc_code=1)
+        with self.assertRaises(AttributeError):
+            ava.add_lines(item_code=['1', '2'], amount=[1, 2])
+
+
+class AddressInterningTest(unittest.TestCase):
+
+    address = {
+        'address1': '123 some street name',
+        'city': 'a city',
+        'state': 'CO',
+        'postal_code': '81344',
+    }
+
+    def test_duplicate_returns_existing_code(self):
+        ava = GetTaxRequest(doc_code=1)
+        first = ava.add_address(**self.address)
+        other = ava.add_address(address1='1 other st', city='b', state='CO', postal_code='1')
+        same = ava.add_address(address1=None, address2=' 123 SOME street name',
+                               city='A City', state='co', postal_code='81344', country='US')
+        self.assertEqual((first, other, same), (1, 2, 1))
+        ava.add_line(destination_code=same, origin_code=other, item_code='1', amount=5)
+        body = ava.request_body
+        self.assertEqual([a['AddressCode'] for a in body['Addresses']], [1, 2])
+        self.assertEqual(body['Lines'][0]['DestinationCode'], 1)
+        self.assertEqual(body['Lines'][0]['OriginCode'], 2)
+
+    def test_distinct_tax_region(self):
+        ava = GetTaxRequest(doc_code=1)
+        first = ava.add_address(**self.address)
+        second = ava.add_address(tax_region_id=5, **self.address)
+        self.assertEqual((first, second), (1, 2))
+
+    def test_disabled(self):
+        ava = GetTaxRequest(doc_code=1)
+        ava.intern_addresses = False
+        self.assertEqual(ava.add_address(**self.address), 1)
+        self.assertEqual(ava.add_address(**self.address), 2)
+
+
+class IncrementalSerializationTest(unittest.TestCase):
+
+    def build(self, incremental, items=('A', 'B', 'C', 'D')):
+        ava = GetTaxRequest(doc_code=1)
+        ava.incremental_serialization = incremental
+        origin = ava.add_address(address1='1 a st', city='b', state='c', postal_code='1')
+        destination = ava.add_address(address1='2 a st', city='b', state='c', postal_code='1')
+        for item in items:
+            ava.add_line(origin_code=origin, destination_code=destination,
+                         item_code=item, price=2.5, qty=2)
+        return ava
+
+    def fragments(self, ava):
+        metrics = RecordingInstrumentation()
+        body = ava.build_request_body(metrics)
+        sizes = [e[2] for e in metrics.events if e[:2] == ('size', 'fragments')]
+        return body, sizes[0]
+
+    def test_same_body(self):
+        ava = self.build(True)
+        self.assertEqual(ava.request_body, self.build(False).request_body)
+        ava.compiled_serialization = True
+        self.assertEqual(ava.request_body, self.build(False).request_body)
+
+    def test_only_changes_serialized(self):
+        ava = self.build(True)
+        self.assertEqual(self.fragments(ava)[1], 6)
+        self.assertEqual(self.fragments(ava)[1], 0)
+        ava.update_line(2, qty=3)
+        body, serialized = self.fragments(ava)
+        self.assertEqual(serialized, 1)
+        self.assertEqual(body['Lines'][1]['Amount'], '7.5000')
+        ava.olines[0].description = 'changed'
+        body, serialized = self.fragments(ava)
+        self.assertEqual(serialized, 1)
+        self.assertEqual(body['Lines'][0]['Description'], 'changed')
+
+    def test_attribute_changes_serialized(self):
+        ava = self.build(True)
+        ava.request_body
+        ava.olines[0].qty = 4
+        ava.addresses[1].city = 'elsewhere'
+        body, serialized = self.fragments(ava)
+        self.assertEqual(serialized, 2)
+        self.assertEqual(body['Lines'][0]['Qty'], 4)
+        self.assertEqual(body['Addresses'][1]['City'], 'elsewhere')
+
+    def test_edits_match_full_build(self):
+        ava = self.build(True)
+        expected = self.build(False)
+        for request in (ava, expected):
+            request.request_body
+            request.remove_line(2)
+            request.add_line(origin_code=1, destination_code=2, item_code='E', amount=4)
+            request.olines[2].qty = 7
+            request.update_line(4, description='added')
+            request.olines[3].item_code = 'F'
+            request.addresses[0].city = 'moved'
+            self.assertEqual(request.request_body['Lines'][2]['LineNo'], 3)
+            request.remove_line(1)
+            request.olines[0].description = 'first'
+        body, serialized = self.fragments(ava)
+        self.assertEqual(serialized, 1)
+        self.assertEqual(body, expected.request_body)
+        self.assertEqual(self.fragments(ava)[1], 0)
+
+    def test_removed_line_untracked(self):
+        ava = self.build(True)
+        ava.request_body
+        removed = ava.remove_line(1)
+        old = ava.olines[0]
+        ava.update_line(1, qty=5)
+        removed.qty = 9
+        old.qty = 9
+        self.assertIs(type(removed), OrderLine)
+        self.assertIs(type(old), OrderLine)
+        self.assertEqual(self.fragments(ava)[1], 1)
+        self.assertEqual(ava.request_body['Lines'][0]['Qty'], 5)
+
+    def test_one_edit_costs_less_than_full_build(self):
+        ava = self.build(True, items=['I%d' % i for i in range(2000)])
+        full = self.build(False, items=['I%d' % i for i in range(2000)])
+        for request in (ava, full):
+            request.compiled_serialization = True
+            request.request_body
+
+        def best(request):
+            timings = []
+            for qty in (3, 4, 5):
+                request.update_line(1000, qty=qty)
+                start = clock()
+                request.request_body
+                timings.append(clock() - start)
+            return min(timings)
+        self.assertLess(best(ava), best(full) / 4)
+
+    def test_override_changes_serialized(self):
+        ava = self.build(True, items=('A',))
+        ava.update_line(1, override_lookup={'tax_amount': 1})
+        ava.request_body
+        ava.olines[0].tax_override.tax_amount = 2
+        body, serialized = self.fragments(ava)
+        self.assertEqual(serialized, 1)
+        self.assertEqual(body['Lines'][0]['TaxOverride']['TaxAmount'], '2.0000')
+
+    def test_remove_renumbers(self):
+        ava = self.build(True)
+        ava.request_body
+        removed = ava.remove_line(2)
+        self.assertEqual(removed.item_code, 'B')
+        body, serialized = self.fragments(ava)
+        self.assertEqual(serialized, 0)
+        self.assertEqual(body, self.build(False, items=('A', 'C', 'D')).request_body)
+        ava.add_line(origin_code=1, destination_code=2, item_code='E', price=2.5, qty=2)
+        self.assertEqual([line.line_number for line in ava.olines], [1, 2, 3, 4])
+        self.assertEqual(self.fragments(ava)[1], 1)
+
+    def test_update_line(self):
+        ava = self.build(True)
+        line = ava.olines[0]
+        ava.update_line(1, amount=3, description=' new ')
+        self.assertEqual(line.description, None)
+        self.assertEqual(ava.olines[0].amount, 3)
+        self.assertEqual(ava.olines[0].description, 'new')
+        ava.update_line(1, amount=0)
+        self.assertEqual(ava.request_body['Lines'][0]['TaxCode'], 'ON030000')
+        with self.assertRaises(AttributeError):
+            ava.update_line(1, item_code='')
+        self.assertEqual(ava.olines[0].item_code, 'A')
+        with self.assertRaises(IndexError):
+            ava.update_line(5, qty=1)
+        with self.assertRaises(TypeError):
+            ava.update_line(1, line_number=3)
+
+    def test_update_line_same_as_added(self):
+        ava = self.build(True, items=('A', 'B'))
+        ava.update_line(1, tax_code='42')
+        ava.update_line(1, price=0)
+        self.assertEqual(ava.request_body['Lines'][0]['TaxCode'], 'ON030000')
+        ava.update_line(1, price=3, qty=1)
+        ava.update_line(2, amount=0)
+        ava.update_line(2, amount=4, tax_code='')
+        expected = GetTaxRequest(doc_code=1)
+        origin = expected.add_address(address1='1 a st', city='b', state='c', postal_code='1')
+        destination = expected.add_address(address1='2 a st', city='b', state='c', postal_code='1')
+        expected.add_line(origin_code=origin, destination_code=destination, item_code='A',
+                          price=3, qty=1, tax_code='42')
+        expected.add_line(origin_code=origin, destination_code=destination, item_code='B',
+                          price=2.5, qty=2, amount=4)
+        self.assertEqual(ava.request_body, expected.request_body)
+        self.assertEqual(ava.request_body['Lines'][0]['TaxCode'], '42')
+
+    def test_override_reserializes_lines(self):
+        ava = self.build(True, items=('A',))
+        ava.request_body
+        ava.update_line(1, override_lookup={'tax_amount': 1})
+        body, serialized = self.fragments(ava)
+        self.assertEqual(serialized, 1)
+        self.assertEqual(body['Lines'][0]['TaxOverride']['TaxAmount'], '1.0000')
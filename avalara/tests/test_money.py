@@ -0,0 +1,95 @@
+from __future__ import unicode_literals
+
+from decimal import Decimal, ROUND_HALF_UP
+import unittest
+
+from ..models import OrderLine
+from ..money import Money
+from ..serializers import get_decimal_value
+
+
+class MoneyTest(unittest.TestCase):
+
+    def test_conversions(self):
+        self.assertEqual(Money('15.25').units, 152500)
+        self.assertEqual(Money(15).units, 150000)
+        self.assertEqual(Money(Decimal('15.25')).units, 152500)
+        self.assertEqual(Money(15.25).units, 152500)
+        self.assertEqual(Money('-.5').units, -5000)
+        self.assertEqual(Money('1e2').units, 1000000)
+        self.assertEqual(Money(Money('3.1')).units, 31000)
+
+    def test_floats_convert_by_repr(self):
+        # Decimal(1.005) is 1.00499999999999989...
+        self.assertEqual(str(Money(1.005).round_cents()), '1.0100')
+        self.assertEqual(str(Money(0.1) + Money(0.2)), '0.3000')
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, Money, None)
+        self.assertRaises(ValueError, Money, 'nan')
+        self.assertRaises(ValueError, Money, Decimal('Infinity'))
+
+    def test_round_half_up(self):
+        self.assertEqual(str(Money('2.00005')), '2.0001')
+        self.assertEqual(str(Money('2.00004')), '2.0000')
+        self.assertEqual(str(Money('2.345').round_cents()), '2.3500')
+        self.assertEqual(str(Money('2.344').round_cents()), '2.3400')
+        self.assertEqual(str(Money('-2.345').round_cents()), '-2.3500')
+
+    def test_format_matches_decimal(self):
+        quantum = Decimal('.0001')
+        for text in ('0', '0.1', '-0.00005', '12.34567', '-9.99', '1000000.5', '0.00004'):
+            expected = str(Decimal(text).quantize(quantum, rounding=ROUND_HALF_UP))
+            if expected == '-0.0000':
+                expected = '0.0000'
+            self.assertEqual(str(Money(text)), expected)
+
+    def test_arithmetic(self):
+        self.assertEqual(Money('9.99') * 3, Money('29.97'))
+        self.assertEqual(3 * Money('9.99'), Decimal('29.97'))
+        self.assertEqual(Money('1.5') + 1, Money('2.5'))
+        self.assertEqual(Decimal('1') - Money('1.5'), Money('-0.5'))
+        self.assertEqual(-Money('1.5'), -1.5)
+        self.assertTrue(Money('0.0001'))
+        self.assertFalse(Money('0'))
+        self.assertTrue(Money('1') < 2)
+        self.assertEqual(hash(Money(2)), hash(2))
+        self.assertRaises(TypeError, lambda: Money('1') * 1.5)
+
+    def test_exact_comparisons(self):
+        self.assertNotEqual(Money('1'), Decimal('1.00001'))
+        self.assertNotEqual(Money(1.5), 1.50001)
+        self.assertLess(Money('1'), Decimal('1.00001'))
+        self.assertEqual(Money('1'), Decimal('1.0000'))
+        self.assertEqual(len({Money('1'), Decimal('1.00001'), 1}), 2)
+        for value in (Decimal('2.5'), 2.5, 2, Decimal('-0.0001')):
+            self.assertEqual(Money(value), value)
+            self.assertEqual(hash(Money(value)), hash(value))
+
+    def test_float_comparisons(self):
+        self.assertEqual(Money(0.1), 0.1)
+        self.assertNotEqual(Money(0.1), 0.10001)
+        self.assertLess(Money('0.1'), 0.10001)
+        line = OrderLine(line_number=1, destination_code=1, item_code='1', amount=350.37)
+        self.assertEqual(line.amount, 350.37)
+        self.assertEqual(350.37, line.amount)
+
+    def test_decimal_quantities(self):
+        self.assertEqual(Money('1.5') * Decimal('2'), Money('3'))
+        self.assertEqual(Decimal('2.000') * Money('1.5'), Money('3'))
+        self.assertRaises(ValueError, lambda: Money('1') * Decimal('1.5'))
+        self.assertRaises(ValueError, lambda: Money('1') * Decimal('NaN'))
+
+    def test_serialized(self):
+        self.assertEqual(get_decimal_value(350.37), '350.3700')
+        self.assertEqual(get_decimal_value(Decimal('1.23456')), '1.2346')
+        self.assertIsNone(get_decimal_value(0))
+
+    def test_line_amount(self):
+        line = OrderLine(line_number=1, destination_code=1, item_code='1', qty=3, price=1.005)
+        self.assertEqual(line.amount, Money('3.03'))
+        line = OrderLine(line_number=1, destination_code=1, item_code='1', amount='12.5')
+        self.assertEqual(line.amount, Money('12.5'))
+        line = OrderLine(line_number=1, destination_code=1, item_code='1', price='1.50',
+                         qty=Decimal('2'))
+        self.assertEqual(str(line.amount), '3.0000')
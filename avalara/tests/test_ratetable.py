@@ -0,0 +1,137 @@
+from __future__ import unicode_literals
+
+from decimal import Decimal
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..client import Avalara
+from ..exceptions import CircuitOpenError
+from ..ratetable import RateTable, RateTableBuilder
+from ..resilience import CircuitBreaker
+from .helpers import build_request
+
+RATES_CSV = '''State,ZipCode,TaxRegionName,EstimatedCombinedRate,StateRate
+WA,98101,WA SEATTLE,0.102500,0.065000
+WA,98004,WA BELLEVUE,0.101000,0.065000
+WA,98999,WA UNKNOWN,,0.065000
+'''
+
+
+class RateTableFile(object):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rates.avrt')
+        builder = RateTableBuilder()
+        builder.load_csv(io.StringIO(RATES_CSV))
+        builder.add_postal_code('V6B 1A1', '0.12', country='CA')
+        builder.add_tax_region(2109716, '0.09')
+        builder.write(self.path)
+        self.table = RateTable(self.path)
+
+    def tearDown(self):
+        self.table.close()
+        shutil.rmtree(self.directory)
+
+
+class RateTableTest(RateTableFile, unittest.TestCase):
+
+    def test_lookup(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.rate('98101'), Decimal('0.1025'))
+        self.assertEqual(self.table.rate('98004-1234'), Decimal('0.101'))
+        self.assertEqual(self.table.rate('v6b1a1', country='CA'), Decimal('0.12'))
+        self.assertEqual(self.table.rate('98101', tax_region_id='2109716.0000'), Decimal('0.09'))
+        self.assertIsNone(self.table.rate('98999'))
+        self.assertIsNone(self.table.rate('00000'))
+
+    def test_unencodable_keys(self):
+        self.assertIsNone(self.table.rate('9' * 40, country='GB'))
+        self.assertIsNone(self.table.rate('\u00e9101', country='FR'))
+        result = build_request(postal_code='\u00e9' * 3).estimate(self.table)
+        self.assertEqual(result['ResultCode'], 'Error')
+
+    def test_failed_write_keeps_table(self):
+        builder = RateTableBuilder()
+        builder.add_postal_code('98101', '0.2')
+        builder.rates['x' * 40] = 1
+        with self.assertRaises(ValueError):
+            builder.write(self.path)
+        self.assertEqual(os.listdir(self.directory), ['rates.avrt'])
+        with RateTable(self.path) as table:
+            self.assertEqual(table.rate('98101'), Decimal('0.1025'))
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a rate table')
+        with self.assertRaises(ValueError):
+            RateTable(self.path)
+
+    def test_estimate(self):
+        result = build_request().estimate(self.table)
+        self.assertEqual(result['ResultCode'], 'Warning')
+        self.assertEqual(result['TotalTax'], '2.05')
+        self.assertEqual(result['TotalAmount'], '24.9900')
+        self.assertEqual([line['Tax'] for line in result['TaxLines']], ['2.05', '0'])
+
+    def test_estimate_exempt_and_unknown(self):
+        result = build_request(customer_usage_type='E').estimate(self.table)
+        self.assertEqual(result['TotalTax'], '0')
+        result = build_request(postal_code='00000').estimate(self.table)
+        self.assertEqual(result['ResultCode'], 'Error')
+
+    def test_harvest(self):
+        body = build_request(postal_code='10001').request_body
+        response = {
+            'ResultCode': 'Success',
+            'TaxAddresses': [{'AddressCode': '2', 'TaxRegionId': 3456}],
+            'TaxLines': [
+                {'LineNo': '1', 'Rate': 0.08875, 'Taxable': '19.99'},
+                {'LineNo': '2', 'Rate': 0, 'Taxable': '0'},
+            ],
+        }
+        builder = RateTableBuilder()
+        builder.harvest(body, response)
+        builder.write(self.path)
+        with RateTable(self.path) as table:
+            self.assertEqual(table.rate('10001'), Decimal('0.08875'))
+            self.assertEqual(table.rate(tax_region_id=3456), Decimal('0.08875'))
+
+
+class RateTableFallbackTest(RateTableFile, unittest.TestCase):
+
+    def setUp(self):
+        super(RateTableFallbackTest, self).setUp()
+        self.breaker = CircuitBreaker(minimum_calls=1)
+        self.breaker.record(False)
+        self.client = Avalara('1234', 'abcd', circuit_breaker=self.breaker,
+                              rate_table=self.table)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_open_circuit_estimates_quotes(self):
+        result = build_request(avalara_client=self.client).save()
+        self.assertEqual(result['TotalTax'], '2.05')
+        self.assertFalse(self.request.called)
+
+    def test_open_circuit_raises_for_commits_and_unknown_rates(self):
+        with self.assertRaises(CircuitOpenError):
+            build_request(avalara_client=self.client).save(commit=True)
+        with self.assertRaises(CircuitOpenError):
+            build_request(postal_code='00000', avalara_client=self.client).save()
+
+    def test_closed_circuit_calls_avalara(self):
+        self.breaker._close()
+        self.request.return_value.content = json.dumps({'ResultCode': 'Success'}).encode('utf-8')
+        self.request.return_value.status_code = 200
+        self.assertEqual(build_request(avalara_client=self.client).save(),
+                         {'ResultCode': 'Success'})
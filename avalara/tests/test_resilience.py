@@ -0,0 +1,183 @@
+from __future__ import unicode_literals
+
+import json
+import threading
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import requests
+
+from ..client import Avalara
+from ..exceptions import CircuitOpenError
+from ..fakeserver import FakeAvalara, FakeAvalaraServer, fixed
+from ..resilience import CircuitBreaker, HedgePolicy, RetryPolicy
+from .helpers import FakeClock
+
+
+def response(status_code=200, body=None, headers=None):
+    return mock.Mock(
+        status_code=status_code, headers=headers or {},
+        content=json.dumps(body or {'ResultCode': 'Success'}).encode('utf-8'),
+    )
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff=0.1, max_backoff=1, random=lambda: 1)
+        self.assertEqual([policy.delay(n) for n in range(5)], [0.1, 0.2, 0.4, 0.8, 1])
+        self.assertEqual(policy.delay(0, retry_after='0.5'), 0.5)
+        self.assertEqual(policy.delay(0, retry_after='1'), 1)
+        self.assertIsNone(policy.delay(0, retry_after='120'))
+        self.assertEqual(policy.delay(0, retry_after='Wed, 21 Oct 2015 07:28:00 GMT'), 0.1)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_ratio=0.5, minimum_calls=4, window=10,
+                                      reset_timeout=5, clock=self.clock)
+
+    def test_opens_on_failure_ratio(self):
+        for success in (True, False, True):
+            self.breaker.record(success)
+        self.assertFalse(self.breaker.is_open)
+        self.breaker.record(False)
+        self.assertTrue(self.breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_old_calls_expire(self):
+        for _ in range(3):
+            self.breaker.record(False)
+        self.clock.now += 11
+        self.breaker.record(False)
+        self.assertFalse(self.breaker.is_open)
+
+    def test_half_open_trial(self):
+        for _ in range(4):
+            self.breaker.record(False)
+        self.clock.now += 5
+        self.breaker.before_call()
+        # only one trial call at a time
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record(True)
+        self.assertFalse(self.breaker.is_open)
+        self.breaker.before_call()
+
+
+class ClientResilienceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Avalara('1234', 'abcd', retry=RetryPolicy(backoff=0),
+                              timeouts={'tax/get': 2})
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_retry_connection_error(self):
+        self.request.side_effect = [requests.ConnectionError(), response()]
+        self.assertEqual(self.client.get_tax({'DocCode': '5'}), {'ResultCode': 'Success'})
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(self.request.call_args[1]['timeout'], 2)
+
+    def test_retry_status(self):
+        self.request.side_effect = [response(503), response(429), response()]
+        self.client.validate_address('1 a st', 'US')
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_long_retry_after_not_retried(self):
+        self.request.side_effect = [
+            response(503, {'ResultCode': 'Error'}, headers={'Retry-After': '60'}), response(),
+        ]
+        self.assertEqual(self.client.validate_address('1 a st', 'US'), {'ResultCode': 'Error'})
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_gives_up(self):
+        self.request.side_effect = requests.Timeout()
+        with self.assertRaises(requests.Timeout):
+            self.client.validate_address('1 a st', 'US')
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_commit_not_retried(self):
+        self.request.side_effect = [requests.ConnectionError(), response()]
+        with self.assertRaises(requests.ConnectionError):
+            self.client.get_tax({'DocCode': '5', 'Commit': True})
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_circuit_open(self):
+        self.client.circuit_breaker = CircuitBreaker(minimum_calls=2)
+        self.request.return_value = response(503)
+        self.client.void_document('5')
+        self.client.void_document('5')
+        with self.assertRaises(CircuitOpenError):
+            self.client.void_document('5')
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_failed_trial_reopens(self):
+        clock = FakeClock()
+        breaker = self.client.circuit_breaker = CircuitBreaker(
+            minimum_calls=1, reset_timeout=5, clock=clock,
+        )
+        breaker.record(False)
+        clock.now += 5
+        self.request.side_effect = requests.exceptions.ChunkedEncodingError()
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            self.client.void_document('5')
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        clock.now += 5
+        self.request.side_effect = None
+        self.request.return_value = response()
+        self.client.void_document('5')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class HedgeTest(unittest.TestCase):
+
+    def test_second_copy_wins(self):
+        client = Avalara('1234', 'abcd', hedge=HedgePolicy(delay=0.02))
+        calls = []
+        lock = threading.Lock()
+
+        def request(*args, **kwargs):
+            with lock:
+                calls.append(time.time())
+                first = len(calls) == 1
+            time.sleep(0.3 if first else 0)
+            return response(body={'Copy': 'first' if first else 'second'})
+
+        with mock.patch.object(client.session, 'request', side_effect=request):
+            start = time.time()
+            result = client.validate_address('1 a st', 'US')
+            elapsed = time.time() - start
+        self.assertEqual(result, {'Copy': 'second'})
+        self.assertLess(elapsed, 0.25)
+        client.close()
+
+    def test_no_hedges_when_saturated(self):
+        fake = FakeAvalara(latency=fixed(0.1))
+        server = FakeAvalaraServer(fake).start()
+        client = Avalara('1234', 'abcd', base_url=server.base_url, pool_maxsize=2,
+                         hedge=HedgePolicy(delay=0.15))
+        threads = [threading.Thread(target=client.validate_address, args=('1 a st', 'US'))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.close()
+        server.stop()
+        self.assertEqual(fake.stats()['requests.address/validate'], 8)
+
+    def test_no_hedge_without_samples(self):
+        policy = HedgePolicy(percentile=50, min_samples=3)
+        self.assertIsNone(policy.delay('tax/get'))
+        for seconds in (0.1, 0.3, 0.2):
+            policy.record('tax/get', seconds)
+        self.assertEqual(policy.delay('tax/get'), 0.2)
@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+
+from decimal import Decimal
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..client import Avalara
+from ..responses import CancelTaxResult, GetTaxResult, ValidateAddressResult
+
+
+GET_TAX_RESPONSE = {
+    'DocCode': '5',
+    'DocDate': '2016-05-05',
+    'ResultCode': 'Success',
+    'TotalAmount': '425.37',
+    'TotalDiscount': '0',
+    'TotalTax': 30.62,
+    'TotalTaxable': '350.37',
+    'TaxLines': [{
+        'LineNo': '1',
+        'Rate': 0.0875,
+        'Tax': '30.62',
+        'Taxable': '350.37',
+        'TaxDetails': [
+            {'JurisName': 'COLORADO', 'JurisType': 'State', 'Rate': 0.029, 'Tax': '10.16'},
+            {'JurisName': 'DENVER', 'JurisType': 'City', 'Rate': 0.0585, 'Tax': '20.46'},
+        ],
+    }, {
+        'LineNo': '2',
+        'Rate': 0,
+        'Tax': '0',
+    }],
+    'TaxSummary': [{'JurisName': 'COLORADO', 'Tax': '10.16'}],
+}
+
+
+class GetTaxResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.result = GetTaxResult(GET_TAX_RESPONSE)
+
+    def test_totals(self):
+        self.assertEqual(self.result.total_tax, Decimal('30.62'))
+        self.assertEqual(self.result.total_amount, Decimal('425.37'))
+        self.assertIsNone(self.result.total_exemption)
+        self.assertTrue(self.result.ok)
+
+    def test_lazy_lines(self):
+        self.assertIsNone(self.result._lines)
+        lines = self.result.lines
+        self.assertIs(lines, self.result.lines)
+        self.assertEqual(lines[0].rate, Decimal('0.0875'))
+        self.assertEqual([d.tax for d in lines[0].details], [Decimal('10.16'), Decimal('20.46')])
+        self.assertEqual(self.result.line(2).tax, Decimal(0))
+        self.assertEqual(self.result.summary[0].juris_name, 'COLORADO')
+        self.assertFalse(hasattr(self.result, '__dict__'))
+
+    def test_mapping(self):
+        self.assertEqual(self.result['DocCode'], '5')
+        self.assertEqual(self.result.get('Missing'), None)
+        self.assertEqual(dict(self.result), GET_TAX_RESPONSE)
+
+
+class TypedClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.decoded = []
+
+        def decoder(content):
+            self.decoded.append(content)
+            return json.loads(content.decode('utf-8'))
+
+        self.client = Avalara('1234', 'abcd', json_decoder=decoder, typed_responses=True)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def respond(self, body):
+        self.request.return_value.content = json.dumps(body).encode('utf-8')
+
+    def test_get_tax(self):
+        self.respond(GET_TAX_RESPONSE)
+        result = self.client.get_tax({'DocCode': '5'})
+        self.assertIsInstance(result, GetTaxResult)
+        self.assertEqual(result.total_tax, Decimal('30.62'))
+        self.assertEqual(len(self.decoded), 1)
+
+    def test_validate_address(self):
+        self.respond({'Address': {'Line1': '1 A ST', 'PostalCode': '80202'}, 'ResultCode': 'Success'})
+        result = self.client.validate_address('1 a st', 'US')
+        self.assertIsInstance(result, ValidateAddressResult)
+        self.assertEqual(result.address.line1, '1 A ST')
+
+    def test_void_document(self):
+        self.respond({'CancelTaxResult': {'DocId': '42', 'ResultCode': 'Success'}})
+        result = self.client.void_document('5')
+        self.assertIsInstance(result, CancelTaxResult)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.doc_id, '42')
@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from ..client import Avalara
+from ..fakeserver import FakeAvalara, FakeAvalaraServer, fixed
+from ..instrumentation import clock
+from ..sharding import merge_results, split_document
+from .helpers import build_long_request
+
+
+class SplitTest(unittest.TestCase):
+
+    def test_shards(self):
+        body = build_long_request().request_body
+        shards = split_document(body, 3)
+        self.assertEqual([len(s['Lines']) for s in shards], [3, 2, 2])
+        self.assertEqual([[l['LineNo'] for l in s['Lines']] for s in shards],
+                         [[1, 2, 3], [4, 5], [6, 7]])
+        self.assertEqual([[a['AddressCode'] for a in s['Addresses']] for s in shards],
+                         [[1, 2], [1, 3], [1, 3]])
+        for shard in shards:
+            self.assertEqual(shard['DocCode'], body['DocCode'])
+            self.assertEqual(shard['CustomerCode'], body['CustomerCode'])
+
+    def test_not_split(self):
+        body = build_long_request().request_body
+        self.assertEqual(split_document(body, 7), [body])
+        body['Discount'] = '1.0000'
+        self.assertEqual(split_document(body, 3), [body])
+        with self.assertRaises(ValueError):
+            split_document(body, 0)
+
+
+class MergeTest(unittest.TestCase):
+
+    def result(self, lines, tax, code='Success', summary_tax='1.00'):
+        return {
+            'DocCode': 'shard',
+            'ResultCode': code,
+            'TotalAmount': '10.00',
+            'TotalTax': tax,
+            'TaxLines': [{'LineNo': n} for n in lines],
+            'TaxAddresses': [{'AddressCode': '1'}, {'AddressCode': str(lines[0])}],
+            'TaxSummary': [{'JurisName': 'WA', 'Rate': 0.065, 'Tax': summary_tax}],
+        }
+
+    def test_merge(self):
+        merged = merge_results({'DocCode': '7'}, [
+            self.result([1, 2], '1.05'),
+            dict(self.result([3], 0.5, code='Warning'), Messages=[{'Summary': 'x'}]),
+        ])
+        self.assertEqual(merged['DocCode'], '7')
+        self.assertEqual(merged['ResultCode'], 'Warning')
+        self.assertEqual(merged['TotalAmount'], '20.00')
+        self.assertEqual(merged['TotalTax'], '1.55')
+        self.assertEqual([l['LineNo'] for l in merged['TaxLines']], [1, 2, 3])
+        self.assertEqual([a['AddressCode'] for a in merged['TaxAddresses']], ['1', '3'])
+        self.assertEqual(merged['TaxSummary'], [{'JurisName': 'WA', 'Rate': 0.065, 'Tax': '2.00'}])
+        self.assertEqual(merged['Messages'], [{'Summary': 'x'}])
+
+    def test_failed_shard(self):
+        error = {'ResultCode': 'Error', 'Messages': [{'Summary': 'bad'}]}
+        self.assertIs(merge_results({}, [self.result([1], '1'), error]), error)
+
+
+class ShardedSaveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeAvalara(rates={'98101': '0.1025'}, seed=1)
+        self.server = FakeAvalaraServer(self.fake).start()
+        self.client = Avalara('1234', 'abcd', base_url=self.server.base_url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_same_result_as_whole(self):
+        whole = build_long_request(avalara_client=self.client).save()
+        ava = build_long_request(avalara_client=self.client)
+        ava.shard_lines = 3
+        sharded = ava.save()
+        self.assertEqual(self.fake.stats()['requests.tax/get'], 4)
+        for name in ('ResultCode', 'DocCode', 'TotalAmount', 'TotalTaxable', 'TotalTax',
+                     'TaxLines'):
+            self.assertEqual(sharded[name], whole[name])
+
+    def test_shards_in_parallel(self):
+        self.fake.latency = fixed(0.1)
+        ava = build_long_request(lines=40, avalara_client=self.client)
+        ava.shard_lines = 10
+        start = clock()
+        ava.save()
+        self.assertLess(clock() - start, 0.3)
+        self.assertEqual(self.fake.stats()['requests.tax/get'], 4)
+
+    def test_committed_not_sharded(self):
+        ava = build_long_request(avalara_client=self.client)
+        ava.shard_lines = 3
+        self.assertEqual(ava.save(commit=True)['ResultCode'], 'Success')
+        self.assertEqual(self.fake.stats()['requests.tax/get'], 1)
+        with self.assertRaises(ValueError):
+            self.client.get_tax_sharded(ava.request_body, 3)
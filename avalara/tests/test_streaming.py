@@ -0,0 +1,53 @@
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..client import Avalara
+from ..models import GetTaxRequest
+from ..streaming import iter_request_body
+from .helpers import build_lookup_request
+from .test_request_body import AVA_LOOKUP, OVERRIDE_LOOKUP_1
+
+
+class IterRequestBodyTest(unittest.TestCase):
+
+    def assertSameBytes(self, ava, **kwargs):
+        expected = json.dumps(ava.request_body, allow_nan=False,
+                              separators=(',', ':')).encode('utf-8')
+        self.assertEqual(b''.join(iter_request_body(ava, **kwargs)), expected)
+
+    def test_no_lines(self):
+        self.assertSameBytes(GetTaxRequest(**AVA_LOOKUP))
+
+    def test_lines_in_chunks(self):
+        ava = build_lookup_request(lines=500)
+        chunks = list(iter_request_body(ava, chunk_size=1024))
+        self.assertGreater(len(chunks), 10)
+        self.assertLess(max(len(c) for c in chunks), 2048)
+        self.assertSameBytes(ava, chunk_size=1024)
+
+    def test_overrides(self):
+        self.assertSameBytes(build_lookup_request(OVERRIDE_LOOKUP_1, lines=20))
+
+    def test_compiled(self):
+        ava = build_lookup_request(OVERRIDE_LOOKUP_1, lines=20)
+        ava.compiled_serialization = True
+        self.assertSameBytes(ava)
+
+    def test_save_stream(self):
+        client = Avalara('1234', 'abcd')
+        ava = build_lookup_request(lines=50)
+        ava.avalara_client = client
+        with mock.patch.object(client.session, 'request') as request:
+            request.return_value.content = b'{}'
+            ava.save(stream=True)
+            kwargs = request.call_args[1]
+            self.assertIsNone(kwargs.get('json'))
+            self.assertEqual(json.loads(b''.join(kwargs['data']).decode('utf-8')),
+                             ava.request_body)
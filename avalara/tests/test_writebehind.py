@@ -0,0 +1,139 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from ..client import Avalara
+from ..models import GetTaxRequest
+from ..resilience import RetryPolicy
+from ..writebehind import CANCELLED, FAILED, PENDING, SENT, Journal, WriteBehindQueue
+from .helpers import FakeClock
+
+
+class FakeDeliveryClient(object):
+    is_async = False
+
+    def __init__(self):
+        self.sent = []
+        self.errors = []
+
+    def _get_tax(self, request_body):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(request_body)
+        if request_body['DocCode'] == 'bad':
+            return {'ResultCode': 'Error', 'Messages': [{'Summary': 'bad document'}]}
+        return {'DocCode': request_body['DocCode'], 'ResultCode': 'Success'}
+
+
+class WriteBehindQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal.db')
+        self.clock = FakeClock()
+        self.delivery = FakeDeliveryClient()
+        self.queue = WriteBehindQueue(
+            self.delivery, Journal(self.path, clock=self.clock), max_attempts=2,
+            retry=RetryPolicy(backoff=10, random=lambda: 1),
+        )
+        self.client = Avalara('1234', 'abcd', write_behind=self.queue)
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def tearDown(self):
+        self.queue.stop()
+        self.queue.journal.close()
+        shutil.rmtree(self.directory)
+
+    def save(self, doc_code, commit=True):
+        ava = GetTaxRequest(doc_code=doc_code, avalara_client=self.client)
+        return ava.save(commit=commit)
+
+    def test_commit_is_queued_and_flushed(self):
+        self.assertEqual(self.save('1'), {'DocCode': '1', 'ResultCode': 'Queued'})
+        self.assertEqual(self.queue.status('1')['status'], PENDING)
+        self.assertFalse(self.request.called)
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(self.delivery.sent[0]['DocType'], 'SalesInvoice')
+        status = self.queue.status('1')
+        self.assertEqual(status['status'], SENT)
+        self.assertEqual(status['result'], {'DocCode': '1', 'ResultCode': 'Success'})
+        # committing again returns the delivered result
+        self.assertEqual(self.save('1'), status['result'])
+        self.assertEqual(self.queue.flush(), 0)
+
+    def test_streamed_commit_is_queued(self):
+        ava = GetTaxRequest(doc_code='1', avalara_client=self.client)
+        self.assertEqual(ava.save(commit=True, stream=True),
+                         {'DocCode': '1', 'ResultCode': 'Queued'})
+        self.assertFalse(self.request.called)
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(self.delivery.sent[0]['DocCode'], '1')
+
+    def test_quote_is_not_queued(self):
+        self.request.return_value.content = b'{"ResultCode": "Success"}'
+        self.assertEqual(self.save('1', commit=False), {'ResultCode': 'Success'})
+        self.assertIsNone(self.queue.status('1'))
+
+    def test_exceptions_are_retried(self):
+        self.delivery.errors = [IOError('down'), IOError('down')]
+        self.save('1')
+        self.queue.flush()
+        status = self.queue.status('1')
+        self.assertEqual((status['status'], status['attempts']), (PENDING, 1))
+        # not due before the backoff
+        self.assertEqual(self.queue.flush(), 0)
+        self.clock.now += 10
+        self.queue.flush()
+        self.assertEqual(self.queue.status('1')['status'], FAILED)
+
+    def test_rejected_documents_fail(self):
+        self.save('bad')
+        self.queue.flush()
+        self.assertEqual(self.queue.status('bad')['status'], FAILED)
+        self.assertEqual(len(self.delivery.sent), 1)
+
+    def test_void_cancels_queued_document(self):
+        self.save('1')
+        result = self.client.void_document('1')
+        self.assertEqual(result['CancelTaxResult']['ResultCode'], 'Success')
+        self.assertFalse(self.request.called)
+        self.assertEqual(self.queue.status('1')['status'], CANCELLED)
+        self.assertEqual(self.queue.flush(), 0)
+
+    def test_void_sent_document_calls_avalara(self):
+        self.request.return_value.content = b'{"CancelTaxResult": {"ResultCode": "Success"}}'
+        self.save('1')
+        self.queue.flush()
+        self.client.void_document('1')
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_journal_is_durable(self):
+        self.save('1')
+        self.save('2')
+        self.queue.journal.claim(1)
+        journal = Journal(self.path, clock=self.clock)
+        self.assertEqual(journal.counts(), {PENDING: 1, 'sending': 1})
+        journal.recover()
+        self.assertEqual(journal.counts(), {PENDING: 2})
+        journal.close()
+
+    def test_background_flusher(self):
+        self.queue.flush_interval = 0.01
+        self.queue.start()
+        for i in range(1, 21):
+            self.save(str(i))
+        deadline = time.time() + 5
+        while len(self.delivery.sent) < 20 and time.time() < deadline:
+            time.sleep(0.01)
+        self.queue.stop()
+        self.assertEqual(self.queue.journal.counts(), {SENT: 20})
@@ -0,0 +1,117 @@
+from __future__ import division, unicode_literals
+
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+import hashlib
+import json
+import os
+import tempfile
+
+import six
+
+
+def decimal_value(value):
+    """value as a Decimal, floats convert by their shortest repr"""
+    return value if isinstance(value, Decimal) else Decimal(six.text_type(value))
+
+
+CENTS = Decimal('.01')
+
+
+def round_cents(value):
+    """a Decimal rounded half up to whole cents, the way tax is rounded"""
+    return value.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def strip_if_text(value):
+    if isinstance(value, six.string_types):
+        value = value.strip()
+    return value
+
+
+def remove_nulls_from_dict(d):
+    """
+    remove_nulls_from_dict function recursively remove empty or null values
+    from dictionary and embedded lists of dictionaries
+    """
+    if isinstance(d, dict):
+        return {k: remove_nulls_from_dict(v) for k, v in six.iteritems(d) if v}
+    if isinstance(d, list):
+        return [remove_nulls_from_dict(entry) for entry in d if entry]
+    else:
+        return d
+
+
+def fix_address_lines(address1, address2, address3):
+    """shuffle address lines if we are missing line 1 but not 2 or 3"""
+    # no address 1 but entry on 2 and possibly 3 but I don't care
+    if not address1 and address2:
+        address1, address2, address3 = address2, address3, None
+    # no address 1 or 2 but entry on 3
+    if address3 and not address1 and not address2:
+        address1, address3 = address3, None
+    return address1, address2, address3
+
+
+def _fold(value):
+    value = strip_if_text(value)
+    if not value:
+        return ''
+    value = six.text_type(value)
+    # str.casefold is python 3 only
+    return value.casefold() if hasattr(value, 'casefold') else value.lower()
+
+
+def normalize_address(address1=None, address2=None, address3=None, city=None,
+                      region=None, postal_code=None, country=None):
+    """
+    return a tuple identifying an address regardless of case, surrounding
+    whitespace or which of the lines the street was put on
+    """
+    lines = fix_address_lines(
+        strip_if_text(address1), strip_if_text(address2), strip_if_text(address3),
+    )
+    return tuple(_fold(v) for v in lines + (city, region, postal_code, country))
+
+
+def address_cache_key(*args, **kwargs):
+    """normalize_address joined into a string usable as a cache key"""
+    return '\x1f'.join(normalize_address(*args, **kwargs))
+
+
+def canonical_digest(value):
+    """
+    sha1 hex digest of the JSON of value with sorted keys, equal for
+    values that only differ in key order
+    """
+    text = json.dumps(value, sort_keys=True, separators=(',', ':'), default=six.text_type)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def percentile(values, p):
+    """the nearest rank p percentile of values, None when there are none"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(round(p / 100 * (len(values) - 1)))]
+
+
+# os.rename does not replace an existing file on windows
+_replace = getattr(os, 'replace', os.rename)
+
+
+@contextmanager
+def atomic_write(path, mode='wb'):
+    """
+    a file to write in place of path.  It replaces path atomically when
+    the block ends and is removed instead if the block raises
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        _replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
@@ -0,0 +1,308 @@
+"""
+Write-behind delivery of committed tax documents.
+
+Committed GetTaxRequest bodies are written to a local SQLite journal and
+acknowledged right away, a background flusher posts them to Avalara later.
+Enable it by attaching a queue to the client the requests save with:
+
+    client = Avalara()
+    client.write_behind = WriteBehindQueue(client, '/var/lib/app/avalara.db')
+    client.write_behind.start()
+
+    request.save(commit=True)   # {'DocCode': ..., 'ResultCode': 'Queued'}
+"""
+from __future__ import unicode_literals
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .resilience import RetryPolicy
+
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+QUEUED_RESULT_CODE = 'Queued'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    doc_code TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+'''
+
+_COLUMNS = ('doc_code', 'status', 'attempts', 'last_error', 'result', 'created', 'updated')
+
+
+class Journal(object):
+    """
+    SQLite journal of committed documents keyed by doc_code.  One
+    connection is shared by all threads behind a lock
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if path != ':memory:':
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(_SCHEMA)
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS documents_due ON documents (status, next_attempt)'
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _transaction(self, statement):
+        """run statement(cursor) in a write transaction, returns its result"""
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = statement(cursor)
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+            return result
+
+    def add(self, doc_code, body):
+        """
+        journal body under doc_code and return True.  A document already
+        pending is replaced; one being sent or already sent is left alone
+        and False is returned
+        """
+        now = self.clock()
+
+        def add(cursor):
+            row = cursor.execute(
+                'SELECT status FROM documents WHERE doc_code = ?', (doc_code,)
+            ).fetchone()
+            if row is not None and row[0] in (SENDING, SENT):
+                return False
+            cursor.execute(
+                'INSERT OR REPLACE INTO documents '
+                '(doc_code, body, status, attempts, next_attempt, created, updated) '
+                'VALUES (?, ?, ?, 0, ?, ?, ?)',
+                (doc_code, body, PENDING, now, now, now),
+            )
+            return True
+        return self._transaction(add)
+
+    def claim(self, limit):
+        """mark up to limit due documents as being sent and return them"""
+        now = self.clock()
+
+        def claim(cursor):
+            rows = cursor.execute(
+                'SELECT doc_code, body, attempts FROM documents '
+                'WHERE status = ? AND next_attempt <= ? ORDER BY next_attempt LIMIT ?',
+                (PENDING, now, limit),
+            ).fetchall()
+            cursor.executemany(
+                'UPDATE documents SET status = ?, updated = ? WHERE doc_code = ?',
+                [(SENDING, now, row[0]) for row in rows],
+            )
+            return rows
+        return self._transaction(claim)
+
+    def mark_sent(self, doc_code, result):
+        self._update(doc_code, status=SENT, result=result, last_error=None)
+
+    def mark_failed(self, doc_code, error, retry_at=None):
+        """record a failed attempt, retried at retry_at or given up"""
+        if retry_at is None:
+            self._update(doc_code, status=FAILED, last_error=error, increment=True)
+        else:
+            self._update(doc_code, status=PENDING, last_error=error,
+                         next_attempt=retry_at, increment=True)
+
+    def _update(self, doc_code, increment=False, **values):
+        values['updated'] = self.clock()
+        assignments = ', '.join('%s = ?' % k for k in values)
+        if increment:
+            assignments += ', attempts = attempts + 1'
+
+        def update(cursor):
+            cursor.execute(
+                'UPDATE documents SET %s WHERE doc_code = ?' % assignments,
+                tuple(values.values()) + (doc_code,),
+            )
+        self._transaction(update)
+
+    def cancel(self, doc_code):
+        """cancel a document still waiting to be sent, True if it was"""
+        now = self.clock()
+
+        def cancel(cursor):
+            cursor.execute(
+                'UPDATE documents SET status = ?, updated = ? WHERE doc_code = ? AND status = ?',
+                (CANCELLED, now, doc_code, PENDING),
+            )
+            return cursor.rowcount == 1
+        return self._transaction(cancel)
+
+    def recover(self):
+        """
+        put documents left in flight by a crashed process back in line.
+        They may have reached Avalara, a repeated commit of the same
+        DocCode is reported as an error and ends up failed
+        """
+        def recover(cursor):
+            cursor.execute(
+                'UPDATE documents SET status = ? WHERE status = ?', (PENDING, SENDING),
+            )
+            return cursor.rowcount
+        return self._transaction(recover)
+
+    def status(self, doc_code):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT %s FROM documents WHERE doc_code = ?' % ', '.join(_COLUMNS),
+                (doc_code,),
+            ).fetchone()
+        if row is None:
+            return None
+        status = dict(zip(_COLUMNS, row))
+        if status['result'] is not None:
+            status['result'] = json.loads(status['result'])
+        return status
+
+    def counts(self):
+        """number of documents per status"""
+        with self._lock:
+            return dict(self._connection.execute(
+                'SELECT status, COUNT(*) FROM documents GROUP BY status'
+            ).fetchall())
+
+
+class WriteBehindQueue(object):
+    """
+    journal committed documents and deliver them in the background.
+    client is the blocking Avalara client used to deliver, journal a
+    Journal or a path for one.  Each flush claims up to batch_size due
+    documents and posts them over concurrency threads.  Exceptions are
+    retried with retry's backoff up to max_attempts; documents Avalara
+    answers with an error are marked failed straight away, repeating them
+    would not help
+    """
+
+    def __init__(self, client, journal, batch_size=50, concurrency=4,
+                 flush_interval=1.0, max_attempts=10,
+                 retry=RetryPolicy(backoff=1, max_backoff=300)):
+        if client.is_async:
+            raise TypeError('write-behind delivery needs a blocking Avalara client')
+        self.client = client
+        self.journal = journal if isinstance(journal, Journal) else Journal(journal)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry = retry
+        self._executor = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+
+    def submit(self, request_body):
+        """
+        journal a committed request body and return a queued result, or
+        Avalara's result when the document was delivered before
+        """
+        doc_code = request_body['DocCode']
+        if self.journal.add(doc_code, json.dumps(request_body)):
+            self._wake.set()
+        else:
+            status = self.journal.status(doc_code)
+            if status['status'] == SENT:
+                return status['result']
+        return {'DocCode': doc_code, 'ResultCode': QUEUED_RESULT_CODE}
+
+    def cancel(self, doc_code):
+        """drop a document that was not sent yet, True if there was one"""
+        return self.journal.cancel(doc_code)
+
+    def status(self, doc_code):
+        """journal entry of doc_code as a dict, None if it was never queued"""
+        return self.journal.status(doc_code)
+
+    def _deliver(self, row):
+        doc_code, body, attempts = row
+        try:
+            result = self.client._get_tax(json.loads(body))
+        except Exception as e:
+            attempts += 1
+            retry_at = None
+            if attempts < self.max_attempts:
+                retry_at = self.journal.clock() + self.retry.delay(attempts - 1)
+            logger.warning('delivering %s failed: %r', doc_code, e)
+            self.journal.mark_failed(doc_code, repr(e), retry_at)
+            return False
+        result = dict(result)
+        if result.get('ResultCode') == 'Success':
+            self.journal.mark_sent(doc_code, json.dumps(result))
+            return True
+        logger.error('Avalara rejected %s: %r', doc_code, result.get('Messages'))
+        self.journal.mark_failed(doc_code, json.dumps(result))
+        return False
+
+    def flush(self):
+        """deliver one batch of due documents, returns how many were claimed"""
+        rows = self.journal.claim(self.batch_size)
+        if rows:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+            list(self._executor.map(self._deliver, rows))
+        return len(rows)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                claimed = self.flush()
+            except Exception:
+                logger.exception('write-behind flush failed')
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+
+    def start(self):
+        """recover interrupted deliveries and start the background flusher"""
+        if self._thread is not None:
+            return
+        self.journal.recover()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='avalara-write-behind')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """stop the flusher after its current batch"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
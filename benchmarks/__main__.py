@@ -0,0 +1,61 @@
+"""
+Run the benchmark suites, optionally saving or comparing JSON baselines:
+
+    python -m benchmarks                      # every suite
+    python -m benchmarks serialization save   # some suites
+    python -m benchmarks --quick --save baseline.json
+    python -m benchmarks --compare baseline.json --tolerance 0.15
+
+Comparing exits with status 1 when a case got slower than the tolerance.
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import importlib
+import sys
+
+from . import harness
+
+
+SUITES = ('models', 'serialization', 'save')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('suites', nargs='*', metavar='suite',
+                        help='any of %s, all by default' % ', '.join(SUITES))
+    parser.add_argument('--quick', action='store_true', help='smaller sizes and fewer runs')
+    parser.add_argument('-k', dest='match', help='only cases whose name contains this')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='slowdown against the baseline reported as a regression')
+    args = parser.parse_args(argv)
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error('unknown suite %r' % suite)
+
+    baseline = harness.load_baseline(args.compare) if args.compare else None
+    results = {}
+    harness.header()
+    for suite in args.suites or SUITES:
+        module = importlib.import_module('benchmarks.%s' % suite)
+        for case in module.cases(quick=args.quick):
+            if args.match and args.match not in case.name:
+                continue
+            results[case.name] = result = harness.run(case)
+            harness.report(case.name, result, baseline)
+            sys.stdout.flush()
+
+    if args.save:
+        harness.save_baseline(results, args.save)
+    if baseline is not None:
+        regressions = harness.compare(results, baseline, args.tolerance)
+        for name in regressions:
+            print('regression: %s' % name)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
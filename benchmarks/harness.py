@@ -0,0 +1,176 @@
+"""
+Timing, memory and baseline helpers shared by the benchmark suites.
+
+A suite module defines cases(quick) yielding Case tuples.  Every case is
+timed in repeat samples of number calls each.  Latencies are per call,
+percentiles are taken over the samples and ops/s follows the median.
+A sample of many calls only gives their average, so p95 and p99 are
+reported for cases timing one call per sample with enough samples to
+have a tail, '-' otherwise.  Peak memory is the largest traced
+allocation during one extra sample run under tracemalloc.
+"""
+from __future__ import division, print_function, unicode_literals
+
+from collections import namedtuple
+import gc
+import json
+import platform
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+from avalara.utils import percentile
+
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# a benchmark: func is called number times per sample, after setup()
+# when given.  setup returns the argument func is called with
+Case = namedtuple('Case', 'name func number repeat setup')
+Case.__new__.__defaults__ = (5, None)
+
+
+# samples needed before a percentile is reported, one beyond it at least
+MIN_SAMPLES = {95: 20, 99: 100}
+
+
+def _calls(case):
+    """a function making the number calls of one sample"""
+    func, number = case.func, case.number
+    if case.setup is None:
+        def calls():
+            for _ in range(number):
+                func()
+    else:
+        argument = case.setup()
+
+        def calls():
+            for _ in range(number):
+                func(argument)
+    return calls
+
+
+def _sample(case):
+    calls = _calls(case)
+    start = clock()
+    calls()
+    return (clock() - start) / case.number
+
+
+def peak_memory(case):
+    """peak bytes allocated by one sample, None without tracemalloc"""
+    if tracemalloc is None:
+        return None
+    calls = _calls(case)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        calls()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(case):
+    """time case, returns its result dict"""
+    # warm up caches and generated code
+    _sample(case._replace(number=1))
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = [_sample(case) for _ in range(case.repeat)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+    median = percentile(samples, 50)
+
+    def tail(p):
+        # averages of several calls hide the slow ones
+        if case.number != 1 or len(samples) < MIN_SAMPLES[p]:
+            return None
+        return percentile(samples, p)
+
+    return {
+        'ops_per_sec': 1 / median if median else float('inf'),
+        'p50': median,
+        'p95': tail(95),
+        'p99': tail(99),
+        'peak_bytes': peak_memory(case),
+        'samples': len(samples),
+        'number': case.number,
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'argv': sys.argv[1:],
+    }
+
+
+def save_baseline(results, path):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f,
+                  indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    names of the cases whose ops/s fell by more than tolerance against
+    baseline, cases missing from either side are skipped
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['ops_per_sec'] < before['ops_per_sec'] * (1 - tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def _time(seconds):
+    if seconds is None:
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds >= 1 / scale:
+            return '%.2f%s' % (seconds * scale, unit)
+    return '%.0fns' % (seconds * 1e9)
+
+
+def _bytes(size):
+    if size is None:
+        return '-'
+    for unit, scale in (('MB', 1 << 20), ('KB', 1 << 10)):
+        if size >= scale:
+            return '%.1f%s' % (size / scale, unit)
+    return '%dB' % size
+
+
+def report(name, result, baseline=None, stream=sys.stdout):
+    change = ''
+    if baseline and name in baseline:
+        change = '%+.1f%%' % (
+            (result['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1) * 100
+        )
+    print('%-48s %12.1f %10s %10s %10s %10s %8s' % (
+        name, result['ops_per_sec'], _time(result['p50']), _time(result['p95']),
+        _time(result['p99']), _bytes(result['peak_bytes']), change,
+    ), file=stream)
+
+
+def header(stream=sys.stdout):
+    print('%-48s %12s %10s %10s %10s %10s %8s' % (
+        'case', 'ops/s', 'p50', 'p95', 'p99', 'peak mem', 'change',
+    ), file=stream)
@@ -0,0 +1,70 @@
+"""
+Model construction and GetTaxRequest building.
+
+    python -m benchmarks models
+"""
+from __future__ import unicode_literals
+
+from decimal import Decimal
+import itertools
+
+from avalara.models import Address, GetTaxRequest, OrderLine
+
+from .harness import Case
+
+
+ADDRESS = {
+    'address_code': 1,
+    'address1': '123 some street name',
+    'city': 'a city',
+    'state': 'CO',
+    'postal_code': '81344',
+}
+
+LINE = {
+    'line_number': 1,
+    'item_code': 'A1',
+    'price': Decimal('15.25'),
+    'qty': 2,
+    'origin_code': 1,
+    'destination_code': 2,
+    'description': 'a line',
+}
+
+
+def new_request():
+    ava = GetTaxRequest(customer_code=1, doc_code=5)
+    ava.add_address(**dict(ADDRESS, address_code=None))
+    return ava
+
+
+def cases(quick=False):
+    number = 1000 if quick else 10000
+    yield Case('construct OrderLine', lambda: OrderLine(**LINE), number)
+    yield Case('construct Address', lambda: Address(**ADDRESS), number)
+
+    def add_line(ava):
+        ava.add_line(item_code='A1', price=Decimal('15.25'), qty=2,
+                     origin_code=1, destination_code=1)
+    yield Case('add_line', add_line, number, setup=new_request)
+
+    columns = {
+        'item_code': ['A%d' % i for i in range(1000)],
+        'price': [Decimal('15.25')] * 1000,
+        'origin_code': 1,
+        'destination_code': 1,
+    }
+    yield Case('add_lines 1000 lines', lambda ava: ava.add_lines(**columns),
+               max(1, number // 1000), setup=new_request)
+
+    postal_codes = itertools.count(10000)
+
+    def add_new_address(ava):
+        ava.add_address(address1='124 some street', city='a city', state='CO',
+                        postal_code=str(next(postal_codes)))
+    yield Case('add_address new', add_new_address, number, setup=new_request)
+
+    def add_same_address(ava):
+        ava.add_address(address1='123 Some Street Name ', city='A City', state='co',
+                        postal_code='81344')
+    yield Case('add_address interned', add_same_address, number, setup=new_request)
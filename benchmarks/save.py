@@ -0,0 +1,39 @@
+"""
+End-to-end save() against the local fake Avalara server, including
+serialization, the pooled HTTP round trip and decoding.
+
+    python -m benchmarks save
+"""
+from __future__ import unicode_literals
+
+import atexit
+
+from avalara.bulk import save_many
+from avalara.client import Avalara
+from avalara.fakeserver import FakeAvalaraServer
+
+from .harness import Case
+from .serialization import build_request
+
+
+def cases(quick=False):
+    server = FakeAvalaraServer().start()
+    atexit.register(server.stop)
+    client = Avalara('1234', 'abcd', base_url=server.base_url)
+    atexit.register(client.close)
+    repeat = 20 if quick else 200
+    for lines in (1, 100, 1000):
+        ava = build_request(lines)
+        ava.avalara_client = client
+        yield Case('save %d lines' % lines, ava.save, 1, repeat)
+        yield Case('save %d lines streamed' % lines, lambda ava=ava: ava.save(stream=True),
+                   1, repeat)
+
+    def save_batch():
+        requests = [build_request(10) for _ in range(100)]
+        for ava in requests:
+            ava.avalara_client = client
+        return requests
+    yield Case('save_many 100 x 10 lines, 8 threads',
+               lambda requests: list(save_many(requests, concurrency=8)),
+               1, 5 if quick else 20, save_batch)
@@ -0,0 +1,87 @@
+"""
+request_body serialization.  Run on its own to compare the serpy and the
+compiled engines side by side:
+
+    python -m benchmarks.serialization
+    python -m benchmarks serialization
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import timeit
+
+from avalara.models import GetTaxRequest
+from avalara.utils import remove_nulls_from_dict
+
+from .harness import Case
+
+
+def build_request(lines, override=False):
+    ava = GetTaxRequest(customer_code=1, doc_code=5, doc_date=datetime.date(2016, 5, 5))
+    origin = ava.add_address(address1='123 some street name', city='a city',
+                             state='CO', postal_code='81344')
+    destination = ava.add_address(address1='124 some other street name', city='another city',
+                                  state='CO', postal_code='81345')
+    override_lookup = {'tax_amount': 1.25} if override else {}
+    for i in range(lines):
+        ava.add_line(override_lookup=override_lookup, item_code=str(i), price=15.25, qty=2,
+                     origin_code=origin, destination_code=destination,
+                     description='line %d' % i)
+    return ava
+
+
+def bench(ava, compiled, number):
+    ava.compiled_serialization = compiled
+    return min(timeit.repeat(lambda: ava.request_body, number=number, repeat=5)) / number
+
+
+def cases(quick=False):
+    sizes = (1, 100, 1000) if quick else (1, 100, 1000, 10000, 50000)
+    for lines in sizes:
+        number = max(1, (1000 if quick else 10000) // lines)
+        for override in (False, True):
+            ava = build_request(lines, override)
+            for compiled in (False, True):
+                def serialize(ava=ava, compiled=compiled):
+                    ava.compiled_serialization = compiled
+                    return ava.request_body
+                yield Case('request_body %d lines%s %s' % (
+                    lines, ' override' if override else '', 'compiled' if compiled else 'serpy',
+                ), serialize, number)
+    # a long lived request edited by one line between builds, built whole
+    # and incrementally.  Incremental builds should cost the same at any size
+    for lines in sizes[1:]:
+        for incremental in (False, True):
+            ava = build_request(lines)
+            ava.compiled_serialization = True
+            ava.incremental_serialization = incremental
+            ava.request_body
+
+            def edit(ava=ava, quantities=[2, 3]):
+                quantities.reverse()
+                ava.update_line(1, qty=quantities[0])
+                return ava.request_body
+            yield Case('request_body %d lines one edit %s' % (
+                lines, 'incremental' if incremental else 'full',
+            ), edit, max(1, (1000 if quick else 10000) // lines))
+    data = build_request(1000).data
+    yield Case('remove_nulls_from_dict 1000 lines', lambda: remove_nulls_from_dict(data),
+               10 if quick else 100)
+
+
+def main():
+    print('%8s %9s %12s %12s %8s' % ('lines', 'override', 'serpy', 'compiled', 'speedup'))
+    for lines in (1, 100, 1000, 10000):
+        for override in (False, True):
+            ava = build_request(lines, override)
+            number = max(1, 10000 // lines)
+            serpy_time = bench(ava, False, number)
+            compiled_time = bench(ava, True, number)
+            print('%8d %9s %10.3fms %10.3fms %7.1fx' % (
+                lines, override, serpy_time * 1000, compiled_time * 1000,
+                serpy_time / compiled_time,
+            ))
+
+
+if __name__ == '__main__':
+    main()
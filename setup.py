@@ -5,6 +5,7 @@ from setuptools import setup, find_packages
 import sys
 
 requirements = [
+    'futures; python_version < "3"',
     "requests",
     "serpy==0.1.1",
     "six",
@@ -15,6 +16,7 @@ if 'test' in sys.argv:
     setup_requires.append('pytest-runner')
 
 tests_require = [
+    'mock; python_version < "3"',
     'pytest',
 ]
 
@@ -25,10 +27,15 @@ setup(
     version=version,
     description='Python client to interact Avalara',
     author='SendOutCards',
-    packages=find_packages(exclude=['*.tests']),
+    packages=find_packages(exclude=['*.tests', 'benchmarks', 'benchmarks.*']),
     zip_safe=False,
     install_requires=requirements,
     tests_require=tests_require,
+    extras_require={
+        # avalara.aio uses async def
+        'async': ['aiohttp; python_version >= "3.5"'],
+        'prometheus': ['prometheus_client'],
+    },
     setup_requires=setup_requires,
     classifiers=[
         "License :: OSI Approved :: MIT License",